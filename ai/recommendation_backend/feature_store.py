@@ -0,0 +1,96 @@
+# feature_store.py
+import json
+import os
+from pathlib import Path
+import pandas as pd
+
+# Layout:
+#   <root>/date=YYYY-MM-DD/part.parquet   one partition per trading date
+#   <root>/_manifest.json                 {"partitions": {date: n_rows}, "latest_complete": date,
+#                                          "expected_size": n_tickers or null}
+MANIFEST_NAME = "_manifest.json"
+
+# A partition counts as complete once it covers this share of the expected universe size
+# (guards against scoring a half-written or intraday day).
+MIN_COVERAGE = 0.9
+# Without an expected universe size, coverage is measured against the median of this many
+# preceding partitions, so a permanently smaller universe stops blocking after a few dates.
+COVERAGE_WINDOW = 5
+
+
+def _partition_path(root, date_str):
+    return Path(root) / f"date={date_str}" / "part.parquet"
+
+
+def read_manifest(root):
+    """Returns the manifest dict, or an empty one if the store does not exist yet."""
+    path = Path(root) / MANIFEST_NAME
+    if not path.exists():
+        return {"partitions": {}, "latest_complete": None}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _write_json_atomic(path, data):
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def complete_dates(partitions, min_coverage=MIN_COVERAGE, expected_size=None, window=COVERAGE_WINDOW):
+    """
+    Dates whose row count covers min_coverage of the reference size: the expected universe
+    size when known, else the trailing median of the preceding `window` partitions.
+    """
+    dates = sorted(partitions)
+    complete = []
+    for i, date in enumerate(dates):
+        if expected_size:
+            reference = expected_size
+        else:
+            previous = [partitions[d] for d in dates[max(0, i - window):i]]
+            reference = float(pd.Series(previous).median()) if previous else partitions[date]
+        if partitions[date] >= min_coverage * reference:
+            complete.append(date)
+    return complete
+
+
+def write_partitions(df, root, min_coverage=MIN_COVERAGE, expected_size=None):
+    """
+    Writes engineered rows into per-date partitions (overwriting dates already present)
+    and refreshes the manifest. Only the dates contained in df are touched.
+    expected_size: number of tickers in the current universe (kept in the manifest for later writes).
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    manifest = read_manifest(root)
+    if expected_size is not None:
+        manifest["expected_size"] = int(expected_size)
+
+    for date, part in df.groupby(df["Date"].dt.normalize()):
+        date_str = date.strftime("%Y-%m-%d")
+        path = _partition_path(root, date_str)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        part.reset_index(drop=True).to_parquet(tmp_path, index=False, compression="zstd")
+        os.replace(tmp_path, path)
+        manifest["partitions"][date_str] = int(len(part))
+
+    complete = complete_dates(manifest["partitions"], min_coverage, manifest.get("expected_size"))
+    manifest["latest_complete"] = max(complete) if complete else None
+    _write_json_atomic(root / MANIFEST_NAME, manifest)
+    return manifest
+
+
+def read_partition(root, date_str, columns=None):
+    """Reads a single trading date's rows."""
+    return pd.read_parquet(_partition_path(root, date_str), columns=columns)
+
+
+def read_latest_partition(root, columns=None):
+    """Reads the latest complete partition. Returns (DataFrame, date_str) or (None, None)."""
+    latest = read_manifest(root)["latest_complete"]
+    if latest is None:
+        return None, None
+    return read_partition(root, latest, columns=columns), latest
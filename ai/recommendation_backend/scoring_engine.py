@@ -9,6 +9,7 @@ from sqlalchemy.orm import Session
 from dotenv import load_dotenv
 from models import Recommendation
 from database import SessionLocal
+from feature_store import read_latest_partition
 
 load_dotenv()
 
@@ -17,46 +18,70 @@ TOPK = 5
 # --- PATHS ---
 MODEL_PATH = os.getenv("MODEL_PATH")
 SCALER_PATH = os.getenv("SCALER_PATH")
-DATA_PATH = os.getenv("DATA_PATH") # NOTE: In a real environment, this should be a DB connection or live feed
+TRANSFORM_PATH = os.getenv("TRANSFORM_PATH") # Fitted feature transform from training (feature list + final scaler); preferred over SCALER_PATH
+FEATURE_STORE_PATH = os.getenv("FEATURE_STORE_PATH") # Date-partitioned engineered features. NOTE: In a real environment, this should be a DB connection or live feed
 
 def load_assets():
-    """Loads CatBoost Model and StandardScaler."""
+    """
+    Loads the CatBoost model and the feature scaler.
+
+    If TRANSFORM_PATH points to the fitted feature transform written by training, the
+    scaler is that artifact (a dict with feature_cols / feature_mean / feature_scale), so
+    scoring uses exactly the training feature order and statistics without any fitting.
+    """
     try:
         model = joblib.load(MODEL_PATH)
-        scaler = joblib.load(SCALER_PATH)
+        if TRANSFORM_PATH and os.path.exists(TRANSFORM_PATH):
+            scaler = joblib.load(TRANSFORM_PATH)
+        else:
+            scaler = joblib.load(SCALER_PATH)
         print("Model and Scaler loaded successfully.")
         return model, scaler
     except Exception as e:
         print(f"Error loading assets: {e}")
         return None, None
 
-def get_latest_data(data_path):
+def scale_features(scaler, daily_df, feature_cols):
+    """Applies the fitted transform (a matrix op per row) or the legacy StandardScaler."""
+    if isinstance(scaler, dict):
+        X = daily_df[scaler["feature_cols"]].to_numpy(np.float64)
+        return (X - scaler["feature_mean"]) / scaler["feature_scale"]
+    return scaler.transform(daily_df[feature_cols])
+
+def get_latest_data(store_path):
     """
     Retrieves and prepares the latest daily data for scoring.
     
+    The feature store manifest records the latest complete trading date, so only
+    that single partition (~one row per ticker) is read, regardless of how much
+    history has accumulated.
+
     NOTE: In a real-time system, this function connects to a live data source,
-    not a static CSV. We use the CSV here for demonstration continuity.
+    not a static file store. We use the feature store here for demonstration continuity.
     """
     try:
-        df = pd.read_csv(data_path, parse_dates=["Date"])
-        
-        # Get the latest date available in the dataset (Simulating T+0)
-        latest_date = df["Date"].max()
-        daily_df = df[df["Date"] == latest_date].copy().reset_index(drop=True)
+        # Get the latest complete date available in the store (Simulating T+0)
+        daily_df, latest_date = read_latest_partition(store_path)
+        if daily_df is None:
+            print("Feature store is empty.")
+            return None, None, None
         
         # Identify feature columns (must be consistent with training)
         non_feature_cols = ["Ticker", "Date", "Return_7d", "index"]
         feature_cols = [c for c in daily_df.columns if c not in non_feature_cols and pd.api.types.is_numeric_dtype(daily_df[c])]
         
-        # Handle NaNs (same as training)
-        daily_df[feature_cols] = daily_df[feature_cols].fillna(method="ffill").fillna(0)
+        # Handle NaNs (same as training: forward-fill within each ticker, then 0).
+        # The partition holds a single date, i.e. one row per ticker, so the per-ticker
+        # forward-fill has nothing to carry and only the zero fill applies; a plain
+        # row-wise ffill here would copy values from one ticker into the next.
+        daily_df[feature_cols] = daily_df[feature_cols].fillna(0)
         
         # NOTE: Implement actual Volume filter here if 'Volume' is in daily_df
         # If 'Volume' is an unscaled feature (as implied in the backtest logic),
         # filter it now before scaling.
         # daily_df = daily_df[daily_df["Volume"] > 100000] # Example filter
         
-        return daily_df, feature_cols, latest_date.date()
+        return daily_df, feature_cols, date.fromisoformat(latest_date)
     
     except Exception as e:
         print(f"Error loading or preparing data: {e}")
@@ -69,13 +94,13 @@ def run_scoring_and_save(db: Session):
     if cb_ranker is None or scaler is None:
         return False
 
-    daily_df, feature_cols, current_date = get_latest_data(DATA_PATH)
+    daily_df, feature_cols, current_date = get_latest_data(FEATURE_STORE_PATH)
     if daily_df is None or len(daily_df) == 0:
         print("No data available for scoring.")
         return False
 
     # 1. Scale Features
-    X_scaled = scaler.transform(daily_df[feature_cols])
+    X_scaled = scale_features(scaler, daily_df, feature_cols)
 
     # 2. Predict Scores
     group_ids = np.zeros(len(daily_df), dtype=int)
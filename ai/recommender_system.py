@@ -11,15 +11,37 @@ Original file is located at
 """
 
 # Commented out IPython magic to ensure Python compatibility.
-# %pip install ta vaderSentiment
+# %pip install ta vaderSentiment aiohttp
 import yfinance as yf
 import pandas as pd
 import numpy as np
-from ta import add_all_ta_features  # اگر فقط RSI نیاز دارید، می‌توانید ta را حذف کنید و فقط RSI محاسبه کنید
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 import requests
+import sys
 from datetime import datetime, timedelta
 
+# ماژول‌های مشترک خط لوله (مشترک با بک‌اند رتبه‌بندی روزانه)
+sys.path.append("../stock-ranker-deployment/backend")
+from app.price_store import PriceStore
+from app.fundamentals import FundamentalsCache, fetch_fundamentals
+from app.news import ArticleStore, ingest_news
+from app.ta_runner import add_ta_columns_by_ticker
+from app.dataset_io import save_dataset, load_dataset, load_model_frame, dataset_columns, compact_frame, memory_report
+from recommendation_backend.feature_store import write_partitions
+from app.feature_matrix import build_feature_matrix, FeatureMatrix
+from app.dataset_cache import catboost_pools, lightgbm_datasets
+from app.incremental_training import incremental_retrain, promote_version
+from app.hyperparameter_search import run_search, best_params, search_data_key
+from app.walk_forward import run_walk_forward
+from app.feature_transform import (fit_pca_transform, set_feature_scaler, apply_pca, save_feature_transform,
+                                   fit_clip_bounds, apply_clip_bounds, fit_power_transform, apply_power_transform)
+from app.feature_dag import FeatureDAG
+from app.feature_graph import ratio_node
+from app.labels import relevance_labels
+from app.feature_selection import select_features, write_feature_cols
+from app.normalization import fit_ticker_stats, date_stats, normalize, save_normalizer
+from app.panel_kernels import TickerPanel, rolling_mean, rolling_std, ewm_mean, lag, bar_returns, date_mean, rolling_market_moments, fill_by_ticker
+
 # === تنظیمات اولیه ===
 tickers = [
     "NVDA", "MSFT", "AAPL", "GOOGL", "GOOG", "AMZN", "META", "TSLA", "AVGO", "ASML",
@@ -38,66 +60,28 @@ api_key = "fd21bf6f585f45beae7bafe36d1b04fe"  # کلید NewsAPI خودتون
 
 # === ۱. دانلود داده‌های اصلی (historical data با Dividends و Stock Splits) ===
 print("📥 Downloading historical data...")
-all_data = pd.DataFrame()
-batch_size = 50  # برای جلوگیری از محدودیت yfinance
-for i in range(0, len(tickers), batch_size):
-    batch = tickers[i:i + batch_size]
-    try:
-        data_batch = yf.download(
-            batch,
-            start="2020-01-01",
-            end="2025-10-05",
-            group_by="ticker",
-            auto_adjust=False,
-            actions=True
-        )
-        all_data = pd.concat([all_data, data_batch])
-        print(f"Downloaded batch {i//batch_size + 1}")
-    except Exception as e:
-        print(f"Error in batch {i//batch_size + 1}: {e}")
-
-# تبدیل به فرمت مناسب
-historical_data = all_data.stack(level=0, future_stack=True).reset_index().rename(columns={"level_1": "Ticker"})
-historical_data["Date"] = pd.to_datetime(historical_data["Date"])
-historical_data = historical_data.dropna(subset=["Open", "High", "Low", "Close"])
-historical_data = historical_data.drop_duplicates(subset=["Date", "Ticker"])
-historical_data = historical_data.sort_values(by=["Ticker", "Date"])
+batch_size = 50  # اندازه‌ی اولیه‌ی دسته؛ زمان‌بند بر اساس خطاها و محدودیت نرخ آن را تنظیم می‌کند
+# هر دسته بلافاصله به فرمت بلند تبدیل و برای هر نماد روی دیسک (Parquet) نوشته می‌شود؛
+# اجرای قطع‌شده از آخرین دسته‌ی کامل ادامه پیدا می‌کند
+price_store = PriceStore("price_store")
+price_store.backfill(tickers, start="2020-01-01", end="2025-10-05", batch_size=batch_size)
+
+# خواندن داده‌ی بلند از کش (مرتب بر اساس Ticker و Date)
+historical_data = price_store.load(tickers, start="2020-01-01", end="2025-10-05")
 
 # === ۲. اضافه کردن نام شرکت و fundamentals ===
 print("📊 Adding company info and fundamentals...")
-company_info = []
-for ticker in tickers:
-    try:
-        t = yf.Ticker(ticker)
-        info = t.info
-        company_name = info.get('longName', info.get('shortName', 'N/A'))
-        company_info.append({
-            "Ticker": ticker,
-            "Company": company_name,
-            "Market Cap": info.get("marketCap", None),
-            "P/E Ratio": info.get("trailingPE", None),
-            "EPS": info.get("trailingEps", None),
-            "Sector": info.get("sector", "N/A"),
-            "Industry": info.get("industry", "N/A")
-        })
-    except Exception as e:
-        print(f"Error for {ticker}: {e}")
-        company_info.append({
-            "Ticker": ticker,
-            "Company": "N/A",
-            "Market Cap": None,
-            "P/E Ratio": None,
-            "EPS": None,
-            "Sector": "N/A",
-            "Industry": "N/A"
-        })
-
-company_df = pd.DataFrame(company_info)
-enhanced_data = historical_data.merge(company_df, on="Ticker", how="left")
+# واکشی موازی با کش TTL؛ فقط نمادهای منقضی‌شده دوباره درخواست می‌شوند
+company_df = fetch_fundamentals(tickers, cache=FundamentalsCache("fundamentals_cache.json"))
+# Ticker/Company/Sector/Industry به category تبدیل می‌شوند تا رشته‌ها در هر ردیف قیمت تکرار نشوند
+enhanced_data = compact_frame(historical_data.merge(compact_frame(company_df), on="Ticker", how="left"))
+memory_report(enhanced_data, "enhanced_data")
 
 # === ۳. اضافه کردن technical indicators (با ta - اگر همه ویژگی‌ها لازم نیست، می‌توانید فقط RSI اضافه کنید) ===
 print("📈 Adding technical indicators...")
-enhanced_data = add_all_ta_features(enhanced_data, open="Open", high="High", low="Low", close="Close", volume="Volume")
+# همان کاتالوگ add_all_ta_features، اما جداگانه برای هر نماد (پنجره‌ها از مرز نمادها عبور نمی‌کنند)
+# و به صورت موازی روی بلوک‌های پیوسته‌ی نمادها؛ ترتیب ردیف‌ها حفظ می‌شود
+enhanced_data = add_ta_columns_by_ticker(enhanced_data, fillna=False)
 
 # اگر فقط RSI نیاز دارید، این خط را جایگزین کنید (برای بهینه‌سازی):
 # def calculate_rsi(series, period=14):
@@ -118,29 +102,14 @@ start_date = end_date - timedelta(days=30)
 start_str = start_date.strftime("%Y-%m-%d")
 end_str = end_date.strftime("%Y-%m-%d")
 
-news_data = []
 analyzer = SentimentIntensityAnalyzer()
-for ticker in tickers:
-    try:
-        url = f"https://newsapi.org/v2/everything?q={ticker} stock&from={start_str}&to={end_str}&sortBy=relevancy&language=en&apiKey={api_key}"
-        response = requests.get(url)
-        data_json = response.json()
-        articles = data_json.get("articles", [])
-
-        for article in articles[:20]:  # محدود به ۲۰ خبر برای هر تیکر (برای جلوگیری از محدودیت API)
-            text = (article.get("title", "") or "") + " " + (article.get("description", "") or "")
-            sentiment_score = analyzer.polarity_scores(text)["compound"]
-            news_data.append({
-                "Date": pd.to_datetime(article["publishedAt"].split("T")[0]),
-                "Ticker": ticker,
-                "Sentiment": sentiment_score
-            })
-    except Exception as e:
-        print(f"⚠️ Error for {ticker}: {e}")
-
-if news_data:
-    news_df = pd.DataFrame(news_data)
-    sentiment_daily = news_df.groupby(["Date", "Ticker"])["Sentiment"].mean().reset_index()
+# اخبار به صورت async و همزمان دریافت می‌شوند؛ اخبار قبلاً امتیازدهی‌شده از کش خوانده می‌شوند
+news_store = ArticleStore("news_cache.sqlite")
+sentiment_daily = ingest_news(tickers, api_key, start_str, end_str, store=news_store,
+                              score_fn=lambda text: analyzer.polarity_scores(text)["compound"])
+news_store.close()
+
+if not sentiment_daily.empty:
     enhanced_data = enhanced_data.merge(sentiment_daily, on=["Date", "Ticker"], how="left")
     enhanced_data["Sentiment"] = enhanced_data["Sentiment"].fillna(0)
 else:
@@ -148,8 +117,8 @@ else:
 
 # === ۵. تمیز کردن نهایی و ذخیره فقط یک فایل ===
 enhanced_data = enhanced_data.sort_values(by=["Ticker", "Date"])
-enhanced_data.to_csv("final_enhanced_stock_dataset.csv", index=False)
-print("\n💾 Final dataset saved to final_enhanced_stock_dataset.csv")
+save_dataset(enhanced_data, "final_enhanced_stock_dataset.parquet")
+print("\n💾 Final dataset saved to final_enhanced_stock_dataset.parquet")
 print(f"Columns: {enhanced_data.columns.tolist()}")
 print("\n📊 Sample:")
 print(enhanced_data.head(5))
@@ -159,7 +128,7 @@ import numpy as np
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import TimeSeriesSplit
 
-df = pd.read_csv("final_enhanced_stock_dataset.csv")
+df = load_dataset("final_enhanced_stock_dataset.parquet")
 print(f"INFO : \n\n {df.info} \n\n\n\n DESCRIBE : \n\n {df.describe}")
 
 """<h1>DATA ANALYSIS</h1>
@@ -172,8 +141,7 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import TimeSeriesSplit
 
 # 1. بارگذاری داده‌ها
-df = pd.read_csv('final_enhanced_stock_dataset.csv')
-df['Date'] = pd.to_datetime(df['Date'])  # تبدیل ستون تاریخ به فرمت datetime
+df = load_dataset('final_enhanced_stock_dataset.parquet')  # ستون Date از قبل datetime است
 
 # 2. پر کردن داده‌های گمشده
 df['Sentiment'] = df['Sentiment'].fillna(0)  # پر کردن مقادیر گمشده Sentiment با 0
@@ -188,13 +156,16 @@ df = pd.concat([df, return_7d.rename('Return_7d')], axis=1)  # افزودن ست
 # 4. تعریف ویژگی‌ها
 features = df.select_dtypes(include=[np.number]).columns.drop('Return_7d', errors='ignore').tolist()  # انتخاب ویژگی‌های عددی
 
-# 5. نرمال‌سازی ویژگی‌ها برای هر تیکر
-for ticker in df['Ticker'].unique():  # حلقه روی هر تیکر
-    mask = df['Ticker'] == ticker  # فیلتر داده‌های تیکر
-    ticker_df = df.loc[mask, features].fillna(0)  # پر کردن NaN با 0 برای نرمال‌سازی
-    scaler = StandardScaler()  # ایجاد نمونه اسکیلر
-    scaled = scaler.fit_transform(ticker_df)  # نرمال‌سازی داده‌ها
-    df.loc[mask, features] = scaled  # جایگزینی داده‌های نرمال‌شده
+# 5. نرمال‌سازی ویژگی‌ها (گشتاورهای گروهی برداری در یک گذر، NaN -> 0 پیش از نرمال‌سازی)
+NORMALIZATION = "ticker"  # "ticker": z-score هر تیکر | "date": z-score مقطعی هر روز (مناسب LambdaRank/YetiRank؛ فقط برای آزمایش، run_daily_ranking آن را سرویس نمی‌کند)
+if NORMALIZATION == "date":
+    normalizer = date_stats(features)
+else:
+    normalizer = fit_ticker_stats(df, features)  # معادل StandardScaler جداگانه برای هر تیکر
+# Adj Close خام پیش از نرمال‌سازی؛ Beta (مانند سرویس) روی بازده‌های درصدی قیمت خام محاسبه می‌شود
+save_dataset(df[['Ticker', 'Date', 'Adj Close']], 'raw_adj_close.parquet')
+df = normalize(normalizer, df)
+save_normalizer(normalizer, 'normalizer.pkl')  # آمار fit‌شده برای run_daily_ranking
 
 # 6. حذف ردیف‌های بدون هدف یا ویژگی
 df = df.dropna(subset=features + ['Return_7d'])  # حذف ردیف‌های بدون ویژگی یا هدف
@@ -209,19 +180,19 @@ for train_idx, test_idx in tscv.split(X):  # حلقه روی تقسیم‌ها
     # این داده‌ها برای آموزش مدل استفاده می‌شوند
 
 # 8. ذخیره داده‌های پیش‌پردازش‌شده
-df.to_csv('preprocessed_stock_data.csv', index=False)  # ذخیره داده‌ها
+save_dataset(df, 'preprocessed_stock_data.parquet')  # ذخیره داده‌ها
 print("داده‌ها پیش‌پردازش و ذخیره شدند.")
 print(df.head())  # نمایش 5 ردیف اول
 print(df.isnull().sum())  # نمایش تعداد مقادیر گمشده
 
 import matplotlib.pyplot as plt
 
-# بارگذاری داده‌های پیش‌پردازش‌شده
-df = pd.read_csv('preprocessed_stock_data.csv')
-
 # انتخاب ویژگی‌های کلیدی برای بررسی
 key_features = ['Return_7d', 'momentum_rsi', 'trend_macd', 'volatility_atr', 'Sentiment']
 
+# بارگذاری داده‌های پیش‌پردازش‌شده (فقط ستون‌های کلیدی)
+df = load_dataset('preprocessed_stock_data.parquet', columns=key_features)
+
 # رسم نمودار جعبه‌ای
 plt.figure(figsize=(10, 6))
 df[key_features].boxplot()
@@ -243,23 +214,22 @@ for feature in key_features:
     outliers[feature] = outlier_count
     print(f"تعداد نقاط پرت در {feature}: {outlier_count}")
 
+import joblib
+
 # بارگذاری داده‌ها
-df = pd.read_csv('preprocessed_stock_data.csv')
+df = load_dataset('preprocessed_stock_data.parquet')
 
 # انتخاب ویژگی‌های کلیدی
 key_features = ['Return_7d', 'momentum_rsi', 'trend_macd', 'volatility_atr', 'Sentiment']
 
-# محدود کردن نقاط پرت با روش IQR
-for feature in key_features:
-    Q1 = df[feature].quantile(0.25)  # چارک اول
-    Q3 = df[feature].quantile(0.75)  # چارک سوم
-    IQR = Q3 - Q1  # محدوده بین‌چارکی
-    lower_bound = Q1 - 1.5 * IQR
-    upper_bound = Q3 + 1.5 * IQR
-    df[feature] = df[feature].clip(lower_bound, upper_bound)  # محدود کردن مقادیر به بازه مجاز
+# محدود کردن نقاط پرت با روش IQR (حدود Q1 - 1.5·IQR و Q3 + 1.5·IQR هر ویژگی)
+# حدود ذخیره می‌شوند تا سرویس همان clip را روی داده‌ی روز اعمال کند
+outlier_transform = fit_clip_bounds(df, key_features, k=1.5)
+df = apply_clip_bounds(outlier_transform, df)
+joblib.dump(outlier_transform, 'outlier_transform.pkl')
 
 # ذخیره داده‌های اصلاح‌شده
-df.to_csv('preprocessed_stock_data_no_outliers.csv', index=False)
+save_dataset(df, 'preprocessed_stock_data_no_outliers.parquet')
 print("داده‌ها با حذف نقاط پرت ذخیره شدند.")
 print(df.head())
 print(df.isnull().sum())
@@ -269,12 +239,12 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from scipy.stats import shapiro
 
-# بارگذاری داده‌ها
-df = pd.read_csv('preprocessed_stock_data_no_outliers.csv')
+# بارگذاری داده‌ها (فقط ستون‌های کلیدی)
+key_features = ['Return_7d', 'momentum_rsi', 'trend_macd', 'volatility_atr', 'Sentiment']
+df = load_dataset('preprocessed_stock_data_no_outliers.parquet', columns=key_features)
 
 # 1. بررسی آماره‌های توصیفی
 print("آماره‌های توصیفی برای ویژگی‌های کلیدی:")
-key_features = ['Return_7d', 'momentum_rsi', 'trend_macd', 'volatility_atr', 'Sentiment']
 print(df[key_features].describe())
 
 # 2. رسم هیستوگرام برای توزیع داده‌ها
@@ -302,22 +272,26 @@ for feature in key_features:
     else:
         print(f"   {feature} توزیع نرمال ندارد (p <= 0.05)")
 
-from sklearn.preprocessing import PowerTransformer
+import joblib
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from scipy.stats import shapiro
 
 # بارگذاری داده‌ها
-df = pd.read_csv('preprocessed_stock_data_no_outliers.csv')
+df = load_dataset('preprocessed_stock_data_no_outliers.parquet')
 
-# تبدیل داده‌ها با PowerTransformer
+# تبدیل داده‌ها با PowerTransformer (yeo-johnson)؛ lambda و استانداردسازی هر ستون کنار حدود clip ذخیره می‌شوند
+# و سلول مهندسی ویژگی آن‌ها را به feature_transform.pkl اضافه می‌کند
 features_to_transform = ['Return_7d', 'momentum_rsi', 'trend_macd', 'volatility_atr']
-pt = PowerTransformer(method='yeo-johnson')
-df[features_to_transform] = pt.fit_transform(df[features_to_transform])
+power_transform = fit_power_transform(df, features_to_transform)
+df = apply_power_transform(power_transform, df)
+outlier_transform = joblib.load('outlier_transform.pkl')
+outlier_transform.update(power_transform)
+joblib.dump(outlier_transform, 'outlier_transform.pkl')
 
 # ذخیره داده‌های تبدیل‌شده
-df.to_csv('preprocessed_stock_data_transformed.csv', index=False)
+save_dataset(df, 'preprocessed_stock_data_transformed.parquet')
 print("داده‌ها با تبدیل ذخیره شدند.")
 
 # 1. بررسی آماره‌های توصیفی
@@ -355,19 +329,17 @@ for feature in key_features:
 
 """
 
+import json
+import joblib
 import pandas as pd
 import numpy as np
-from sklearn.feature_selection import mutual_info_regression, SelectKBest
 from sklearn.decomposition import PCA
 from sklearn.preprocessing import StandardScaler
 
 # 1. بارگذاری داده‌ها
-df = pd.read_csv('preprocessed_stock_data_transformed.csv', parse_dates=['Date'])
+df = load_dataset('preprocessed_stock_data_transformed.parquet')
 df = df.sort_values(['Ticker', 'Date']).reset_index(drop=True)
 
-# حفظ کپی از Ticker
-ticker_column = df['Ticker'].copy()
-
 # 2. بررسی داده‌ها
 print("اطلاعات کلی:")
 df.info()
@@ -384,86 +356,110 @@ df['Return_7d'].hist(bins=50)
 df = df.drop(columns=['Sentiment', 'Company', 'Sector', 'Industry'])
 
 # 4. مهندسی ویژگی پیشرفته
+# هر ویژگی یک گره با ورودی‌ها و پارامترهای صریح است؛ خروجی گره‌ها در feature_cache با هش محتوا ذخیره می‌شود
+# و با تغییر یک پنجره فقط همان گره و گره‌های وابسته دوباره محاسبه می‌شوند
+feature_dag = FeatureDAG('feature_cache')
+feature_dag.source('data')
+feature_dag.source('raw_prices')  # Adj Close پیش از نرمال‌سازی (برای Beta)
+
 # 4.1. لگ‌ها و تغییرات
-for lag in [1, 3, 5]:
-    df[f'Adj_Close_Lag_{lag}'] = df.groupby('Ticker')['Adj Close'].shift(lag)
-    df[f'Return_Lag_{lag}'] = df.groupby('Ticker')['Return_7d'].shift(lag)
+@feature_dag.node('lags', ['data'], lags=[1, 3, 5])
+def lag_features(data, lags):
+    # ماتریس (زمان × نماد) برای هسته‌های برداری NumPy؛ نتایج بر اساس موقعیت برمی‌گردند
+    panel = TickerPanel(data['Ticker'])
+    adj_close, returns = panel.pivot(data['Adj Close']), panel.pivot(data['Return_7d'])
+    out = {}
+    for lag_period in lags:
+        out[f'Adj_Close_Lag_{lag_period}'] = panel.unpivot(lag(adj_close, lag_period))
+        out[f'Return_Lag_{lag_period}'] = panel.unpivot(lag(returns, lag_period))
+    return pd.DataFrame(out)
 
 # 4.2. میانگین‌های متحرک و کراس‌اوورها
-windows = [5, 10, 20]
-for window in windows:
-    df[f'SMA_{window}'] = df.groupby('Ticker')['Adj Close'].rolling(window=window, min_periods=1).mean().reset_index(0, drop=True)
-    df[f'EMA_{window}'] = df.groupby('Ticker')['Adj Close'].ewm(span=window, adjust=False, min_periods=1).mean().reset_index(0, drop=True)
-df['SMA_Crossover'] = np.where(df['SMA_5'] > df['SMA_20'], 1, 0)
-
-# 4.3. نسبت‌های مالی پیشرفته
-df['EPS'] = df['EPS'].replace(0, np.nan).fillna(df.groupby('Ticker')['EPS'].transform('mean'))
-df['Market Cap'] = df['Market Cap'].replace(0, np.nan).fillna(df.groupby('Ticker')['Market Cap'].transform('mean'))
-df['PE_to_EPS'] = df['P/E Ratio'] / df['EPS']
-df['Volume_to_MarketCap'] = df['Volume'] / df['Market Cap']
-df['RSI_MACD_Ratio'] = df['momentum_rsi'] / (df['trend_macd'].replace(0, 1e-6) + 1e-6)
+@feature_dag.node('moving_averages', ['data'], windows=[5, 10, 20])
+def moving_average_features(data, windows):
+    panel = TickerPanel(data['Ticker'])
+    adj_close = panel.pivot(data['Adj Close'])
+    out = {}
+    for window in windows:
+        out[f'SMA_{window}'] = panel.unpivot(rolling_mean(adj_close, window))
+        out[f'EMA_{window}'] = panel.unpivot(ewm_mean(adj_close, window))
+    return pd.DataFrame(out)
+
+@feature_dag.node('crossover', ['moving_averages'], fast=5, slow=20)
+def crossover_features(moving_averages, fast, slow):
+    return pd.DataFrame({'SMA_Crossover': np.where(moving_averages[f'SMA_{fast}'] > moving_averages[f'SMA_{slow}'], 1, 0)})
+
+# 4.3. نسبت‌های مالی پیشرفته (همان تابع سرویس: EPS، Market Cap، PE_to_EPS، Volume_to_MarketCap و RSI_MACD_Ratio)
+feature_dag.add('ratios', ratio_node, ['data'])
 
 # 4.4. ویژگی‌های نوسانات
-df['Volatility_Rolling_Std'] = df.groupby('Ticker')['Adj Close'].rolling(window=10, min_periods=1).std().reset_index(0, drop=True)
-df['Sharpe_Ratio'] = df['Return_7d'] / (df['Volatility_Rolling_Std'] + 1e-6)
+@feature_dag.node('volatility', ['data'], window=10)
+def volatility_features(data, window):
+    panel = TickerPanel(data['Ticker'])
+    volatility = panel.unpivot(rolling_std(panel.pivot(data['Adj Close']), window))
+    return pd.DataFrame({'Volatility_Rolling_Std': volatility,
+                         'Sharpe_Ratio': data['Return_7d'].to_numpy() / (volatility + 1e-6)})
 
 # 4.5. ویژگی‌های مبتنی بر همبستگی با بازار
-df['Market_Return'] = df.groupby('Date')['Adj Close'].transform('mean')
-# محاسبه Beta با روش جایگزین
-beta_values = []
-for ticker in df['Ticker'].unique():
-    mask = df['Ticker'] == ticker
-    adj_close = df.loc[mask, 'Adj Close']
-    market_return = df.loc[mask, 'Market_Return']
-    if len(adj_close) > 1 and len(market_return) > 1:
-        beta = np.corrcoef(adj_close, market_return)[0, 1]
-    else:
-        beta = 0
-    beta_values.extend([beta] * len(adj_close))
-df['Beta'] = beta_values
+@feature_dag.node('market', ['data', 'raw_prices'], beta_window=30)
+def market_features(data, raw_prices, beta_window):
+    # Beta متحرک با جمع‌های پنجره‌ای روی بازده‌های درصدی Adj Close خام نسبت به میانگین مقطعی آن‌ها
+    # (همان هسته‌ها و همان ورودی سرویس در add_cross_sectional_features)
+    panel = TickerPanel(data['Ticker'])
+    raw_adj_close = data[['Ticker', 'Date']].merge(raw_prices, on=['Ticker', 'Date'], how='left')['Adj Close']
+    returns = panel.unpivot(bar_returns(panel.pivot(raw_adj_close)))
+    market = date_mean(data['Date'], returns)
+    moments = rolling_market_moments(panel.pivot(returns), panel.pivot(market), window=beta_window)
+    return pd.DataFrame({'Market_Return': date_mean(data['Date'], data['Adj Close']),
+                         'Beta': panel.unpivot(moments['beta'])})
+
+# 4.7. ویژگی‌های زمانی
+@feature_dag.node('calendar', ['data'])
+def calendar_features(data):
+    return pd.DataFrame({'Day_of_Week': data['Date'].dt.dayofweek, 'Month': data['Date'].dt.month,
+                         'Quarter': data['Date'].dt.quarter})
+
+df = feature_dag.assemble({'data': df, 'raw_prices': load_dataset('raw_adj_close.parquet')}, base='data')
 
 # 4.6. کاهش ابعادی با PCA
 tech_features = [col for col in df.columns if 'momentum_' in col or 'trend_' in col or 'volatility_' in col]
-scaler = StandardScaler()
-pca = PCA(n_components=5)
-df_tech_scaled = pd.DataFrame(scaler.fit_transform(df[tech_features]), columns=tech_features, index=df.index)
-pca_features = pca.fit_transform(df_tech_scaled)
+# StandardScaler و PCA یک بار در آموزش fit و به صورت یک نگاشت خطی ذخیره می‌شوند؛ سرویس فقط transform می‌کند
+feature_transform = fit_pca_transform(df, tech_features, n_components=5)
+# clip و PowerTransformer پیش‌پردازش؛ سرویس آن‌ها را پس از نرمال‌سازی و پیش از PCA اعمال می‌کند
+feature_transform.update(joblib.load('outlier_transform.pkl'))
+pca_features = apply_pca(feature_transform, df)
 for i in range(pca_features.shape[1]):
     df[f'PCA_Tech_{i+1}'] = pca_features[:, i]
+save_feature_transform(feature_transform, 'feature_transform.pkl')
+# ورودی‌های PCA برای سرویس (فقط اندیکاتورهای مورد نیاز مدل و PCA محاسبه می‌شوند)
+with open('pca_features.json', 'w') as f:
+    json.dump(tech_features, f)
 
-# 4.7. ویژگی‌های زمانی
-df['Day_of_Week'] = df['Date'].dt.dayofweek
-df['Month'] = df['Date'].dt.month
-df['Quarter'] = df['Date'].dt.quarter
-
-# 5. مدیریت NaN با درون‌یابی
+# 5. مدیریت NaN با درون‌یابی خطی داخل هر تیکر (ستونی و برداری روی ماتریس زمان × نماد) و سپس 0
 df = df.infer_objects(copy=False)
-df = df.groupby('Ticker', group_keys=False).apply(
-    lambda x: x.interpolate(method='linear', limit_direction='both').fillna(0),
-    include_groups=False
-).reset_index()  # بازگرداندن Ticker به ستون
-
-# بازیابی ستون Ticker
-df['Ticker'] = ticker_column
+df = fill_by_ticker(df, df.select_dtypes(include=[np.number]).columns, method='interpolate')
 
 # 6. حذف مقادیر غیرمجاز
 df = df.replace([np.inf, -np.inf], np.nan).fillna(0)
 
-# 7. انتخاب ویژگی
+# 7. انتخاب ویژگی: پیش‌فیلتر واریانس/همبستگی، MI موازی روی نمونه‌ی طبقه‌بندی‌شده بر اساس تاریخ،
+# با کش نتیجه برای هر (مجموعه‌ی ویژگی، نسخه‌ی داده)
 features = df.select_dtypes(include=[np.number]).columns.drop('Return_7d')
 if len(features) > 0 and len(df) > 0:
-    X = df[features]
-    y = df['Return_7d']
-    selector = SelectKBest(mutual_info_regression, k=min(50, len(features)))
-    X_selected = selector.fit_transform(X, y)
-    selected_features = features[selector.get_support()].tolist()
+    selected_features = select_features(df, features.tolist(), target='Return_7d', k=min(50, len(features)),
+                                        cache_dir='feature_selection_cache')
+    # همان لیستی که سرویس (run_daily_ranking) به عنوان ورودی مدل می‌خواند
+    write_feature_cols(selected_features, 'feature_cols.json')
 else:
     print("خطا: داده‌ها برای انتخاب ویژگی کافی نیستند.")
     selected_features = []
 
 # 8. ذخیره DataFrame نهایی
 df_final = df[selected_features + ['Ticker', 'Date', 'Return_7d']]
-df_final.to_csv('engineered_stock_data.csv', index=False)
+save_dataset(df_final, 'engineered_stock_data.parquet')
+# نسخه‌ی پارتیشن‌بندی‌شده بر اساس تاریخ برای scoring_engine (فقط آخرین روز خوانده می‌شود)
+# کامل بودن هر روز نسبت به اندازه‌ی یونیورس فعلی (لیست tickers) سنجیده می‌شود
+write_partitions(df_final, 'feature_store', expected_size=len(set(tickers)))
 
 print("مهندسی ویژگی انجام شد. ویژگی‌های انتخاب‌شده:", selected_features)
 print(df_final.head())
@@ -480,7 +476,7 @@ import seaborn as sns
 from sklearn.preprocessing import StandardScaler
 
 # بارگذاری داده‌های نهایی
-df = pd.read_csv('engineered_stock_data.csv')
+df = load_dataset('engineered_stock_data.parquet')
 
 # 1. بررسی اطلاعات کلی
 print("General Information:")
@@ -583,15 +579,19 @@ print(scaled_df.describe())
 import pandas as pd
 import numpy as np
 import os
+import joblib
 
 # ----------------------------------------------------------------------------------------------------
 # 📥 1. بارگذاری داده
 # ----------------------------------------------------------------------------------------------------
-DATA_PATH = "engineered_stock_data.csv"  # مسیر فایل CSV
+DATA_PATH = "engineered_stock_data.parquet"  # مسیر فایل Parquet
+MATRIX_DIR = "feature_matrix"  # ماتریس ویژگی float32 مشترک بین همه‌ی سلول‌های مدل
+MATRIX_SCALER_PATH = "matrix_scaler.pkl"  # scaler ماتریس؛ بازآموزی افزایشی با همین مقیاس ماتریس را بازسازی می‌کند
+DATASET_CACHE_DIR = "dataset_cache"  # Pool های کوانتیزه‌ی CatBoost و دیتاست‌های باینری LightGBM
 if not os.path.exists(DATA_PATH):
     raise FileNotFoundError(f"❌ فایل داده یافت نشد: {DATA_PATH}")
 
-df = pd.read_csv(DATA_PATH, parse_dates=["Date"])
+df = load_model_frame(DATA_PATH)  # فقط Ticker/Date/Return_7d و ویژگی‌های عددی
 print("✅ داده بارگذاری شد:", df.shape)
 
 # ----------------------------------------------------------------------------------------------------
@@ -603,62 +603,55 @@ for col in required_cols:
     if col not in df.columns:
         raise ValueError(f"❌ ستون '{col}' در داده موجود نیست.")
 
-# حذف داده‌های دارای مقدار خالی در Return_7d
-df = df.dropna(subset=["Return_7d"]).reset_index(drop=True)
-
 # انتخاب ویژگی‌های عددی
 non_feature_cols = ["Ticker", "Date", "Return_7d", "index"]
 feature_cols = [c for c in df.columns if c not in non_feature_cols and np.issubdtype(df[c].dtype, np.number)]
 
-# پر کردن مقادیر خالی با روش forward-fill و سپس صفر
-df[feature_cols] = df[feature_cols].fillna(method="ffill").fillna(0)
+# ساخت یک‌باره‌ی ماتریس ویژگی: حذف Return_7d خالی، ffill/0، StandardScaler و مرتب‌سازی (Date, Ticker)
+# سلول‌های بعدی (CatBoost، Walk-Forward، بک‌تست) همین ماتریس را به صورت memory-mapped باز می‌کنند
+matrix_scaler = build_feature_matrix(df, feature_cols, MATRIX_DIR)
+joblib.dump(matrix_scaler, MATRIX_SCALER_PATH)
+del df
+
+fm = FeatureMatrix(MATRIX_DIR)
+df = fm.frame()  # فقط Date/Ticker/Return_7d، هم‌ترتیب با ردیف‌های fm.X
 
 # ----------------------------------------------------------------------------------------------------
 # 🏷 3. ساخت برچسب رتبه‌بندی (relevance)
 # ----------------------------------------------------------------------------------------------------
-df = df.sort_values(["Date", "Ticker"]).reset_index(drop=True)
-q25, q50, q75 = df["Return_7d"].quantile([0.25, 0.5, 0.75]).values
-
-def rel_discrete(x):
-    if x <= q25: return 0
-    elif x <= q50: return 1
-    elif x <= q75: return 2
-    else: return 3
-
-df["rel"] = df["Return_7d"].apply(rel_discrete)
+# برچسب‌گذاری برداری در یک گذر؛ "global": چارک‌های کل داده (np.digitize) | "date": چندک‌های هر روز (هر query)
+LABEL_MODE = "global"
+df["rel"] = relevance_labels(df, mode=LABEL_MODE)
 
 # ----------------------------------------------------------------------------------------------------
 # ⏱ 4. تقسیم زمانی (Train / Validation / Test)
 # ----------------------------------------------------------------------------------------------------
-dates = sorted(df["Date"].dt.date.unique())
-n_dates = len(dates)
-
 test_frac, val_frac = 0.15, 0.10
-train_end = int(n_dates * (1 - test_frac - val_frac))
-val_end = int(n_dates * (1 - test_frac))
-
-train_dates = dates[:train_end]
-val_dates = dates[train_end:val_end]
-test_dates = dates[val_end:]
+train_span, val_span, test_span = fm.split((1 - test_frac - val_frac, val_frac, test_frac))
 
-train = df[df["Date"].dt.date.isin(train_dates)].reset_index(drop=True)
-val = df[df["Date"].dt.date.isin(val_dates)].reset_index(drop=True)
-test = df[df["Date"].dt.date.isin(test_dates)].reset_index(drop=True)
+train = df.iloc[fm.rows(*train_span)].reset_index(drop=True)
+val = df.iloc[fm.rows(*val_span)].reset_index(drop=True)
+test = df.iloc[fm.rows(*test_span)].reset_index(drop=True)
 
-print(f"🧮 تقسیم داده‌ها: Train={len(train_dates)} روز | Val={len(val_dates)} روز | Test={len(test_dates)} روز")
+print(f"🧮 تقسیم داده‌ها: Train={train_span[1] - train_span[0]} روز | Val={val_span[1] - val_span[0]} روز | Test={test_span[1] - test_span[0]} روز")
 
 # ----------------------------------------------------------------------------------------------------
 # 📦 5. آماده‌سازی آرایه‌ها برای LightGBM Ranker
 # ----------------------------------------------------------------------------------------------------
-def build_lgb_arrays(df_split):
-    X = df_split[feature_cols].values
-    y = df_split["rel"].values.astype(int)
-    groups = df_split.groupby(df_split["Date"].dt.date).size().to_numpy()
+def build_lgb_arrays(span):
+    rows = fm.rows(*span)
+    X = fm.X[rows]  # view روی memmap، بدون کپی
+    y = df["rel"].values[rows].astype(int)
+    groups = fm.group_sizes(*span)
     return X, y, groups
 
-X_train, y_train, g_train = build_lgb_arrays(train)
-X_val, y_val, g_val = build_lgb_arrays(val)
-X_test, y_test, g_test = build_lgb_arrays(test)
+X_train, y_train, g_train = build_lgb_arrays(train_span)
+X_val, y_val, g_val = build_lgb_arrays(val_span)
+X_test, y_test, g_test = build_lgb_arrays(test_span)
+
+# دیتاست‌های باینری (bin شده) train/val با کلید نسخه‌ی داده + لیست ویژگی‌ها + برچسب‌ها؛
+# اجرای دوباره و آزمایش‌های ابرپارامتر فایل‌های .bin را مستقیم بارگذاری می‌کنند
+lgb_sets = lightgbm_datasets(fm, {"train": train_span, "val": val_span}, df["rel"].values.astype(int), DATASET_CACHE_DIR)
 
 print("✅ داده‌ها برای مدل LightGBM آماده شدند.")
 print(f"📊 X_train: {X_train.shape}, X_val: {X_val.shape}, X_test: {X_test.shape}")
@@ -666,6 +659,29 @@ print(f"📊 تعداد ویژگی‌ها: {len(feature_cols)}")
 
 # ====================================================================================================
 
+# ====================================================================================================
+# 🔎 جست‌وجوی موازی ابرپارامترها (LightGBM LambdaRank و CatBoost YetiRank)
+# ----------------------------------------------------------------------------------------------------
+#   - هر trial در یک فرایند جدا با تعداد نخ محدود (SEARCH_WORKERS × SEARCH_THREADS ≈ تعداد هسته‌ها)
+#   - trial های ضعیف با مقایسه‌ی NDCG@5 میانی با میانه‌ی trial های قبلی زودتر متوقف (هرس) می‌شوند
+#   - همه‌ی trial ها در SEARCH_STORE ثبت می‌شوند؛ اجرای دوباره از همان‌جا ادامه می‌دهد
+#   - سلول‌های آموزش بهترین پارامترهای ثبت‌شده را جایگزین مقادیر پیش‌فرض می‌کنند
+# ====================================================================================================
+RUN_SEARCH = False
+SEARCH_STORE = "hyperparameter_search/trials.jsonl"
+SEARCH_TRIALS = 40
+SEARCH_THREADS = 2
+SEARCH_WORKERS = max(1, os.cpu_count() // SEARCH_THREADS)
+
+if RUN_SEARCH:
+    for ranker_name in ("lightgbm", "catboost"):
+        trials = run_search(ranker_name, MATRIX_DIR, SEARCH_TRIALS, SEARCH_STORE, DATASET_CACHE_DIR,
+                            label_mode=LABEL_MODE, fractions=(1 - test_frac - val_frac, val_frac, test_frac),
+                            n_workers=SEARCH_WORKERS, threads_per_worker=SEARCH_THREADS)
+        display(trials.sort_values("score", ascending=False).head(10))
+
+# ====================================================================================================
+
 # ====================================================================================================
 # 🎯 آموزش و ارزیابی مدل LightGBM LambdaRank برای سیستم توصیه‌گر سهام
 # ----------------------------------------------------------------------------------------------------
@@ -683,15 +699,24 @@ import matplotlib.pyplot as plt
 # ----------------------------------------------------------------------------------------------------
 # ⚙️ تنظیمات مدل
 # ----------------------------------------------------------------------------------------------------
-ranker = lgb.LGBMRanker(
+lgb_params = dict(
     objective="lambdarank",    # نوع هدف مدل: یادگیری رتبه‌ای (Ranking)
     learning_rate=0.05,        # نرخ یادگیری
     num_leaves=31,             # تعداد برگ‌های هر درخت
     min_data_in_leaf=20,       # حداقل تعداد داده در هر برگ
-    n_estimators=2000,         # حداکثر تعداد iteration
-    random_state=42,           # مقدار ثابت برای تکرارپذیری
-    metric="ndcg"              # معیار ارزیابی: NDCG
+    seed=42,                   # مقدار ثابت برای تکرارپذیری
+    metric="ndcg",             # معیار ارزیابی: NDCG
+    verbose=-1
 )
+LGB_NUM_ROUNDS = 2000          # حداکثر تعداد iteration
+
+# بهترین پارامترهای جست‌وجوی ابرپارامتر (در صورت وجود) جایگزین مقادیر بالا می‌شوند
+SEARCH_STORE = "hyperparameter_search/trials.jsonl"
+# فقط trial های همین ماتریس، حالت برچسب و بازه‌های train/val (همان کلیدی که run_search ثبت کرده است)
+lgb_searched = best_params("lightgbm", SEARCH_STORE, search_data_key(fm, LABEL_MODE, train_span, val_span))
+if lgb_searched:
+    lgb_params.update(lgb_searched, bagging_freq=1)
+    print("🔎 پارامترهای جست‌وجوشده:", lgb_searched)
 
 # ----------------------------------------------------------------------------------------------------
 # ⏸ تعریف callback‌ها برای توقف زودهنگام و گزارش لاگ
@@ -704,13 +729,15 @@ callbacks = [
 # ----------------------------------------------------------------------------------------------------
 # 🚀 آموزش مدل
 # ----------------------------------------------------------------------------------------------------
-ranker.fit(
-    X_train,                   # ویژگی‌های آموزشی
-    y_train,                   # برچسب‌های رتبه‌ای
-    group=g_train.tolist(),    # اندازه‌ی گروه‌ها (بر اساس Ticker)
-    eval_set=[(X_val, y_val)], # داده‌های اعتبارسنجی
-    eval_group=[g_val.tolist()],
-    callbacks=callbacks         # callbackها برای early stopping و log
+# lgb.train روی دیتاست‌های باینری کش‌شده (label و group داخل فایل‌اند)؛ خروجی Booster است
+# که predict آن مانند LGBMRanker روی آرایه‌ی ویژگی‌ها کار می‌کند (best_iteration به طور پیش‌فرض)
+ranker = lgb.train(
+    lgb_params,
+    lgb_sets["train"],              # ویژگی‌ها، برچسب‌های رتبه‌ای و اندازه‌ی گروه‌ها (هر تاریخ)
+    num_boost_round=LGB_NUM_ROUNDS,
+    valid_sets=[lgb_sets["val"]],   # داده‌های اعتبارسنجی
+    valid_names=["val"],
+    callbacks=callbacks             # callbackها برای early stopping و log
 )
 
 print("🏁 آموزش مدل با موفقیت انجام شد!")
@@ -769,7 +796,7 @@ display(top_stocks)
 # ----------------------------------------------------------------------------------------------------
 feature_importance = pd.DataFrame({
     "feature": feature_cols,
-    "importance": ranker.booster_.feature_importance(importance_type="gain")
+    "importance": ranker.feature_importance(importance_type="gain")
 }).sort_values(by="importance", ascending=False)
 
 plt.figure(figsize=(10, 8))
@@ -810,73 +837,45 @@ from sklearn.metrics import ndcg_score
 from sklearn.preprocessing import StandardScaler
 
 # ---------- SETTINGS ----------
-DATA_PATH = "engineered_stock_data.csv"   # <-- change if needed
+MATRIX_DIR = "feature_matrix"   # built once in the LightGBM data-prep cell
+DATASET_CACHE_DIR = "dataset_cache"  # quantized pools keyed by data version + feature list + labels
 TOPK = 5      # compute NDCG@TOPK and Precision@TOPK
 TOPN_OUT = 10 # final recommended top-N to save/show
 RELEVANCE_THRESHOLD = 2 # rel >= 2 is considered relevant for Precision@K
 
-# ---------- 1) Load data ----------
-if not os.path.exists(DATA_PATH):
-    raise FileNotFoundError(f"Data file not found: {DATA_PATH}")
-
-df = pd.read_csv(DATA_PATH, parse_dates=["Date"])
-print("Loaded:", df.shape)
-# required columns check
-for col in ["Ticker", "Date", "Return_7d"]:
-    if col not in df.columns:
-        raise ValueError(f"Required column missing: {col}")
+# ---------- 1) Open the shared memory-mapped feature matrix ----------
+# Features are already NaN-filled, standardized (float32) and ordered by (Date, Ticker).
+if not os.path.exists(MATRIX_DIR):
+    raise FileNotFoundError(f"Feature matrix not found: {MATRIX_DIR}")
 
-# ---------- 2) Basic preprocessing & numeric feature selection ----------
-df = df.dropna(subset=["Return_7d"]).reset_index(drop=True)
-non_feature_cols = ["Ticker", "Date", "Return_7d", "index"]
-feature_cols = [c for c in df.columns if c not in non_feature_cols and pd.api.types.is_numeric_dtype(df[c])]
+fm = FeatureMatrix(MATRIX_DIR)
+feature_cols = fm.feature_cols
+df = fm.frame()  # Date / Ticker / Return_7d only, aligned with fm.X rows
+print("Loaded:", fm.X.shape)
 print("Using numeric features:", len(feature_cols))
 
-# fill NaNs simply
-df[feature_cols] = df[feature_cols].fillna(method="ffill").fillna(0)
-
-# standardize numeric features
-scaler = StandardScaler()
-df[feature_cols] = scaler.fit_transform(df[feature_cols])
-
 # ---------- 3) Build discrete relevance labels (0..3) from Return_7d ----------
-df = df.sort_values(["Date", "Ticker"]).reset_index(drop=True)
-q25, q50, q75 = df["Return_7d"].quantile([0.25, 0.5, 0.75]).values
-def rel_discrete(x):
-    if x <= q25: return 0
-    elif x <= q50: return 1
-    elif x <= q75: return 2
-    else: return 3
-df["rel"] = df["Return_7d"].apply(rel_discrete)
+df["rel"] = relevance_labels(df, mode=LABEL_MODE)  # vectorized, same grades as the LightGBM cell
 
 # ---------- 4) Time-based split (train/val/test) ----------
-unique_dates = sorted(df["Date"].dt.date.unique())
-n_dates = len(unique_dates)
 test_frac, val_frac = 0.15, 0.10
-train_end = int(n_dates * (1 - test_frac - val_frac))
-val_end = int(n_dates * (1 - test_frac))
-train_dates = unique_dates[:train_end]
-val_dates = unique_dates[train_end:val_end]
-test_dates = unique_dates[val_end:]
-
-train = df[df["Date"].dt.date.isin(train_dates)].reset_index(drop=True)
-val = df[df["Date"].dt.date.isin(val_dates)].reset_index(drop=True)
-test = df[df["Date"].dt.date.isin(test_dates)].reset_index(drop=True)
-print(f"Dates split -> train: {len(train_dates)}, val: {len(val_dates)}, test: {len(test_dates)}")
+train_span, val_span, test_span = fm.split((1 - test_frac - val_frac, val_frac, test_frac))
+
+train = df.iloc[fm.rows(*train_span)].reset_index(drop=True)
+val = df.iloc[fm.rows(*val_span)].reset_index(drop=True)
+test = df.iloc[fm.rows(*test_span)].reset_index(drop=True)
+print(f"Dates split -> train: {train_span[1] - train_span[0]}, val: {val_span[1] - val_span[0]}, test: {test_span[1] - test_span[0]}")
 print("Rows ->", train.shape, val.shape, test.shape)
 
 # ---------- 5) Prepare CatBoost Pools (group_id per row) ----------
-date_to_qid = {d:i for i,d in enumerate(sorted(df["Date"].dt.date.unique()))}
-train_group_ids = train["Date"].dt.date.map(date_to_qid).values
-val_group_ids = val["Date"].dt.date.map(date_to_qid).values
-test_group_ids = test["Date"].dt.date.map(date_to_qid).values
-
-train_pool = Pool(data=train[feature_cols], label=train["rel"], group_id=train_group_ids)
-val_pool = Pool(data=val[feature_cols], label=val["rel"], group_id=val_group_ids)
-test_pool = Pool(data=test[feature_cols], label=test["rel"], group_id=test_group_ids)
+# train/val pools are quantized once (borders from train) and cached; later runs load them directly.
+# The test pool is only used for predict, so it stays a raw zero-copy memmap view.
+cb_pools = catboost_pools(fm, {"train": train_span, "val": val_span}, df["rel"].values.astype(int), DATASET_CACHE_DIR)
+train_pool, val_pool = cb_pools["train"], cb_pools["val"]
+test_pool = Pool(data=fm.X[fm.rows(*test_span)], label=test["rel"], group_id=fm.group_ids(*test_span))
 
 # Group sizes for metric calculation
-g_test = test.groupby(test["Date"].dt.date).size().to_numpy()
+g_test = fm.group_sizes(*test_span)
 
 # ---------- 6) Train CatBoostRanker (YetiRank - Robust Settings) ----------
 print("\nPreparing CatBoost pools and training CatBoostRanker ...")
@@ -891,6 +890,13 @@ cb_params = {
     "early_stopping_rounds":150, # Increased stopping rounds
     "l2_leaf_reg": 3.0 # L2 regularization added for robustness
 }
+# best configuration from the hyperparameter search cell, if one has been run
+SEARCH_STORE = "hyperparameter_search/trials.jsonl"
+# only trials recorded for this matrix, label mode and train/val spans (the key run_search stored)
+cb_searched = best_params("catboost", SEARCH_STORE, search_data_key(fm, LABEL_MODE, train_span, val_span))
+if cb_searched:
+    cb_params.update(cb_searched)
+    print("Using searched CatBoost params:", cb_searched)
 cb_ranker = CatBoostRanker(**{k:v for k,v in cb_params.items() if k!="verbose"})
 print("Training CatBoostRanker (YetiRank) with enhanced settings...")
 cb_ranker.fit(train_pool, eval_set=val_pool, verbose=100)
@@ -968,15 +974,45 @@ cb_ranker.save_model("catboost_ranker_optimized.cbm")
 print("Model saved: catboost_ranker_optimized.cbm")
 # ===============================================================
 
+# ===============================================================
+# ✅ Incremental CatBoost refresh (warm start from the deployed model)
+# - Rebuilds the feature matrix on the latest engineered data with the saved matrix scaler,
+#   so new trees see the same feature scale as the deployed ones
+# - Continues catboost_ranker_optimized.cbm on a recent window with early stopping on a trailing
+#   validation window, then refits the chosen number of new trees including the newest labeled dates
+# - Output: versioned model in model_versions/ (+ versions.json), promoted only if validation improved
+# ===============================================================
+import json
+
+DATA_PATH = "engineered_stock_data.parquet"
+MATRIX_SCALER_PATH = "matrix_scaler.pkl"
+REFRESH_MATRIX_DIR = "feature_matrix_refresh"
+CB_MODEL_PATH = "catboost_ranker_optimized.cbm"
+VERSIONS_DIR = "model_versions"
+INCREMENTAL_TRAIN_DAYS = 250  # recent window for the new trees
+INCREMENTAL_VAL_DAYS = 20     # trailing validation window for early stopping
+
+with open(os.path.join(MATRIX_DIR, "meta.json"), "r") as f:
+    refresh_cols = json.load(f)["feature_cols"]  # same inputs, same order as the deployed model
+build_feature_matrix(load_model_frame(DATA_PATH), refresh_cols, REFRESH_MATRIX_DIR, scaler=joblib.load(MATRIX_SCALER_PATH))
+refresh_fm = FeatureMatrix(REFRESH_MATRIX_DIR)
+
+cb_version = incremental_retrain(refresh_fm, CB_MODEL_PATH, VERSIONS_DIR, label_mode=LABEL_MODE,
+                                 train_days=INCREMENTAL_TRAIN_DAYS, val_days=INCREMENTAL_VAL_DAYS)
+if cb_version is not None:
+    promote_version(cb_version, VERSIONS_DIR, CB_MODEL_PATH)
+# ===============================================================
+
 # Commented out IPython magic to ensure Python compatibility.
 # Install required packages if not already installed
 # %pip install lightgbm
 
 # ===============================================================
-# ✅ Walk-forward evaluation for pre-trained LightGBM and CatBoostRanker
-# - Uses saved models from previous runs (lgb_ranker_tuned.pkl, catboost_ranker_optimized.cbm)
-# - Time-based walk-forward validation to assess model stability
-# - Outputs: NDCG@K and Precision@K over multiple folds, recommendations
+# ✅ Walk-forward evaluation for LightGBM and CatBoostRanker
+# - "retrain": both rankers are retrained per expanding window (embargoed from the next fold), folds run
+#   concurrently in processes sharing the memory-mapped matrix; "pretrained": scores the saved models
+# - Test set and recommendations use the saved models (lgb_ranker_tuned.pkl, catboost_ranker_optimized.cbm)
+# - Outputs: NDCG@K and Precision@K over multiple folds (walk_forward_results.csv), recommendations
 # ===============================================================
 import os
 import numpy as np
@@ -989,61 +1025,46 @@ import warnings
 warnings.filterwarnings("ignore")
 
 # ---------- SETTINGS ----------
-DATA_PATH = "engineered_stock_data.csv"  # Must match previous runs
+MATRIX_DIR = "feature_matrix"  # Must match previous runs
 LGB_MODEL_PATH = "lgb_ranker_tuned.pkl"
 CB_MODEL_PATH = "catboost_ranker_optimized.cbm"
 TOPK = 5  # Compute NDCG@TOPK and Precision@K
 TOPN_OUT = 10  # Top-N recommendations to show
 N_FOLDS = 5  # Number of walk-forward folds
+WALK_FORWARD_MODE = "retrain"  # "retrain": true walk-forward | "pretrained": saved models only (leaks on early folds)
+WF_RESULTS_PATH = "walk_forward_results.csv"
 
-# ---------- 1) Load and preprocess data ----------
-if not os.path.exists(DATA_PATH):
-    raise FileNotFoundError(f"Data file not found: {DATA_PATH}")
+# ---------- 1) Open the shared feature matrix ----------
+# Features are already NaN-filled and scaled (same preprocessing as Model 2)
+if not os.path.exists(MATRIX_DIR):
+    raise FileNotFoundError(f"Feature matrix not found: {MATRIX_DIR}")
 
-df = pd.read_csv(DATA_PATH, parse_dates=["Date"])
-df = df.dropna(subset=["Return_7d"]).reset_index(drop=True)
-non_feature_cols = ["Ticker", "Date", "Return_7d", "index"]
-feature_cols = [c for c in df.columns if c not in non_feature_cols and pd.api.types.is_numeric_dtype(df[c])]
-df[feature_cols] = df[feature_cols].fillna(method="ffill").fillna(0)
-
-# Scale features (must match preprocessing in Model 2)
-from sklearn.preprocessing import StandardScaler
-scaler = StandardScaler()
-df[feature_cols] = scaler.fit_transform(df[feature_cols])
+fm = FeatureMatrix(MATRIX_DIR)
+feature_cols = fm.feature_cols
+df = fm.frame()
 
 # Create relevance labels (same as Model 2)
-df = df.sort_values(["Date", "Ticker"]).reset_index(drop=True)
-q25, q50, q75 = df["Return_7d"].quantile([0.25, 0.5, 0.75]).values
-def rel_discrete(x):
-    if x <= q25: return 0
-    elif x <= q50: return 1
-    elif x <= q75: return 2
-    else: return 3
-df["rel"] = df["Return_7d"].apply(rel_discrete)
+df["rel"] = relevance_labels(df, mode=LABEL_MODE)
 
 # ---------- 2) Walk-forward split ----------
-unique_dates = sorted(df["Date"].dt.date.unique())
-n_dates = len(unique_dates)
+# Each fold is a (first_date_idx, last_date_idx) span over the matrix date groups
+n_dates = fm.n_dates
 fold_size = n_dates // (N_FOLDS + 1)  # Reserve one fold for final test
 folds = []
 for i in range(N_FOLDS):
     train_end = (i + 1) * fold_size
     val_start = train_end
     val_end = train_end + fold_size
-    train_dates = unique_dates[:train_end]
-    val_dates = unique_dates[val_start:val_end]
-    folds.append({
-        "train": df[df["Date"].dt.date.isin(train_dates)].reset_index(drop=True),
-        "val": df[df["Date"].dt.date.isin(val_dates)].reset_index(drop=True)
-    })
-test_dates = unique_dates[-fold_size:]
-test = df[df["Date"].dt.date.isin(test_dates)].reset_index(drop=True)
+    folds.append({"train": (0, train_end), "val": (val_start, val_end)})
+test_span = (n_dates - fold_size, n_dates)
+test = df.iloc[fm.rows(*test_span)].reset_index(drop=True)
 
 # ---------- 3) Utility functions ----------
-def build_lgb_arrays(df_split):
-    X = df_split[feature_cols].values
-    y = df_split["rel"].values.astype(int)
-    groups = df_split.groupby(df_split["Date"].dt.date).size().to_numpy()
+def build_lgb_arrays(span):
+    rows = fm.rows(*span)
+    X = fm.X[rows]  # zero-copy memmap view
+    y = df["rel"].values[rows].astype(int)
+    groups = fm.group_sizes(*span)
     return X, y, groups
 
 def per_query_metrics(df_split, preds, groups, K=TOPK):
@@ -1080,11 +1101,19 @@ cb_ranker.load_model(CB_MODEL_PATH)
 # ---------- 5) Walk-forward evaluation ----------
 lgb_results = []
 cb_results = []
-for i, fold in enumerate(folds):
+if WALK_FORWARD_MODE == "retrain":
+    # lgb_params / LGB_NUM_ROUNDS / cb_params come from the training cells (searched params included)
+    wf_table = run_walk_forward(MATRIX_DIR, N_FOLDS, lgb_params, cb_params, WF_RESULTS_PATH,
+                                label_mode=LABEL_MODE, lgb_rounds=LGB_NUM_ROUNDS, k=TOPK)
+    display(wf_table)
+    for model_name, model_results in (("LightGBM", lgb_results), ("CatBoost", cb_results)):
+        for _, row in wf_table[wf_table["model"] == model_name].iterrows():
+            model_results.append({"ndcg_mean": row[f"ndcg@{TOPK}"], "prec_mean": row[f"precision@{TOPK}"]})
+
+for i, fold in enumerate(folds if WALK_FORWARD_MODE == "pretrained" else []):
     print(f"\nFold {i+1}/{N_FOLDS}")
-    val = fold["val"]
-    X_val, y_val, g_val = build_lgb_arrays(val)
-    val_group_ids = val["Date"].dt.date.map({d:j for j,d in enumerate(sorted(val["Date"].dt.date.unique()))}).values
+    val = df.iloc[fm.rows(*fold["val"])].reset_index(drop=True)
+    X_val, y_val, g_val = build_lgb_arrays(fold["val"])
 
     # Evaluate LightGBM
     lgb_preds = lgb_ranker.predict(X_val)
@@ -1092,18 +1121,17 @@ for i, fold in enumerate(folds):
     lgb_results.append(aggregate_metrics(lgb_fold_results))
 
     # Evaluate CatBoost
-    val_pool = Pool(data=val[feature_cols], label=val["rel"], group_id=val_group_ids)
+    val_pool = Pool(data=X_val, label=y_val, group_id=fm.group_ids(*fold["val"]))
     cb_preds = cb_ranker.predict(val_pool)
     cb_fold_results = per_query_metrics(val, cb_preds, g_val)
     cb_results.append(aggregate_metrics(cb_fold_results))
 
 # Evaluate on test set
-X_test, y_test, g_test = build_lgb_arrays(test)
-test_group_ids = test["Date"].dt.date.map({d:j for j,d in enumerate(sorted(test["Date"].dt.date.unique()))}).values
+X_test, y_test, g_test = build_lgb_arrays(test_span)
 lgb_preds = lgb_ranker.predict(X_test)
 lgb_test_results = per_query_metrics(test, lgb_preds, g_test)
 lgb_test_metrics = aggregate_metrics(lgb_test_results)
-test_pool = Pool(data=test[feature_cols], label=test["rel"], group_id=test_group_ids)
+test_pool = Pool(data=X_test, label=y_test, group_id=fm.group_ids(*test_span))
 cb_preds = cb_ranker.predict(test_pool)
 cb_test_results = per_query_metrics(test, cb_preds, g_test)
 cb_test_metrics = aggregate_metrics(cb_test_results)
@@ -1177,7 +1205,7 @@ import joblib
 import matplotlib.pyplot as plt
 
 # ---------- SETTINGS ----------
-DATA_PATH = "engineered_stock_data.csv"
+MATRIX_DIR = "feature_matrix"
 CB_MODEL_PATH = "catboost_ranker_optimized.cbm"
 FEE_RATES = [0.001, 0.005, 0.01]  # کارمزدهای مختلف (0.1%, 0.5%, 1%)
 SLIPPAGE_RATE = 0.0005  # لغزش قیمت (0.05%)
@@ -1186,24 +1214,16 @@ SIM_DAYS = 10  # تعداد روزهای شبیه‌سازی
 INITIAL_CAPITAL = 10000  # سرمایه اولیه (به دلار)
 
 # ---------- 1) Load data and model ----------
-df = pd.read_csv(DATA_PATH, parse_dates=["Date"])
+# Shared memory-mapped matrix: features already filled and scaled, rows ordered by (Date, Ticker)
+fm = FeatureMatrix(MATRIX_DIR)
+feature_cols = fm.feature_cols
+df = fm.frame()
 cb_ranker = CatBoostRanker()
 cb_ranker.load_model(CB_MODEL_PATH)
 
-# Preprocess
-df = df.dropna(subset=["Return_7d"]).reset_index(drop=True)
-non_feature_cols = ["Ticker", "Date", "Return_7d", "index"]
-feature_cols = [c for c in df.columns if c not in non_feature_cols and pd.api.types.is_numeric_dtype(df[c])]
-df[feature_cols] = df[feature_cols].fillna(method="ffill").fillna(0)
-from sklearn.preprocessing import StandardScaler
-scaler = StandardScaler()
-df[feature_cols] = scaler.fit_transform(df[feature_cols])
-q25, q50, q75 = df["Return_7d"].quantile([0.25, 0.5, 0.75]).values
-def rel_discrete(x): return 0 if x <= q25 else 1 if x <= q50 else 2 if x <= q75 else 3
-df["rel"] = df["Return_7d"].apply(rel_discrete)
+df["rel"] = relevance_labels(df, mode=LABEL_MODE)
 
-df = df.sort_values(["Date", "Ticker"]).reset_index(drop=True)
-unique_dates = sorted(df["Date"].dt.date.unique())
+unique_dates = fm.dates
 test_dates = unique_dates[-SIM_DAYS:]
 
 # ---------- 2) Simulate trading for different fee rates ----------
@@ -1213,8 +1233,9 @@ portfolio = {rate: [] for rate in FEE_RATES}
 for fee_rate in FEE_RATES:
     capital = INITIAL_CAPITAL
     for date in test_dates:
-        daily_df = df[df["Date"].dt.date == date].reset_index(drop=True)
-        X = daily_df[feature_cols].values
+        rows = fm.date_rows(date)
+        daily_df = df.iloc[rows].reset_index(drop=True)
+        X = fm.X[rows]
         preds = cb_ranker.predict(X)
         topk_idx = np.argsort(preds)[-TOPK:][::-1]
         top_stocks = daily_df.iloc[topk_idx]
@@ -1266,7 +1287,7 @@ import matplotlib.pyplot as plt
 from datetime import timedelta # FIX: اضافه شدن برای استفاده از timedelta
 
 # ---------- SETTINGS (تنظیمات) ----------
-DATA_PATH = "engineered_stock_data.csv"
+MATRIX_DIR = "feature_matrix"
 CB_MODEL_PATH = "catboost_ranker_optimized.cbm"
 INITIAL_CAPITAL = 100000 # سرمایه اولیه
 TOPK = 5 # تعداد سهام پیشنهادی در هر روز
@@ -1275,22 +1296,16 @@ SLIPPAGE_RATE = 0.0005 # لغزش قیمت (0.05%)
 TEST_SPLIT_RATIO = 0.2 # نسبت داده‌های تست (برای تعیین شروع بک‌تست)
 
 # ---------- ۱) Load Data and Preprocess (همانند مدل‌سازی) ----------
-df = pd.read_csv(DATA_PATH, parse_dates=["Date"])
-df = df.dropna(subset=["Return_7d"]).reset_index(drop=True)
-
-# Define features and scale (باید با فرآیند آموزش تطابق کامل داشته باشد)
-non_feature_cols = ["Ticker", "Date", "Return_7d", "index"]
-feature_cols = [c for c in df.columns if c not in non_feature_cols and pd.api.types.is_numeric_dtype(df[c])]
-df[feature_cols] = df[feature_cols].fillna(method="ffill").fillna(0)
-scaler = StandardScaler()
-df[feature_cols] = scaler.fit_transform(df[feature_cols])
-df = df.sort_values(["Date", "Ticker"]).reset_index(drop=True)
+# ماتریس مشترک memory-mapped: ویژگی‌ها از قبل پر و scale شده‌اند (تطابق کامل با آموزش)
+fm = FeatureMatrix(MATRIX_DIR)
+feature_cols = fm.feature_cols
+df = fm.frame()
 
 # Define Test Set
-unique_dates = sorted(df["Date"].dt.date.unique())
+unique_dates = fm.dates
 test_size = int(len(unique_dates) * TEST_SPLIT_RATIO)
 test_dates = unique_dates[-test_size:]
-test_df = df[df["Date"].dt.date.isin(test_dates)].reset_index(drop=True)
+test_df = df.iloc[fm.rows(fm.n_dates - test_size, fm.n_dates)].reset_index(drop=True)
 
 # ---------- ۲) Load Model ----------
 cb_ranker = CatBoostRanker()
@@ -1337,13 +1352,14 @@ for date in test_dates:
     capital += closed_return
 
     # ۳. پیش‌بینی و ورود (Entry)
-    daily_df = test_df[test_df["Date"].dt.date == date].reset_index(drop=True)
+    rows = fm.date_rows(date)
+    daily_df = df.iloc[rows].reset_index(drop=True)
 
     if len(daily_df) < TOPK:
         capital_history.append({"Date": date, "Capital": capital})
         continue
 
-    X = daily_df[feature_cols].values
+    X = fm.X[rows]
 
     # FIX: تبدیل group_ids به integer
     group_ids = np.zeros(len(daily_df), dtype=int)
@@ -1452,7 +1468,10 @@ warnings.filterwarnings("ignore")
 # =================================================================
 # تنظیمات
 # =================================================================
-DATA_PATH = "engineered_stock_data.csv"
+# Volume خام (پیش از نرمال‌سازی per-ticker پیش‌پردازش) برای فیلتر نقدینگی؛
+# در engineered_stock_data.parquet ستون Volume z-score شده است و با آستانه‌ی 100000 مقایسه‌پذیر نیست
+RAW_DATA_PATH = "final_enhanced_stock_dataset.parquet"
+MATRIX_DIR = "feature_matrix"
 CB_MODEL_PATH = "catboost_ranker_optimized.cbm"
 INITIAL_CAPITAL = 100000
 TOPK = 5
@@ -1477,7 +1496,7 @@ SLIPPAGE_RATE = 0.0005 # ثابت نگه داشتن لغزش قیمت (0.05%)
 # توابع Utility (برای اجرای بک‌تست در هر سناریو)
 # =================================================================
 
-def run_backtest(test_config, test_df, cb_ranker, feature_cols, all_df):
+def run_backtest(test_config, fm, test_df, cb_ranker, volume_df):
     """اجرای شبیه‌سازی بک‌تست بر اساس تنظیمات سناریو"""
 
     fee_rate = test_config["fee"]
@@ -1490,9 +1509,10 @@ def run_backtest(test_config, test_df, cb_ranker, feature_cols, all_df):
 
     # اطمینان از تعریف ستون بازده صحیح
     return_col = f'Return_{holding_days}d'
-    if return_col not in all_df.columns:
+    if return_col not in test_df.columns:
          return_col = "Return_7d" # بازگشت به ستون پیش فرض
 
+    row_offset = fm.date_rows(test_df["Date"].iloc[0]).start
     for date in sorted(test_df["Date"].dt.date.unique()):
 
         # ۱. پردازش سهام در حال نگهداری (Exit)
@@ -1517,27 +1537,25 @@ def run_backtest(test_config, test_df, cb_ranker, feature_cols, all_df):
         capital += closed_return
 
         # ۲. پیش‌بینی و ورود (Entry)
-        daily_df = test_df[test_df["Date"].dt.date == date].copy().reset_index(drop=True)
+        rows = fm.date_rows(date)
+        daily_df = test_df.iloc[rows.start - row_offset:rows.stop - row_offset].copy().reset_index(drop=True)
+        daily_df["row"] = np.arange(rows.start, rows.stop)  # اندیس ردیف در fm.X
 
-        # اعمال فیلتر نقدینگی (اصلاح شده)
+        # اعمال فیلتر نقدینگی بر اساس Volume خام (تعداد سهم معامله‌شده از RAW_DATA_PATH)
         if volume_threshold is not None:
-            try:
-                # استفاده از دیتافریم اصلی (all_df) که شامل Volume است (اگرچه هنوز Scaled است)
-                current_volume_info = all_df[all_df["Date"].dt.date == date][["Ticker", "Volume"]]
+            if volume_df is None:
+                print(f"\n[WARNING] Column 'Volume' not found. Skipping Liquidity Filter for this scenario.")
+            else:
+                current_volume_info = volume_df[volume_df["Date"].dt.date == date][["Ticker", "Volume"]]
                 daily_df = daily_df.merge(current_volume_info, on=["Ticker"], how="left")
-                # فیلتر کردن بر اساس Volume (فرض می‌کنیم Volume به عنوان یک ویژگی فنی مهندسی نشده، در مقیاس اصلی خود باقی مانده باشد)
                 daily_df = daily_df[daily_df["Volume"] > volume_threshold]
-            except KeyError:
-                if 'Volume' in test_config["name"]:
-                    print(f"\n[WARNING] Column 'Volume' not found. Skipping Liquidity Filter for this scenario.")
-                pass # اگر ستون Volume وجود ندارد، فیلتر نقدینگی اعمال نمی‌شود.
 
         if len(daily_df) < TOPK:
             portfolio_value = capital + sum(p['Investment'] for p in positions.values())
             capital_history.append({"Date": date, "Capital": portfolio_value})
             continue
 
-        X = daily_df[feature_cols].values
+        X = fm.X[daily_df["row"].values]
         group_ids = np.zeros(len(daily_df), dtype=int)
         daily_pool = Pool(data=X, group_id=group_ids)
         preds = cb_ranker.predict(daily_pool)
@@ -1599,23 +1617,17 @@ def run_backtest(test_config, test_df, cb_ranker, feature_cols, all_df):
 # =================================================================
 
 # ۱. Load Data and Preprocess (همانند قبل)
-df = pd.read_csv(DATA_PATH, parse_dates=["Date"])
-df = df.dropna(subset=["Return_7d"]).reset_index(drop=True)
-non_feature_cols = ["Ticker", "Date", "Return_7d", "index"]
-feature_cols = [c for c in df.columns if c not in non_feature_cols and pd.api.types.is_numeric_dtype(df[c])]
+# ماتریس مشترک memory-mapped به جای کپی کامل دیتافریم (all_df)
+fm = FeatureMatrix(MATRIX_DIR)
+df = fm.frame()
 
-# حفظ یک کپی از دیتافریم با ستون Volume (اگر موجود است) برای فیلتر نقدینگی
-all_df = df.copy()
+# فقط ستون‌های لازم برای فیلتر نقدینگی از داده‌ی پیش از نرمال‌سازی خوانده می‌شوند (Volume خام)
+volume_df = load_dataset(RAW_DATA_PATH, columns=["Date", "Ticker", "Volume"]) if "Volume" in dataset_columns(RAW_DATA_PATH) else None
 
-df[feature_cols] = df[feature_cols].fillna(method="ffill").fillna(0)
-scaler = StandardScaler()
-df[feature_cols] = scaler.fit_transform(df[feature_cols])
-df = df.sort_values(["Date", "Ticker"]).reset_index(drop=True)
-
-unique_dates = sorted(df["Date"].dt.date.unique())
+unique_dates = fm.dates
 test_size = int(len(unique_dates) * TEST_SPLIT_RATIO)
 test_dates = unique_dates[-test_size:]
-test_df = df[df["Date"].dt.date.isin(test_dates)].reset_index(drop=True)
+test_df = df.iloc[fm.rows(fm.n_dates - test_size, fm.n_dates)].reset_index(drop=True)
 
 # ۲. Load Model
 cb_ranker = CatBoostRanker()
@@ -1629,8 +1641,8 @@ results_list.append({"Scenario": "Base Case (0.1% Fee, 7 Days)", **base_result})
 
 for test in SENSITIVITY_TESTS:
     print(f"Running scenario: {test['name']}...")
-    # انتقال دیتافریم اصلی (all_df) به تابع برای استفاده در فیلتر Volume
-    result = run_backtest(test, test_df, cb_ranker, feature_cols, all_df)
+    # انتقال Volume خام به تابع برای استفاده در فیلتر نقدینگی
+    result = run_backtest(test, fm, test_df, cb_ranker, volume_df)
     results_list.append({"Scenario": test["name"], **result})
 
 # ۴. نمایش نتایج
@@ -1651,53 +1663,28 @@ print("1. Compare the 'Sharpe Ratio' across different Fee Rates.")
 print("2. Check if the 'Liquidity Filter' significantly degrades performance (Max Drawdown is key).")
 print("3. See if the 'Holding Period' (5D/10D) maintains a high Sharpe Ratio.")
 
-import pandas as pd
-import numpy as np
 import joblib
-from sklearn.preprocessing import StandardScaler
 import warnings
 warnings.filterwarnings("ignore")
 
 # ---------- SETTINGS (Must match training environment) ----------
-DATA_PATH = "engineered_stock_data.csv"
+MATRIX_DIR = "feature_matrix"
+MATRIX_SCALER_PATH = "matrix_scaler.pkl"  # fitted when the feature matrix was built (LightGBM data-prep cell)
 SCALER_PATH = "scaler.pkl"
-TEST_VAL_FRAC = 0.25 # 15% Test + 10% Val = 25% Total for time split
-
-# ---------- 1) Load data & Identify Features ----------
-if not os.path.exists(DATA_PATH):
-    raise FileNotFoundError(f"Data file not found: {DATA_PATH}")
-
-df = pd.read_csv(DATA_PATH, parse_dates=["Date"])
-df = df.dropna(subset=["Return_7d"]).reset_index(drop=True)
-
-# Identify feature columns (same logic as in model training)
-non_feature_cols = ["Ticker", "Date", "Return_7d", "index"]
-feature_cols = [c for c in df.columns if c not in non_feature_cols and pd.api.types.is_numeric_dtype(df[c])]
-print("Total Features found:", len(feature_cols))
-
-# Handle NaNs (same logic as in model training)
-df[feature_cols] = df[feature_cols].fillna(method="ffill").fillna(0)
-
-# ---------- 2) Recreate Time-based Split to get TRAIN set ----------
-df = df.sort_values(["Date", "Ticker"]).reset_index(drop=True)
-unique_dates = sorted(df["Date"].dt.date.unique())
-n_dates = len(unique_dates)
-
-# Calculate the end index for the training set (1 - 0.25 = 0.75)
-train_end_index = int(n_dates * (1 - TEST_VAL_FRAC))
-train_dates = unique_dates[:train_end_index]
-
-# Filter the original DataFrame to get the exact training data used for fitting
-train = df[df["Date"].dt.date.isin(train_dates)].reset_index(drop=True)
-print(f"Train data size for fitting scaler: {train.shape}")
-
-# ---------- 3) Fit and Save StandardScaler on TRAIN data ONLY ----------
-scaler = StandardScaler()
-
-# Fit the scaler ONLY on the training features
-scaler.fit(train[feature_cols])
-
-# Save the fitted scaler object
-joblib.dump(scaler, SCALER_PATH)
-
-print("\n✅ StandardScaler successfully fitted on training data and saved to:", SCALER_PATH)
\ No newline at end of file
+TRANSFORM_PATH = "feature_transform.pkl"  # produced by the feature engineering cell (PCA), completed here
+
+# ---------- 1) Serving scaler = the scaler the rankers were trained on ----------
+# LightGBM, CatBoost, the incremental refresh and walk-forward all train on the feature matrix,
+# which is standardized with matrix_scaler.pkl. Serving must use the same affine scale, so the
+# scaler is taken from there instead of being refit on a split.
+matrix_scaler = joblib.load(MATRIX_SCALER_PATH)
+feature_cols = FeatureMatrix(MATRIX_DIR).feature_cols
+print("Features in the trained matrix:", len(feature_cols))
+
+# Legacy artifact for loaders without a feature transform (same scaler, no separate fit)
+joblib.dump(matrix_scaler, SCALER_PATH)
+
+# ---------- 2) Complete the fitted feature transform (PCA from feature engineering + matrix scaler) ----------
+feature_transform = set_feature_scaler(joblib.load(TRANSFORM_PATH), matrix_scaler, feature_cols)
+save_feature_transform(feature_transform, TRANSFORM_PATH)
+print("Feature transform (PCA + matrix scaler) saved to:", TRANSFORM_PATH)
\ No newline at end of file
@@ -0,0 +1,126 @@
+# backend/app/dataset_cache.py
+import hashlib
+import json
+import os
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from .feature_matrix import FeatureMatrix
+
+# تعداد مرزهای کوانتیزه‌سازی کت‌بوست (پیش‌فرض خود CatBoost روی CPU)
+BORDER_COUNT = 254
+# پارامترهای ساخت دیتاست LightGBM (binning)؛ بخشی از کلید کش
+LGB_DATASET_PARAMS = {"max_bin": 255, "min_data_in_bin": 3}
+
+# دیتاست‌ها به ترتیب داده می‌شوند؛ اولین بازه (train) مرجع مرزها/bin ها برای بقیه است
+Spans = Dict[str, Tuple[int, int]]
+
+
+def dataset_key(fm: FeatureMatrix, spans: Spans, labels: np.ndarray,
+                feature_cols: Optional[Sequence[str]] = None, **params) -> str:
+    """کلید کش: نسخه‌ی ماتریس، لیست ویژگی‌ها، بازه‌های تاریخ، هش برچسب‌ها و پارامترهای ساخت"""
+    feature_cols = fm.feature_cols if feature_cols is None else list(feature_cols)
+    dates = {name: [str(fm.group_dates[first]), str(fm.group_dates[last - 1])] for name, (first, last) in spans.items()}
+    payload = {
+        "data": fm.data_version,
+        "features": feature_cols,
+        "spans": dates,
+        "labels": hashlib.sha256(np.ascontiguousarray(labels).tobytes()).hexdigest(),
+        "params": params,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _span_arrays(fm: FeatureMatrix, span: Tuple[int, int], labels: np.ndarray, columns: Optional[np.ndarray]):
+    rows = fm.rows(*span)
+    X = fm.X[rows] if columns is None else fm.X[rows][:, columns]
+    return X, np.asarray(labels[rows]), fm.group_sizes(*span), fm.group_ids(*span)
+
+
+def _column_index(fm: FeatureMatrix, feature_cols: Optional[Sequence[str]]) -> Tuple[List[str], Optional[np.ndarray]]:
+    if feature_cols is None or list(feature_cols) == fm.feature_cols:
+        return fm.feature_cols, None
+    position = {col: i for i, col in enumerate(fm.feature_cols)}
+    return list(feature_cols), np.array([position[col] for col in feature_cols])
+
+
+def _replace(tmp: Path, path: Path) -> None:
+    # نوشتن اتمیک: فایل ناقص هرگز با نام نهایی دیده نمی‌شود
+    os.replace(tmp, path)
+
+
+def catboost_pools(fm: FeatureMatrix, spans: Spans, labels: np.ndarray, cache_dir: Union[str, Path],
+                   feature_cols: Optional[Sequence[str]] = None, border_count: int = BORDER_COUNT) -> Dict:
+    """
+    Pool های کوانتیزه‌ی کت‌بوست برای هر بازه (مثلاً train/val) با group_id تاریخ.
+    مرزها فقط روی اولین بازه محاسبه و برای بقیه استفاده می‌شوند؛ Pool ها با فرمت quantized ذخیره
+    و در اجرای بعدی مستقیم با "quantized://" بارگذاری می‌شوند (بدون parse و محاسبه‌ی مرزها).
+    """
+    from catboost import Pool
+
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    names, columns = _column_index(fm, feature_cols)
+    key = dataset_key(fm, spans, labels, names, kind="catboost", border_count=border_count)
+    paths = {name: cache_dir / f"cb-{key}-{name}.qbin" for name in spans}
+    borders_path = cache_dir / f"cb-{key}.borders"
+
+    if all(path.exists() for path in paths.values()):
+        print(f"CatBoost pools loaded from cache ({key}).")
+        return {name: Pool(data=f"quantized://{path}") for name, path in paths.items()}
+
+    pools = {}
+    for i, (name, span) in enumerate(spans.items()):
+        X, y, _, group_id = _span_arrays(fm, span, labels, columns)
+        pool = Pool(data=X, label=y, group_id=group_id, feature_names=names)
+        if i == 0:
+            pool.quantize(border_count=border_count)
+            pool.save_quantization_borders(str(borders_path))
+        else:
+            pool.quantize(input_borders=str(borders_path))
+        tmp = paths[name].with_suffix(".tmp")
+        pool.save(str(tmp))
+        _replace(tmp, paths[name])
+        pools[name] = pool
+    print(f"CatBoost pools built and cached ({key}): {', '.join(spans)}.")
+    return pools
+
+
+def lightgbm_datasets(fm: FeatureMatrix, spans: Spans, labels: np.ndarray, cache_dir: Union[str, Path],
+                      feature_cols: Optional[Sequence[str]] = None, params: Optional[Dict] = None) -> Dict:
+    """
+    دیتاست‌های باینری LightGBM (bin شده به همراه label و group) برای هر بازه.
+    اولین بازه مرجع bin ها (reference) برای بقیه است؛ در اجرای بعدی فایل‌های .bin مستقیم بارگذاری می‌شوند.
+    خروجی برای lgb.train (LGBMRanker.fit دیتاست باینری نمی‌پذیرد).
+    """
+    import lightgbm as lgb
+
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    params = dict(LGB_DATASET_PARAMS if params is None else params)
+    names, columns = _column_index(fm, feature_cols)
+    key = dataset_key(fm, spans, labels, names, kind="lightgbm", **params)
+    paths = {name: cache_dir / f"lgb-{key}-{name}.bin" for name in spans}
+
+    if all(path.exists() for path in paths.values()):
+        print(f"LightGBM datasets loaded from cache ({key}).")
+        datasets, reference = {}, None
+        for name, path in paths.items():
+            datasets[name] = lgb.Dataset(str(path), params=params, reference=reference)
+            if reference is None:
+                reference = datasets[name]
+        return datasets
+
+    datasets, reference = {}, None
+    for name, span in spans.items():
+        X, y, group, _ = _span_arrays(fm, span, labels, columns)
+        dataset = lgb.Dataset(X, label=y, group=group, feature_name=names, params=params,
+                              reference=reference, free_raw_data=False)
+        tmp = paths[name].with_suffix(".tmp")
+        dataset.save_binary(str(tmp))
+        _replace(tmp, paths[name])
+        datasets[name] = dataset
+        if reference is None:
+            reference = dataset
+    print(f"LightGBM datasets built and cached ({key}): {', '.join(spans)}.")
+    return datasets
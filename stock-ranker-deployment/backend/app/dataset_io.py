@@ -0,0 +1,94 @@
+# backend/app/dataset_io.py
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+# ستون‌هایی که هرگز ویژگی مدل نیستند
+NON_FEATURE_COLS = ["Ticker", "Date", "Return_7d", "index"]
+
+# ستون‌های متنی تکراری (در هر ردیف قیمت تکرار می‌شوند) که به category تبدیل می‌شوند
+CATEGORICAL_COLS = ["Ticker", "Company", "Sector", "Industry"]
+
+# ستون‌هایی که دقت float64 آن‌ها حفظ می‌شود (هدف مدل)
+KEEP_FLOAT64_COLS = ["Return_7d"]
+
+# فشرده‌سازی ستونی؛ zstd نسبت فشرده‌سازی بهتری از snappy با سرعت خواندن مشابه دارد
+COMPRESSION = "zstd"
+
+
+def compact_frame(df: pd.DataFrame, keep_float64: Sequence[str] = KEEP_FLOAT64_COLS) -> pd.DataFrame:
+    """
+    کاهش حافظه‌ی دیتافریم: ستون‌های متنی تکراری به category، اعداد صحیح به کوچک‌ترین نوع
+    (مثلاً int8 برای Month) و float64 به float32 در صورتی که مقادیر در بازه‌ی float32 باشند.
+    """
+    df = df.copy()
+    float32_max = np.finfo(np.float32).max
+    for col in df.columns:
+        series = df[col]
+        if col in CATEGORICAL_COLS:
+            if not isinstance(series.dtype, pd.CategoricalDtype):
+                df[col] = series.astype("category")
+        elif pd.api.types.is_bool_dtype(series) or not pd.api.types.is_numeric_dtype(series):
+            continue
+        elif pd.api.types.is_integer_dtype(series):
+            df[col] = pd.to_numeric(series, downcast="integer")
+        elif series.dtype == np.float64 and col not in keep_float64:
+            finite = series[np.isfinite(series)]
+            if finite.empty or finite.abs().max() < float32_max:
+                df[col] = series.astype(np.float32)
+    return df
+
+
+def memory_report(df: pd.DataFrame, label: str = "DataFrame") -> float:
+    """چاپ و بازگرداندن حجم دیتافریم در حافظه (MB)"""
+    mb = df.memory_usage(deep=True).sum() / 1024 ** 2
+    print(f"💾 {label}: {df.shape[0]:,} rows x {df.shape[1]} cols, {mb:,.1f} MB")
+    return mb
+
+
+def save_dataset(df: pd.DataFrame, path: str) -> None:
+    """ذخیره‌ی یک مرحله از خط لوله به صورت Parquet فشرده (dtypeها و تاریخ‌ها حفظ می‌شوند)"""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(path, index=False, compression=COMPRESSION)
+
+
+def load_dataset(path: str, columns: Optional[Sequence[str]] = None, filters=None,
+                 compact: bool = True) -> pd.DataFrame:
+    """
+    خواندن یک مرحله از خط لوله؛ فقط ستون‌های columns از دیسک خوانده می‌شوند.
+    filters به صورت فیلترهای pyarrow (مثلاً [("Date", "==", d)]) روی row groupها اعمال می‌شود.
+    با compact=True خروجی با compact_frame فشرده و حجم آن گزارش می‌شود.
+    """
+    if not Path(path).exists():
+        raise FileNotFoundError(f"Data file not found: {path}")
+    df = pd.read_parquet(path, columns=list(columns) if columns is not None else None, filters=filters)
+    if compact:
+        df = compact_frame(df)
+        memory_report(df, Path(path).name)
+    return df
+
+
+def dataset_columns(path: str) -> List[str]:
+    """نام ستون‌ها فقط از روی schema (بدون خواندن داده)"""
+    return pq.read_schema(path).names
+
+
+def numeric_feature_columns(path: str, exclude: Sequence[str] = NON_FEATURE_COLS) -> List[str]:
+    """ستون‌های عددی قابل استفاده به عنوان ویژگی، فقط از روی schema"""
+    schema = pq.read_schema(path)
+    numeric = []
+    for field in schema:
+        if field.name in exclude:
+            continue
+        if pd.api.types.is_numeric_dtype(field.type.to_pandas_dtype()):
+            numeric.append(field.name)
+    return numeric
+
+
+def load_model_frame(path: str, keys: Sequence[str] = ("Ticker", "Date", "Return_7d")) -> pd.DataFrame:
+    """خواندن فقط ستون‌های کلیدی و ویژگی‌های عددی (ستون‌های اضافی مثل index خوانده نمی‌شوند)"""
+    available = set(dataset_columns(path))
+    columns = [c for c in keys if c in available] + numeric_feature_columns(path)
+    return load_dataset(path, columns=columns)
@@ -0,0 +1,163 @@
+# backend/app/download.py
+import time
+import zlib
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+
+class TokenBucket:
+    """محدودکننده‌ی نرخ درخواست: rate توکن در ثانیه با ظرفیت burst"""
+
+    def __init__(self, rate: float, burst: int, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self) -> None:
+        """برداشتن یک توکن؛ در صورت خالی بودن سطل تا پر شدن آن صبر می‌کند"""
+        self._refill()
+        if self.tokens < 1:
+            self.sleep((1 - self.tokens) / self.rate)
+            self._refill()
+        self.tokens -= 1
+
+
+def downloaded_tickers(data: Optional[pd.DataFrame], tickers: List[str]) -> List[str]:
+    """نمادهایی که در خروجی پهن yf.download (group_by="ticker") حداقل یک قیمت معتبر دارند"""
+    if data is None or data.empty:
+        return []
+    available = set(data.columns.get_level_values(0))
+    return [t for t in tickers if t in available and data[t]["Close"].notna().any()]
+
+
+class DownloadScheduler:
+    """
+    زمان‌بندی دانلود قیمت‌ها با اندازه‌ی دسته‌ی تطبیقی و محدودیت نرخ.
+    - پس از دسته‌ی کاملاً موفق اندازه‌ی دسته بزرگ و پس از شکست بیش از نیمی از دسته کوچک می‌شود.
+    - فقط نمادهای ناموفق با backoff نمایی دوباره درخواست می‌شوند (نه کل دسته).
+    - download_fn هر تابعی با امضای yf.download است (مثلاً SyntheticProvider برای تست آفلاین).
+    """
+
+    def __init__(self, download_fn: Callable[..., pd.DataFrame] = yf.download, batch_size: int = 50,
+                 min_batch_size: int = 5, max_batch_size: int = 200, rate: float = 1.0, burst: int = 2,
+                 retries: int = 3, backoff: float = 2.0, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.download_fn = download_fn
+        self.batch_size = batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.retries = retries
+        self.backoff = backoff
+        self.clock = clock
+        self.sleep = sleep
+        self.bucket = TokenBucket(rate, burst, clock=clock, sleep=sleep)
+
+    def _adapt(self, n_ok: int, n_requested: int) -> None:
+        if n_ok == n_requested:
+            self.batch_size = min(self.max_batch_size, int(self.batch_size * 1.5) + 1)
+        elif n_ok < n_requested / 2:
+            # احتمالاً محدودیت نرخ؛ دسته‌های کوچک‌تر
+            self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+
+    def run(self, tickers: List[str], on_batch: Callable[[pd.DataFrame, List[str]], None],
+            **download_kwargs) -> List[str]:
+        """
+        دانلود همه‌ی نمادها؛ on_batch(data, ok_tickers) برای هر دسته با خروجی پهن همان دسته صدا زده می‌شود.
+        خروجی: نمادهایی که پس از همه‌ی تلاش‌ها ناموفق ماندند.
+        """
+        pending = deque(tickers)
+        retry_queue: List[tuple] = []  # (زمان آماده شدن، نماد)
+        attempts: Dict[str, int] = {}
+        failed: List[str] = []
+        batch_no = 0
+
+        while pending or retry_queue:
+            now = self.clock()
+            ready = sorted(item for item in retry_queue if item[0] <= now)
+            retry_queue = [item for item in retry_queue if item[0] > now]
+            pending.extendleft(ticker for _, ticker in reversed(ready))
+            if not pending:
+                self.sleep(min(t for t, _ in retry_queue) - now)
+                continue
+
+            batch = [pending.popleft() for _ in range(min(self.batch_size, len(pending)))]
+            batch_no += 1
+            self.bucket.acquire()
+            started = self.clock()
+            try:
+                data = self.download_fn(batch, **download_kwargs)
+            except Exception as e:
+                print(f"Error in batch {batch_no}: {e}")
+                data = None
+            elapsed = max(self.clock() - started, 1e-9)
+
+            ok = downloaded_tickers(data, batch)
+            if ok:
+                on_batch(data, ok)
+            self._adapt(len(ok), len(batch))
+            print(f"Batch {batch_no}: {len(ok)}/{len(batch)} tickers in {elapsed:.2f}s "
+                  f"({len(ok) / elapsed:.1f} tickers/s), next batch size {self.batch_size}")
+
+            ok_set = set(ok)
+            for ticker in batch:
+                if ticker in ok_set:
+                    continue
+                attempts[ticker] = attempts.get(ticker, 0) + 1
+                if attempts[ticker] > self.retries:
+                    failed.append(ticker)
+                else:
+                    retry_queue.append((self.clock() + self.backoff * 2 ** (attempts[ticker] - 1), ticker))
+
+        if failed:
+            print(f"⚠️ Giving up on {len(failed)} tickers: {failed}")
+        return failed
+
+
+class SyntheticProvider:
+    """
+    منبع داده‌ی محلی و قطعی با امضای yf.download برای تست و اجرای آفلاین.
+    fail_times: تعداد دفعاتی که هر نماد پیش از موفقیت ناموفق برمی‌گردد (شبیه‌سازی خطا/محدودیت نرخ).
+    """
+
+    FIELDS = ["Open", "High", "Low", "Close", "Adj Close", "Volume", "Dividends", "Stock Splits"]
+
+    def __init__(self, fail_times: Optional[Dict[str, int]] = None):
+        self.fail_times = dict(fail_times or {})
+        self.calls: List[List[str]] = []
+
+    def _prices(self, ticker: str, index: pd.DatetimeIndex) -> pd.DataFrame:
+        rng = np.random.default_rng(zlib.crc32(ticker.encode("utf-8")))
+        # قیمت هر روز فقط به نماد و تاریخ وابسته است، پس بازه‌های هم‌پوشان سازگارند
+        days = (index - pd.Timestamp("2000-01-01")).days.to_numpy()
+        drift, vol = rng.uniform(-2e-4, 5e-4), rng.uniform(0.01, 0.03)
+        close = 100 * np.exp(drift * days + vol * np.sin(days / rng.uniform(5, 50)))
+        return pd.DataFrame({
+            "Open": close * 0.995, "High": close * 1.01, "Low": close * 0.99,
+            "Close": close, "Adj Close": close, "Volume": (1e6 * (1 + np.cos(days) ** 2)).round(),
+            "Dividends": 0.0, "Stock Splits": 0.0,
+        }, index=index)
+
+    def __call__(self, tickers: List[str], start: str, end: str, **kwargs) -> pd.DataFrame:
+        tickers = list(tickers)
+        self.calls.append(tickers)
+        index = pd.bdate_range(start, pd.Timestamp(end) - pd.Timedelta(days=1), name="Date")
+        frames = {}
+        for ticker in tickers:
+            if self.fail_times.get(ticker, 0) > 0:
+                self.fail_times[ticker] -= 1
+                frames[ticker] = pd.DataFrame(np.nan, index=index, columns=self.FIELDS)
+            else:
+                frames[ticker] = self._prices(ticker, index)
+        return pd.concat(frames, axis=1)
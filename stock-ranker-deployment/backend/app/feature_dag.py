@@ -0,0 +1,163 @@
+# backend/app/feature_dag.py
+import hashlib
+import importlib
+import importlib.metadata
+import inspect
+import json
+import os
+import pandas as pd
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Union
+from .dataset_io import COMPRESSION
+
+
+# ماژول‌های backend که گره‌ها (و گره‌های نوت‌بوک) صدا می‌زنند و کتابخانه‌هایی که خروجی به نسخه‌ی آن‌ها وابسته است؛
+# هش کد یک گره فقط بدنه‌ی خودش را می‌بیند، پس تغییر این‌ها از طریق salt کلیدها را نامعتبر می‌کند
+SALT_MODULES = ("panel_kernels", "ta_runner", "feature_registry", "indicators", "feature_graph")
+SALT_LIBRARIES = ("ta", "pandas", "numpy")
+
+
+@lru_cache(maxsize=None)
+def environment_salt(modules: Sequence[str] = SALT_MODULES, libraries: Sequence[str] = SALT_LIBRARIES) -> str:
+    """هش کد ماژول‌های backend و نسخه‌ی کتابخانه‌ها (یک بار در هر پردازه محاسبه می‌شود)"""
+    h = hashlib.sha256()
+    for name in modules:
+        h.update(inspect.getsource(importlib.import_module(f"{__package__}.{name}")).encode())
+    for name in libraries:
+        h.update(f"{name}=={importlib.metadata.version(name)}".encode())
+    return h.hexdigest()
+
+
+class FeatureNode:
+    """
+    یک گره‌ی ویژگی: fn(*input_frames, **params, **options) -> دیتافریم ستون‌های خروجی هم‌طول و هم‌ترتیب با ورودی.
+    options پارامترهای اجرایی‌اند (مثلاً تعداد worker) که روی خروجی اثری ندارند و در کلید کش نمی‌آیند.
+    """
+
+    def __init__(self, name: str, fn: Callable[..., pd.DataFrame], inputs: List[str], params: Dict,
+                 options: Optional[Dict] = None):
+        self.name, self.fn, self.inputs, self.params = name, fn, inputs, params
+        self.options = options or {}
+
+
+def frame_hash(df: pd.DataFrame) -> str:
+    """هش محتوای دیتافریم (مقادیر، نام و نوع ستون‌ها؛ بدون ایندکس)"""
+    h = hashlib.sha256()
+    h.update(json.dumps([[str(c), str(t)] for c, t in df.dtypes.items()]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def code_hash(fn: Callable) -> str:
+    """هش کد تابع؛ تغییر پیاده‌سازی یک گره خروجی کش‌شده‌ی آن را نامعتبر می‌کند"""
+    try:
+        source = inspect.getsource(fn).encode()
+    except (OSError, TypeError):
+        source = fn.__code__.co_code + repr(fn.__code__.co_consts).encode()
+    return hashlib.sha256(source).hexdigest()
+
+
+class FeatureDAG:
+    """
+    گراف اعلانی ویژگی‌ها با کش محتوایی خروجی هر گره روی دیسک.
+    کلید هر گره = هش (نام، پارامترها، کد، salt محیط، کلید ورودی‌ها) و کلید منبع‌ها = هش محتوای آن‌ها،
+    پس با تغییر یک پارامتر یا داده فقط همان گره و نوادگانش دوباره محاسبه می‌شوند.
+    """
+
+    def __init__(self, cache_dir: Optional[Union[str, Path]] = None, salt: Optional[str] = None):
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.salt = environment_salt() if salt is None else salt
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.sources: List[str] = []
+        self.nodes: Dict[str, FeatureNode] = {}
+
+    def source(self, name: str) -> None:
+        """ورودی خام گراف (مثلاً قیمت‌ها)؛ مقدار آن در run داده می‌شود"""
+        self.sources.append(name)
+
+    def add(self, name: str, fn: Callable[..., pd.DataFrame], inputs: Sequence[str],
+            options: Optional[Dict] = None, **params) -> None:
+        for dep in inputs:
+            if dep not in self.nodes and dep not in self.sources:
+                raise KeyError(f"Unknown input '{dep}' for feature node '{name}'")
+        self.nodes[name] = FeatureNode(name, fn, list(inputs), params, options)
+
+    def node(self, name: str, inputs: Sequence[str], **params) -> Callable:
+        """دکوراتور معادل add"""
+        def register(fn):
+            self.add(name, fn, inputs, **params)
+            return fn
+        return register
+
+    def _keys(self, sources: Dict[str, pd.DataFrame]) -> Dict[str, str]:
+        keys = {name: frame_hash(sources[name]) for name in self.sources}
+        # گره‌ها به ترتیب تعریف ثبت می‌شوند و ورودی‌ها پیش از خودشان تعریف شده‌اند (ترتیب توپولوژیک)
+        for name, node in self.nodes.items():
+            payload = json.dumps({"name": name, "params": node.params, "code": code_hash(node.fn), "salt": self.salt,
+                                  "inputs": [keys[dep] for dep in node.inputs]}, sort_keys=True, default=str)
+            keys[name] = hashlib.sha256(payload.encode()).hexdigest()
+        return keys
+
+    def _cache_path(self, name: str, key: str) -> Optional[Path]:
+        return self.cache_dir / f"{name}-{key[:16]}.parquet" if self.cache_dir is not None else None
+
+    def run(self, sources: Dict[str, pd.DataFrame], targets: Optional[Sequence[str]] = None) -> Dict[str, pd.DataFrame]:
+        """
+        محاسبه‌ی گره‌های هدف (پیش‌فرض همه)؛ گره‌های با کلید موجود در کش از دیسک خوانده می‌شوند
+        و ورودی‌های آن‌ها اصلاً محاسبه یا خوانده نمی‌شوند.
+        """
+        missing = [name for name in self.sources if name not in sources]
+        if missing:
+            raise KeyError(f"Missing source frames: {missing}")
+        # بدون cache_dir کلیدی لازم نیست (هش محتوای منبع‌ها روی داده‌ی بزرگ هزینه دارد)
+        keys = self._keys(sources) if self.cache_dir is not None else {}
+        results: Dict[str, pd.DataFrame] = dict(sources)
+        stats = {"cached": 0, "computed": 0}
+
+        def resolve(name: str) -> pd.DataFrame:
+            if name in results:
+                return results[name]
+            node = self.nodes[name]
+            path = self._cache_path(name, keys[name]) if keys else None
+            if path is not None and path.exists():
+                results[name] = pd.read_parquet(path)
+                stats["cached"] += 1
+                return results[name]
+            out = node.fn(*[resolve(dep) for dep in node.inputs], **node.params, **node.options)
+            out = out.reset_index(drop=True)
+            if path is not None:
+                tmp_path = path.with_suffix(".tmp")
+                out.to_parquet(tmp_path, compression=COMPRESSION, index=False)
+                os.replace(tmp_path, path)
+            results[name] = out
+            stats["computed"] += 1
+            return out
+
+        targets = list(self.nodes) if targets is None else list(targets)
+        for name in targets:
+            resolve(name)
+        print(f"Feature DAG: {stats['computed']} nodes computed, {stats['cached']} loaded from cache.")
+        return {name: results[name] for name in targets}
+
+    def assemble(self, sources: Dict[str, pd.DataFrame], base: str, targets: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """ستون‌های گره‌های هدف به ترتیب روی منبع base قرار می‌گیرند (ستون هم‌نام جایگزین می‌شود)"""
+        outputs = self.run(sources, targets)
+        df = sources[base].reset_index(drop=True).copy()
+        for out in outputs.values():
+            for col in out.columns:
+                df[col] = out[col].to_numpy()
+        return df
+
+    def prune(self, sources: Dict[str, pd.DataFrame]) -> int:
+        """حذف فایل‌های کش که با کلیدهای فعلی گراف مطابقت ندارند"""
+        if self.cache_dir is None:
+            return 0
+        keep = {self._cache_path(name, key).name for name, key in self._keys(sources).items() if name in self.nodes}
+        removed = 0
+        for path in self.cache_dir.glob("*.parquet"):
+            if path.name not in keep:
+                path.unlink()
+                removed += 1
+        return removed
@@ -0,0 +1,87 @@
+# backend/app/feature_graph.py
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import List, Optional, Union
+from .feature_dag import FeatureDAG
+from .panel_kernels import TickerPanel, ewm_mean, lag, rolling_mean, rolling_std
+from .ta_runner import OHLCV_COLUMNS, add_ta_columns_by_ticker
+from .feature_registry import TA_COLUMNS
+from .indicators import LAGS, SMA_WINDOWS, VOLATILITY_WINDOW
+
+# گره‌های ویژگی‌های وابسته به هر نماد (بخش ۴ نوت‌بوک)؛ هر گره فقط ستون‌های خروجی خود را برمی‌گرداند
+
+
+def ta_node(prices: pd.DataFrame, columns: Optional[List[str]] = None, max_workers: Optional[int] = None) -> pd.DataFrame:
+    columns = TA_COLUMNS if columns is None else list(columns)
+    return add_ta_columns_by_ticker(prices[["Ticker"] + OHLCV_COLUMNS], columns, fillna=True,
+                                    max_workers=max_workers)[columns]
+
+
+def lag_node(prices: pd.DataFrame, lags: List[int]) -> pd.DataFrame:
+    # 4.1. Lag ها ('Return_7d' هنوز وجود ندارد، پس از 'Adj Close' لگ می‌گیریم)
+    panel = TickerPanel(prices["Ticker"])
+    adj_close = panel.pivot(prices["Adj Close"])
+    return pd.DataFrame({f"Adj_Close_Lag_{n}": panel.unpivot(lag(adj_close, n)) for n in lags})
+
+
+def moving_average_node(prices: pd.DataFrame, windows: List[int]) -> pd.DataFrame:
+    # 4.2. میانگین‌های متحرک
+    panel = TickerPanel(prices["Ticker"])
+    adj_close = panel.pivot(prices["Adj Close"])
+    out = {}
+    for window in windows:
+        out[f"SMA_{window}"] = panel.unpivot(rolling_mean(adj_close, window))
+        out[f"EMA_{window}"] = panel.unpivot(ewm_mean(adj_close, window))
+    return pd.DataFrame(out)
+
+
+def volatility_node(prices: pd.DataFrame, window: int) -> pd.DataFrame:
+    # 4.4. نوسانات (Sharpe_Ratio به Return_7d نیاز دارد که هنوز نداریم)
+    panel = TickerPanel(prices["Ticker"])
+    return pd.DataFrame({"Volatility_Rolling_Std": panel.unpivot(rolling_std(panel.pivot(prices["Adj Close"]), window))})
+
+
+def ratio_node(prices: pd.DataFrame) -> pd.DataFrame:
+    # 4.3. نسبت‌های مالی؛ تنها پیاده‌سازی، هم در نوت‌بوک (گره‌ی 'ratios') و هم در سرویس (پس از نرمال‌سازی)
+    # مقادیر 0 و NaN با میانگین همان نماد پر می‌شوند؛ RSI_MACD_Ratio فقط وقتی ستون‌های ta آن موجودند
+    by_ticker = prices.groupby("Ticker", observed=True)
+    eps = prices["EPS"].replace(0, np.nan).fillna(by_ticker["EPS"].transform("mean"))
+    market_cap = prices["Market Cap"].replace(0, np.nan).fillna(by_ticker["Market Cap"].transform("mean"))
+    out = {
+        "EPS": eps.to_numpy(),
+        "Market Cap": market_cap.to_numpy(),
+        "PE_to_EPS": (prices["P/E Ratio"] / eps).to_numpy(),
+        "Volume_to_MarketCap": (prices["Volume"] / market_cap).to_numpy(),
+    }
+    if "momentum_rsi" in prices and "trend_macd" in prices:
+        out["RSI_MACD_Ratio"] = (prices["momentum_rsi"] / (prices["trend_macd"].replace(0, 1e-6) + 1e-6)).to_numpy()
+    return pd.DataFrame(out)
+
+
+def time_node(prices: pd.DataFrame) -> pd.DataFrame:
+    # 4.7. ویژگی‌های زمانی
+    dates = prices["Date"].dt
+    return pd.DataFrame({"Day_of_Week": dates.dayofweek.to_numpy(), "Month": dates.month.to_numpy(),
+                         "Quarter": dates.quarter.to_numpy()})
+
+
+def build_feature_graph(ta_columns: Optional[List[str]] = None,
+                        cache_dir: Optional[Union[str, Path]] = None,
+                        own_columns: bool = True, ta_workers: Optional[int] = None) -> FeatureDAG:
+    """
+    گراف ویژگی‌های وابسته به هر نماد روی منبع 'prices' (قیمت‌ها + اطلاعات پایه، به ترتیب Ticker/Date).
+    ratio_node در گراف نیست: نسبت‌ها پس از نرمال‌سازی در add_cross_sectional_features ساخته می‌شوند.
+    ta_columns: None یعنی کل کاتالوگ ta و لیست خالی یعنی بدون گره‌ی ta.
+    own_columns: گره‌های lag، میانگین متحرک و نوسان (False وقتی از موتور جریانی اندیکاتورها می‌آیند).
+    """
+    dag = FeatureDAG(cache_dir)
+    dag.source("prices")
+    if ta_columns is None or ta_columns:
+        dag.add("ta", ta_node, ["prices"], options={"max_workers": ta_workers}, columns=ta_columns)
+    if own_columns:
+        dag.add("lags", lag_node, ["prices"], lags=list(LAGS))
+        dag.add("moving_averages", moving_average_node, ["prices"], windows=list(SMA_WINDOWS))
+        dag.add("volatility", volatility_node, ["prices"], window=VOLATILITY_WINDOW)
+    dag.add("time", time_node, ["prices"])
+    return dag
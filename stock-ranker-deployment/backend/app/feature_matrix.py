@@ -0,0 +1,150 @@
+# backend/app/feature_matrix.py
+import hashlib
+import json
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from sklearn.preprocessing import StandardScaler
+from typing import List, Optional, Tuple
+from .panel_kernels import fill_by_ticker
+
+# فایل‌های ماتریس ویژگی روی دیسک
+X_FILE = "X.npy"            # ماتریس float32 (ردیف‌ها به ترتیب Date، Ticker)
+INDEX_FILE = "index.npz"    # تاریخ هر گروه، offset گروه‌ها، کد نماد و Return_7d هر ردیف
+META_FILE = "meta.json"     # نام ویژگی‌ها، نمادها و نسخه‌ی داده
+
+# تعداد ردیف‌هایی که در هر مرحله scale و روی دیسک نوشته می‌شوند (حافظه‌ی محدود)
+CHUNK_ROWS = 100_000
+
+
+def build_feature_matrix(df: pd.DataFrame, feature_cols: List[str], out_dir: str,
+                         scaler: Optional[StandardScaler] = None) -> StandardScaler:
+    """
+    ساخت یک‌باره‌ی ماتریس ویژگی scaleشده (float32، memory-mapped) به همراه
+    ایندکس فشرده‌ی (date, ticker) -> ردیف و offset گروه‌های هر تاریخ.
+    اگر scaler داده نشود، مانند سلول‌های مدل روی کل داده fit می‌شود. خروجی: scaler
+    """
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+
+    df = df.dropna(subset=["Return_7d"]).reset_index(drop=True)
+    # پر کردن NaN ها داخل هر نماد (ffill سپس 0، همانند سلول‌های آموزش)؛ مقدار نماد قبلی به ردیف بعدی نشت نمی‌کند
+    features = fill_by_ticker(df, feature_cols)[feature_cols].astype(np.float32)
+
+    order = np.lexsort((df["Ticker"].to_numpy(), df["Date"].to_numpy()))
+    dates = df["Date"].to_numpy()[order].astype("datetime64[D]")
+    ticker_codes, ticker_names = pd.factorize(df["Ticker"].to_numpy()[order], sort=True)
+
+    if scaler is None:
+        scaler = StandardScaler().fit(features)
+
+    # نسخه‌ی داده: هش محتوای ماتریس و ایندکس، هم‌زمان با نوشتن chunk ها (کلید کش دیتاست‌های مدل)
+    digest = hashlib.sha256()
+    X = np.lib.format.open_memmap(out / X_FILE, mode="w+", dtype=np.float32,
+                                  shape=(len(df), len(feature_cols)))
+    for start in range(0, len(df), CHUNK_ROWS):
+        rows = order[start:start + CHUNK_ROWS]
+        chunk = scaler.transform(features.iloc[rows]).astype(np.float32)
+        X[start:start + len(rows)] = chunk
+        digest.update(np.ascontiguousarray(chunk).tobytes())
+    X.flush()
+    del X
+
+    group_dates, group_starts = np.unique(dates, return_index=True)
+    offsets = np.append(group_starts, len(dates)).astype(np.int64)
+    index = {
+        "group_dates": group_dates,
+        "offsets": offsets,
+        "ticker_codes": ticker_codes.astype(np.int32),
+        "return_7d": df["Return_7d"].to_numpy()[order].astype(np.float64),
+    }
+    np.savez(out / INDEX_FILE, **index)
+    for name in sorted(index):
+        digest.update(index[name].tobytes())
+    meta = {"feature_cols": list(feature_cols), "tickers": [str(t) for t in ticker_names]}
+    digest.update(json.dumps(meta).encode())
+    meta["data_version"] = digest.hexdigest()[:16]
+    with open(out / META_FILE, "w") as f:
+        json.dump(meta, f)
+    return scaler
+
+
+class FeatureMatrix:
+    """نمای فقط‌خواندنی و zero-copy ماتریس ویژگی؛ workerهای موازی صفحات حافظه را به اشتراک می‌گذارند"""
+
+    def __init__(self, path: str):
+        path = Path(path)
+        self.X = np.load(path / X_FILE, mmap_mode="r")
+        index = np.load(path / INDEX_FILE)
+        self.group_dates = index["group_dates"]
+        self.offsets = index["offsets"]
+        self.ticker_codes = index["ticker_codes"]
+        self.return_7d = index["return_7d"]
+        with open(path / META_FILE, "r") as f:
+            meta = json.load(f)
+        self.feature_cols: List[str] = meta["feature_cols"]
+        self.tickers = np.array(meta["tickers"], dtype=object)
+        self.data_version: str = meta.get("data_version") or self._content_hash(path)
+
+    @staticmethod
+    def _content_hash(path: Path) -> str:
+        """نسخه‌ی داده برای ماتریس‌های ساخته‌شده پیش از ثبت data_version در meta.json"""
+        digest = hashlib.sha256()
+        for name in (X_FILE, INDEX_FILE, META_FILE):
+            with open(path / name, "rb") as f:
+                for block in iter(lambda: f.read(1 << 24), b""):
+                    digest.update(block)
+        return digest.hexdigest()[:16]
+
+    @property
+    def n_dates(self) -> int:
+        return len(self.group_dates)
+
+    @property
+    def dates(self) -> list:
+        """تاریخ گروه‌ها به صورت datetime.date"""
+        return list(self.group_dates.astype(object))
+
+    def date_rows(self, date) -> slice:
+        """بازه‌ی ردیف‌های یک تاریخ (تاریخ باید در ماتریس موجود باشد)"""
+        g = int(np.searchsorted(self.group_dates, np.datetime64(pd.Timestamp(date).date(), "D")))
+        return self.rows(g, g + 1)
+
+    def rows(self, first_group: int, last_group: int) -> slice:
+        """بازه‌ی ردیف‌های پیوسته برای گروه‌های تاریخ [first_group, last_group)"""
+        return slice(int(self.offsets[first_group]), int(self.offsets[last_group]))
+
+    def group_sizes(self, first_group: int, last_group: int) -> np.ndarray:
+        """اندازه‌ی هر گروه (query) برای LightGBM/CatBoost"""
+        return np.diff(self.offsets[first_group:last_group + 1])
+
+    def group_ids(self, first_group: int, last_group: int) -> np.ndarray:
+        """شناسه‌ی query هر ردیف (اندیس تاریخ) برای Pool کت‌بوست"""
+        return np.repeat(np.arange(first_group, last_group), self.group_sizes(first_group, last_group))
+
+    def row_index(self, date, ticker: str) -> int:
+        """اندیس ردیف (date, ticker) با جستجوی دودویی؛ در صورت نبود -1"""
+        day = np.datetime64(pd.Timestamp(date).date(), "D")
+        g = np.searchsorted(self.group_dates, day)
+        code = np.searchsorted(self.tickers, ticker)
+        if g == self.n_dates or self.group_dates[g] != day or code == len(self.tickers) or self.tickers[code] != ticker:
+            return -1
+        start, end = self.offsets[g], self.offsets[g + 1]
+        pos = start + np.searchsorted(self.ticker_codes[start:end], code)
+        return int(pos) if pos < end and self.ticker_codes[pos] == code else -1
+
+    def frame(self, first_group: int = 0, last_group: Optional[int] = None) -> pd.DataFrame:
+        """دیتافریم سبک (Date, Ticker, Return_7d) بدون ستون‌های ویژگی، هم‌ترتیب با ردیف‌های X"""
+        last_group = self.n_dates if last_group is None else last_group
+        rows = self.rows(first_group, last_group)
+        sizes = self.group_sizes(first_group, last_group)
+        return pd.DataFrame({
+            "Date": pd.to_datetime(np.repeat(self.group_dates[first_group:last_group], sizes)),
+            "Ticker": pd.Categorical.from_codes(self.ticker_codes[rows], categories=self.tickers),
+            "Return_7d": self.return_7d[rows],
+        })
+
+    def split(self, fractions: Tuple[float, ...]) -> List[Tuple[int, int]]:
+        """تقسیم زمانی گروه‌های تاریخ به بازه‌های پیوسته بر اساس نسبت‌های تجمعی"""
+        bounds = [0] + [int(self.n_dates * f) for f in np.cumsum(fractions)[:-1]] + [self.n_dates]
+        return list(zip(bounds[:-1], bounds[1:]))
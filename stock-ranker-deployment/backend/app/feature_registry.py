@@ -0,0 +1,178 @@
+# backend/app/feature_registry.py
+import pandas as pd
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from ta.momentum import (
+    AwesomeOscillatorIndicator, KAMAIndicator, PercentagePriceOscillator, PercentageVolumeOscillator,
+    ROCIndicator, RSIIndicator, StochasticOscillator, StochRSIIndicator, TSIIndicator,
+    UltimateOscillator, WilliamsRIndicator,
+)
+from ta.others import CumulativeReturnIndicator, DailyLogReturnIndicator, DailyReturnIndicator
+from ta.trend import (
+    MACD, ADXIndicator, AroonIndicator, CCIIndicator, DPOIndicator, EMAIndicator, IchimokuIndicator,
+    KSTIndicator, MassIndex, PSARIndicator, SMAIndicator, STCIndicator, TRIXIndicator, VortexIndicator,
+)
+from ta.volatility import AverageTrueRange, BollingerBands, DonchianChannel, KeltnerChannel, UlcerIndex
+from ta.volume import (
+    AccDistIndexIndicator, ChaikinMoneyFlowIndicator, EaseOfMovementIndicator, ForceIndexIndicator,
+    MFIIndicator, NegativeVolumeIndexIndicator, OnBalanceVolumeIndicator, VolumePriceTrendIndicator,
+    VolumeWeightedAveragePrice,
+)
+
+# هر اندیکاتور: (سازنده روی دیتافریم OHLCV، {ستون خروجی: متد}) با همان پارامترهای add_all_ta_features
+Producer = Tuple[Callable[[pd.DataFrame, bool], object], Dict[str, str]]
+
+TA_INDICATORS: Dict[str, Producer] = {
+    # --- volume ---
+    "adi": (lambda d, f: AccDistIndexIndicator(high=d["High"], low=d["Low"], close=d["Close"], volume=d["Volume"], fillna=f),
+            {"volume_adi": "acc_dist_index"}),
+    "obv": (lambda d, f: OnBalanceVolumeIndicator(close=d["Close"], volume=d["Volume"], fillna=f),
+            {"volume_obv": "on_balance_volume"}),
+    "cmf": (lambda d, f: ChaikinMoneyFlowIndicator(high=d["High"], low=d["Low"], close=d["Close"], volume=d["Volume"], fillna=f),
+            {"volume_cmf": "chaikin_money_flow"}),
+    "fi": (lambda d, f: ForceIndexIndicator(close=d["Close"], volume=d["Volume"], window=13, fillna=f),
+           {"volume_fi": "force_index"}),
+    "eom": (lambda d, f: EaseOfMovementIndicator(high=d["High"], low=d["Low"], volume=d["Volume"], window=14, fillna=f),
+            {"volume_em": "ease_of_movement", "volume_sma_em": "sma_ease_of_movement"}),
+    "vpt": (lambda d, f: VolumePriceTrendIndicator(close=d["Close"], volume=d["Volume"], fillna=f),
+            {"volume_vpt": "volume_price_trend"}),
+    "vwap": (lambda d, f: VolumeWeightedAveragePrice(high=d["High"], low=d["Low"], close=d["Close"], volume=d["Volume"], window=14, fillna=f),
+             {"volume_vwap": "volume_weighted_average_price"}),
+    "mfi": (lambda d, f: MFIIndicator(high=d["High"], low=d["Low"], close=d["Close"], volume=d["Volume"], window=14, fillna=f),
+            {"volume_mfi": "money_flow_index"}),
+    "nvi": (lambda d, f: NegativeVolumeIndexIndicator(close=d["Close"], volume=d["Volume"], fillna=f),
+            {"volume_nvi": "negative_volume_index"}),
+    # --- volatility ---
+    "bb": (lambda d, f: BollingerBands(close=d["Close"], window=20, window_dev=2, fillna=f),
+           {"volatility_bbm": "bollinger_mavg", "volatility_bbh": "bollinger_hband", "volatility_bbl": "bollinger_lband",
+            "volatility_bbw": "bollinger_wband", "volatility_bbp": "bollinger_pband",
+            "volatility_bbhi": "bollinger_hband_indicator", "volatility_bbli": "bollinger_lband_indicator"}),
+    "kc": (lambda d, f: KeltnerChannel(close=d["Close"], high=d["High"], low=d["Low"], window=10, fillna=f),
+           {"volatility_kcc": "keltner_channel_mband", "volatility_kch": "keltner_channel_hband",
+            "volatility_kcl": "keltner_channel_lband", "volatility_kcw": "keltner_channel_wband",
+            "volatility_kcp": "keltner_channel_pband", "volatility_kchi": "keltner_channel_hband_indicator",
+            "volatility_kcli": "keltner_channel_lband_indicator"}),
+    "dc": (lambda d, f: DonchianChannel(high=d["High"], low=d["Low"], close=d["Close"], window=20, offset=0, fillna=f),
+           {"volatility_dcl": "donchian_channel_lband", "volatility_dch": "donchian_channel_hband",
+            "volatility_dcm": "donchian_channel_mband", "volatility_dcw": "donchian_channel_wband",
+            "volatility_dcp": "donchian_channel_pband"}),
+    "atr": (lambda d, f: AverageTrueRange(close=d["Close"], high=d["High"], low=d["Low"], window=10, fillna=f),
+            {"volatility_atr": "average_true_range"}),
+    "ui": (lambda d, f: UlcerIndex(close=d["Close"], window=14, fillna=f),
+           {"volatility_ui": "ulcer_index"}),
+    # --- trend ---
+    "macd": (lambda d, f: MACD(close=d["Close"], window_slow=26, window_fast=12, window_sign=9, fillna=f),
+             {"trend_macd": "macd", "trend_macd_signal": "macd_signal", "trend_macd_diff": "macd_diff"}),
+    "sma_fast": (lambda d, f: SMAIndicator(close=d["Close"], window=12, fillna=f), {"trend_sma_fast": "sma_indicator"}),
+    "sma_slow": (lambda d, f: SMAIndicator(close=d["Close"], window=26, fillna=f), {"trend_sma_slow": "sma_indicator"}),
+    "ema_fast": (lambda d, f: EMAIndicator(close=d["Close"], window=12, fillna=f), {"trend_ema_fast": "ema_indicator"}),
+    "ema_slow": (lambda d, f: EMAIndicator(close=d["Close"], window=26, fillna=f), {"trend_ema_slow": "ema_indicator"}),
+    "vortex": (lambda d, f: VortexIndicator(high=d["High"], low=d["Low"], close=d["Close"], window=14, fillna=f),
+               {"trend_vortex_ind_pos": "vortex_indicator_pos", "trend_vortex_ind_neg": "vortex_indicator_neg",
+                "trend_vortex_ind_diff": "vortex_indicator_diff"}),
+    "trix": (lambda d, f: TRIXIndicator(close=d["Close"], window=15, fillna=f), {"trend_trix": "trix"}),
+    "mass_index": (lambda d, f: MassIndex(high=d["High"], low=d["Low"], window_fast=9, window_slow=25, fillna=f),
+                   {"trend_mass_index": "mass_index"}),
+    "dpo": (lambda d, f: DPOIndicator(close=d["Close"], window=20, fillna=f), {"trend_dpo": "dpo"}),
+    "kst": (lambda d, f: KSTIndicator(close=d["Close"], roc1=10, roc2=15, roc3=20, roc4=30, window1=10, window2=10,
+                                      window3=10, window4=15, nsig=9, fillna=f),
+            {"trend_kst": "kst", "trend_kst_sig": "kst_sig", "trend_kst_diff": "kst_diff"}),
+    "ichimoku": (lambda d, f: IchimokuIndicator(high=d["High"], low=d["Low"], window1=9, window2=26, window3=52, visual=False, fillna=f),
+                 {"trend_ichimoku_conv": "ichimoku_conversion_line", "trend_ichimoku_base": "ichimoku_base_line",
+                  "trend_ichimoku_a": "ichimoku_a", "trend_ichimoku_b": "ichimoku_b"}),
+    "stc": (lambda d, f: STCIndicator(close=d["Close"], window_slow=50, window_fast=23, cycle=10, smooth1=3, smooth2=3, fillna=f),
+            {"trend_stc": "stc"}),
+    "adx": (lambda d, f: ADXIndicator(high=d["High"], low=d["Low"], close=d["Close"], window=14, fillna=f),
+            {"trend_adx": "adx", "trend_adx_pos": "adx_pos", "trend_adx_neg": "adx_neg"}),
+    "cci": (lambda d, f: CCIIndicator(high=d["High"], low=d["Low"], close=d["Close"], window=20, constant=0.015, fillna=f),
+            {"trend_cci": "cci"}),
+    "ichimoku_visual": (lambda d, f: IchimokuIndicator(high=d["High"], low=d["Low"], window1=9, window2=26, window3=52, visual=True, fillna=f),
+                        {"trend_visual_ichimoku_a": "ichimoku_a", "trend_visual_ichimoku_b": "ichimoku_b"}),
+    "aroon": (lambda d, f: AroonIndicator(high=d["High"], low=d["Low"], window=25, fillna=f),
+              {"trend_aroon_up": "aroon_up", "trend_aroon_down": "aroon_down", "trend_aroon_ind": "aroon_indicator"}),
+    "psar": (lambda d, f: PSARIndicator(high=d["High"], low=d["Low"], close=d["Close"], step=0.02, max_step=0.20, fillna=f),
+             {"trend_psar_up": "psar_up", "trend_psar_down": "psar_down",
+              "trend_psar_up_indicator": "psar_up_indicator", "trend_psar_down_indicator": "psar_down_indicator"}),
+    # --- momentum ---
+    "rsi": (lambda d, f: RSIIndicator(close=d["Close"], window=14, fillna=f), {"momentum_rsi": "rsi"}),
+    "stoch_rsi": (lambda d, f: StochRSIIndicator(close=d["Close"], window=14, smooth1=3, smooth2=3, fillna=f),
+                  {"momentum_stoch_rsi": "stochrsi", "momentum_stoch_rsi_k": "stochrsi_k", "momentum_stoch_rsi_d": "stochrsi_d"}),
+    "tsi": (lambda d, f: TSIIndicator(close=d["Close"], window_slow=25, window_fast=13, fillna=f), {"momentum_tsi": "tsi"}),
+    "uo": (lambda d, f: UltimateOscillator(high=d["High"], low=d["Low"], close=d["Close"], window1=7, window2=14, window3=28,
+                                           weight1=4.0, weight2=2.0, weight3=1.0, fillna=f),
+           {"momentum_uo": "ultimate_oscillator"}),
+    "stoch": (lambda d, f: StochasticOscillator(high=d["High"], low=d["Low"], close=d["Close"], window=14, smooth_window=3, fillna=f),
+              {"momentum_stoch": "stoch", "momentum_stoch_signal": "stoch_signal"}),
+    "wr": (lambda d, f: WilliamsRIndicator(high=d["High"], low=d["Low"], close=d["Close"], lbp=14, fillna=f),
+           {"momentum_wr": "williams_r"}),
+    "ao": (lambda d, f: AwesomeOscillatorIndicator(high=d["High"], low=d["Low"], window1=5, window2=34, fillna=f),
+           {"momentum_ao": "awesome_oscillator"}),
+    "roc": (lambda d, f: ROCIndicator(close=d["Close"], window=12, fillna=f), {"momentum_roc": "roc"}),
+    "ppo": (lambda d, f: PercentagePriceOscillator(close=d["Close"], window_slow=26, window_fast=12, window_sign=9, fillna=f),
+            {"momentum_ppo": "ppo", "momentum_ppo_signal": "ppo_signal", "momentum_ppo_hist": "ppo_hist"}),
+    "pvo": (lambda d, f: PercentageVolumeOscillator(volume=d["Volume"], window_slow=26, window_fast=12, window_sign=9, fillna=f),
+            {"momentum_pvo": "pvo", "momentum_pvo_signal": "pvo_signal", "momentum_pvo_hist": "pvo_hist"}),
+    "kama": (lambda d, f: KAMAIndicator(close=d["Close"], window=10, pow1=2, pow2=30, fillna=f), {"momentum_kama": "kama"}),
+    # --- others ---
+    "dr": (lambda d, f: DailyReturnIndicator(close=d["Close"], fillna=f), {"others_dr": "daily_return"}),
+    "dlr": (lambda d, f: DailyLogReturnIndicator(close=d["Close"], fillna=f), {"others_dlr": "daily_log_return"}),
+    "cr": (lambda d, f: CumulativeReturnIndicator(close=d["Close"], fillna=f), {"others_cr": "cumulative_return"}),
+}
+
+# ستون خروجی -> نام اندیکاتور (ترتیب ستون‌ها همانند add_all_ta_features)
+TA_COLUMNS: List[str] = [col for _, outputs in TA_INDICATORS.values() for col in outputs]
+COLUMN_PRODUCERS: Dict[str, str] = {col: name for name, (_, outputs) in TA_INDICATORS.items() for col in outputs}
+
+# ویژگی‌های مشتق‌شده‌ی نوت‌بوک و وابستگی آن‌ها به ستون‌های ta
+DERIVED_DEPENDENCIES: Dict[str, List[str]] = {
+    "RSI_MACD_Ratio": ["momentum_rsi", "trend_macd"],
+}
+
+
+def is_pca_input(col: str) -> bool:
+    """قاعده‌ی انتخاب ورودی‌های PCA در نوت‌بوک و utils"""
+    return 'momentum_' in col or 'trend_' in col or 'volatility_' in col
+
+
+# ورودی‌های پیش‌فرض PCA_Tech_* وقتی لیست ذخیره‌شده‌ای در دسترس نیست
+DEFAULT_PCA_INPUTS: List[str] = [col for col in TA_COLUMNS if is_pca_input(col)]
+
+
+def required_ta_columns(feature_cols: Iterable[str], pca_inputs: Optional[Iterable[str]] = None) -> List[str]:
+    """
+    بستار وابستگی ورودی‌های مدل روی ستون‌های ta: ستون‌های مستقیم، ورودی‌های PCA_Tech_*
+    و وابستگی‌های ویژگی‌های مشتق‌شده. خروجی به ترتیب add_all_ta_features.
+    """
+    pca_inputs = list(pca_inputs) if pca_inputs is not None else DEFAULT_PCA_INPUTS
+    needed, stack = set(), list(feature_cols)
+    while stack:
+        col = stack.pop()
+        if col in needed:
+            continue
+        needed.add(col)
+        if col.startswith("PCA_Tech_"):
+            stack.extend(pca_inputs)
+        stack.extend(DERIVED_DEPENDENCIES.get(col, []))
+    return [col for col in TA_COLUMNS if col in needed]
+
+
+def add_ta_columns(df: pd.DataFrame, columns: Optional[Iterable[str]] = None, fillna: bool = True) -> pd.DataFrame:
+    """
+    جایگزین add_all_ta_features: فقط اندیکاتورهایی ساخته می‌شوند که یکی از columns را تولید می‌کنند
+    (columns=None یعنی کل کاتالوگ ta). از هر اندیکاتور فقط خروجی‌های درخواست‌شده محاسبه می‌شوند.
+    """
+    columns = TA_COLUMNS if columns is None else list(columns)
+    unknown = [col for col in columns if col not in COLUMN_PRODUCERS]
+    if unknown:
+        raise KeyError(f"No ta indicator produces: {unknown}")
+
+    wanted: Dict[str, List[str]] = {}
+    for col in columns:
+        wanted.setdefault(COLUMN_PRODUCERS[col], []).append(col)
+
+    new_cols = {}
+    for name, cols in wanted.items():
+        factory, outputs = TA_INDICATORS[name]
+        indicator = factory(df, fillna)
+        for col in cols:
+            new_cols[col] = getattr(indicator, outputs[col])()
+    return df.assign(**new_cols)
@@ -0,0 +1,109 @@
+# backend/app/feature_selection.py
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from pathlib import Path
+from sklearn.feature_selection import mutual_info_regression
+from typing import List, Optional, Sequence, Union
+from .feature_dag import frame_hash
+
+# اندازه‌ی نمونه‌ی طبقه‌بندی‌شده بر اساس تاریخ برای تخمین MI (k-NN روی کل داده بسیار کند است)
+MI_SAMPLE_ROWS = 100_000
+# آستانه‌های پیش‌فیلتر ارزان
+MIN_VARIANCE = 1e-10
+MAX_CORRELATION = 0.98
+
+
+def date_stratified_sample(df: pd.DataFrame, max_rows: int = MI_SAMPLE_ROWS, seed: int = 42) -> pd.DataFrame:
+    """نمونه‌ی تصادفی با سهم برابر از هر تاریخ (بدون groupby.apply)"""
+    if len(df) <= max_rows:
+        return df
+    codes, dates = pd.factorize(df["Date"])
+    per_date = max(1, max_rows // len(dates))
+    # ترتیب تصادفی داخل هر تاریخ و نگه داشتن per_date ردیف اول هر گروه
+    order = np.lexsort((np.random.default_rng(seed).random(len(df)), codes))
+    sizes = np.bincount(codes)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    rank = np.arange(len(df)) - starts[codes[order]]
+    keep = np.sort(order[rank < per_date])
+    return df.iloc[keep]
+
+
+def prefilter(X: np.ndarray, y: np.ndarray, features: List[str],
+              min_variance: float = MIN_VARIANCE, max_correlation: float = MAX_CORRELATION) -> List[str]:
+    """
+    حذف ستون‌های تقریباً ثابت و از هر خوشه‌ی ستون‌های با همبستگی بیش از max_correlation
+    فقط ستونی که بیشترین |همبستگی| با هدف را دارد نگه داشته می‌شود.
+    """
+    variance = X.var(axis=0)
+    keep = np.flatnonzero(variance > min_variance)
+    if len(keep) == 0:
+        return []
+    Z = (X[:, keep] - X[:, keep].mean(axis=0)) / np.sqrt(variance[keep])
+    yz = (y - y.mean()) / (y.std() or 1.0)
+    target_corr = np.abs(Z.T @ yz) / len(y)
+    corr = np.abs(Z.T @ Z) / len(y)
+
+    selected: List[int] = []
+    for i in np.argsort(-target_corr, kind="stable"):
+        if not selected or corr[i, selected].max() <= max_correlation:
+            selected.append(i)
+    return [features[keep[i]] for i in sorted(selected)]
+
+
+def _mi_block(X: np.ndarray, y: np.ndarray, seed: int) -> np.ndarray:
+    return mutual_info_regression(X, y, random_state=seed)
+
+
+def mutual_info_scores(X: np.ndarray, y: np.ndarray, n_jobs: Optional[int] = None, seed: int = 42) -> np.ndarray:
+    """MI هر ستون با هدف؛ ستون‌ها در n_jobs بلوک به طور موازی تخمین زده می‌شوند (MI هر ستون مستقل است)"""
+    n_jobs = n_jobs or os.cpu_count() or 1
+    blocks = [b for b in np.array_split(np.arange(X.shape[1]), min(n_jobs, X.shape[1])) if len(b)]
+    scores = Parallel(n_jobs=len(blocks))(delayed(_mi_block)(X[:, b], y, seed) for b in blocks)
+    return np.concatenate(scores)
+
+
+def select_features(df: pd.DataFrame, features: Sequence[str], target: str = "Return_7d", k: int = 50,
+                    cache_dir: Optional[Union[str, Path]] = None, data_version: Optional[str] = None,
+                    max_rows: int = MI_SAMPLE_ROWS, n_jobs: Optional[int] = None, seed: int = 42) -> List[str]:
+    """
+    انتخاب k ویژگی: پیش‌فیلتر واریانس/همبستگی، سپس MI روی نمونه‌ی طبقه‌بندی‌شده بر اساس تاریخ.
+    نتیجه برای هر (مجموعه‌ی ویژگی‌ها، نسخه‌ی داده، پارامترها) در cache_dir ذخیره می‌شود؛
+    data_version در نبود مقدار، هش محتوای ستون‌های ورودی است. ترتیب خروجی همان ترتیب features است.
+    """
+    features = list(features)
+    if data_version is None:
+        data_version = frame_hash(df[["Date", target] + features])
+    key = hashlib.sha256(json.dumps({"features": features, "target": target, "k": k, "data": data_version,
+                                     "max_rows": max_rows, "seed": seed}).encode()).hexdigest()[:16]
+    cache_path = Path(cache_dir) / f"selection-{key}.json" if cache_dir is not None else None
+    if cache_path is not None and cache_path.exists():
+        with open(cache_path, "r") as f:
+            print(f"Feature selection loaded from cache ({cache_path.name}).")
+            return json.load(f)["selected"]
+
+    sample = date_stratified_sample(df, max_rows, seed)
+    X = sample[features].to_numpy(np.float64)
+    y = sample[target].to_numpy(np.float64)
+    candidates = prefilter(X, y, features)
+    print(f"Feature selection: {len(candidates)}/{len(features)} features after prefilter, MI on {len(sample)} rows.")
+
+    index = [features.index(c) for c in candidates]
+    scores = mutual_info_scores(X[:, index], y, n_jobs, seed) if candidates else np.array([])
+    top = set(np.array(candidates)[np.argsort(-scores, kind="stable")[:k]]) if candidates else set()
+    selected = [c for c in features if c in top]
+
+    if cache_path is not None:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(cache_path, "w") as f:
+            json.dump({"selected": selected, "scores": dict(zip(candidates, scores.tolist()))}, f)
+    return selected
+
+
+def write_feature_cols(feature_cols: List[str], path: Union[str, Path]) -> None:
+    """لیست ورودی‌های مدل؛ همان فایلی که سرویس (FEATURES_PATH) می‌خواند"""
+    with open(path, "w") as f:
+        json.dump(list(feature_cols), f)
@@ -0,0 +1,170 @@
+# backend/app/feature_transform.py
+import joblib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+from .indicators import LAGS, SMA_WINDOWS, VOLATILITY_WINDOW
+
+# نسخه‌ی قالب فایل؛ با تغییر کلیدها افزایش می‌یابد
+TRANSFORM_VERSION = 1
+N_PCA_COMPONENTS = 5
+
+
+def transform_spec(beta_window: int = 30) -> Dict:
+    """پارامترهای مراحل بدون fit (lag، میانگین‌های متحرک، نوسان و Beta) که باید بین آموزش و سرویس یکسان باشند"""
+    return {
+        "lags": list(LAGS),
+        "ma_windows": list(SMA_WINDOWS),
+        "volatility_window": VOLATILITY_WINDOW,
+        "beta_window": int(beta_window),
+    }
+
+
+def fit_pca_transform(df: pd.DataFrame, pca_inputs: List[str], n_components: int = N_PCA_COMPONENTS,
+                      beta_window: int = 30) -> Dict:
+    """
+    fit کردن StandardScaler ورودی‌های PCA و خود PCA (NaN -> 0) و ادغام هر دو در یک نگاشت خطی:
+    PCA_Tech = X @ pca_weights + pca_bias. خروجی یک dict از آرایه‌های NumPy است (بدون وابستگی به کلاس sklearn).
+    """
+    from sklearn.decomposition import PCA
+    from sklearn.preprocessing import StandardScaler
+
+    X = df[pca_inputs].to_numpy(np.float64)
+    X = np.where(np.isnan(X), 0.0, X)
+    scaler = StandardScaler().fit(X)
+    pca = PCA(n_components=n_components).fit(scaler.transform(X))
+
+    # (X - mu) / s - m) @ C.T  =  X @ (C / s).T  -  (mu / s + m) @ C.T
+    components = pca.components_
+    weights = (components / scaler.scale_).T
+    bias = -(scaler.mean_ / scaler.scale_ + pca.mean_) @ components.T
+    return {
+        "version": TRANSFORM_VERSION,
+        "spec": transform_spec(beta_window),
+        "pca_inputs": list(pca_inputs),
+        "pca_weights": weights,
+        "pca_bias": bias,
+        "pca_explained_variance_ratio": pca.explained_variance_ratio_,
+    }
+
+
+def fit_clip_bounds(df: pd.DataFrame, columns: List[str], k: float = 1.5) -> Dict:
+    """حدود IQR هر ستون برای محدود کردن نقاط پرت: [Q1 - k·IQR، Q3 + k·IQR]"""
+    q1, q3 = df[columns].quantile(0.25), df[columns].quantile(0.75)
+    iqr = q3 - q1
+    return {"clip_columns": list(columns),
+            "clip_lower": (q1 - k * iqr).to_numpy(np.float64),
+            "clip_upper": (q3 + k * iqr).to_numpy(np.float64)}
+
+
+def apply_clip_bounds(transform: Dict, df: pd.DataFrame) -> pd.DataFrame:
+    """clip ستون‌های موجود با حدود آموزش (ستون‌های غایب، مثلاً Return_7d در سرویس، نادیده گرفته می‌شوند)"""
+    df = df.copy()
+    for col, lower, upper in zip(transform["clip_columns"], transform["clip_lower"], transform["clip_upper"]):
+        if col in df:
+            df[col] = df[col].clip(lower, upper)
+    return df
+
+
+def _yeo_johnson(x: np.ndarray, lmbda: float) -> np.ndarray:
+    """تبدیل Yeo-Johnson با lambda ثابت (مانند PowerTransformer؛ NaN حفظ می‌شود)"""
+    out = np.full_like(x, np.nan)
+    pos, neg = x >= 0, x < 0
+    eps = np.spacing(1.0)
+    if abs(lmbda) < eps:
+        out[pos] = np.log1p(x[pos])
+    else:
+        out[pos] = (np.power(x[pos] + 1, lmbda) - 1) / lmbda
+    if abs(lmbda - 2) > eps:
+        out[neg] = -(np.power(-x[neg] + 1, 2 - lmbda) - 1) / (2 - lmbda)
+    else:
+        out[neg] = -np.log1p(-x[neg])
+    return out
+
+
+def fit_power_transform(df: pd.DataFrame, columns: List[str]) -> Dict:
+    """
+    fit کردن PowerTransformer (yeo-johnson، standardize=True) و ذخیره‌ی پارامترهای آن به صورت آرایه:
+    lambda هر ستون و میانگین/مقیاس استانداردسازی پس از تبدیل.
+    """
+    from sklearn.preprocessing import PowerTransformer
+
+    X = df[columns].to_numpy(np.float64)
+    lambdas = PowerTransformer(method="yeo-johnson").fit(X).lambdas_
+    transformed = np.column_stack([_yeo_johnson(X[:, j], lmbda) for j, lmbda in enumerate(lambdas)])
+    scale = np.nanstd(transformed, axis=0)
+    scale[~(scale > 0)] = 1.0
+    return {"power_columns": list(columns), "power_lambdas": np.asarray(lambdas, np.float64),
+            "power_mean": np.nanmean(transformed, axis=0), "power_scale": scale}
+
+
+def apply_power_transform(transform: Dict, df: pd.DataFrame) -> pd.DataFrame:
+    """اعمال Yeo-Johnson و استانداردسازی آموزش روی ستون‌های موجود"""
+    df = df.copy()
+    params = zip(transform["power_columns"], transform["power_lambdas"], transform["power_mean"], transform["power_scale"])
+    for col, lmbda, mean, scale in params:
+        if col in df:
+            df[col] = (_yeo_johnson(df[col].to_numpy(np.float64), lmbda) - mean) / scale
+    return df
+
+
+def apply_outlier_transform(transform: Optional[Dict], df: pd.DataFrame) -> pd.DataFrame:
+    """مراحل پس از نرمال‌سازی در پیش‌پردازش آموزش: clip با حدود IQR و سپس PowerTransformer (هر کدام در صورت وجود)"""
+    if transform and "clip_columns" in transform:
+        df = apply_clip_bounds(transform, df)
+    if transform and "power_columns" in transform:
+        df = apply_power_transform(transform, df)
+    return df
+
+
+def set_feature_scaler(transform: Optional[Dict], scaler, feature_cols: List[str], beta_window: int = 30) -> Dict:
+    """
+    افزودن StandardScaler نهایی و لیست ورودی‌های مدل به مصنوع تبدیل.
+    scaler همان scaler ماتریس ویژگی (build_feature_matrix) است که رتبه‌بندها روی خروجی آن آموزش دیده‌اند،
+    تا سرویس ویژگی‌ها را با همان مقیاس آستانه‌های درخت‌ها ببیند.
+    """
+    transform = dict(transform) if transform else {
+        "version": TRANSFORM_VERSION, "spec": transform_spec(beta_window), "pca_inputs": [],
+    }
+    if len(feature_cols) != len(scaler.mean_):
+        raise ValueError(f"Scaler has {len(scaler.mean_)} features, expected {len(feature_cols)}.")
+    transform.update({"feature_cols": list(feature_cols),
+                      "feature_mean": np.asarray(scaler.mean_, np.float64),
+                      "feature_scale": np.asarray(scaler.scale_, np.float64)})
+    return transform
+
+
+def save_feature_transform(transform: Dict, path: Union[str, Path]) -> None:
+    joblib.dump(transform, path)
+
+
+def load_feature_transform(path: Union[str, Path], beta_window: Optional[int] = None) -> Dict:
+    """
+    بارگذاری مصنوع تبدیل و بررسی سازگاری آن با پارامترهای همین کد؛
+    ناسازگاری با ValueError گزارش می‌شود تا مدل با ویژگی‌های متفاوت از آموزش اجرا نشود.
+    """
+    transform = joblib.load(path)
+    if transform.get("version") != TRANSFORM_VERSION:
+        raise ValueError(f"Unsupported feature transform version: {transform.get('version')}")
+    expected = transform_spec(beta_window if beta_window is not None else transform["spec"]["beta_window"])
+    if transform["spec"] != expected:
+        raise ValueError(f"Feature transform spec {transform['spec']} does not match this pipeline {expected}")
+    return transform
+
+
+def has_pca(transform: Optional[Dict]) -> bool:
+    return bool(transform) and "pca_weights" in transform
+
+
+def apply_pca(transform: Dict, df: pd.DataFrame) -> np.ndarray:
+    """فقط transform: یک ضرب ماتریسی برای همه‌ی ردیف‌ها (ستون‌های ورودی غایب -> 0)"""
+    X = df.reindex(columns=transform["pca_inputs"]).to_numpy(np.float64)
+    X = np.where(np.isnan(X), 0.0, X)
+    return X @ transform["pca_weights"] + transform["pca_bias"]
+
+
+def apply_feature_scaler(transform: Dict, X: pd.DataFrame) -> np.ndarray:
+    """StandardScaler نهایی روی ستون‌های feature_cols (به همان ترتیب آموزش)"""
+    values = X[transform["feature_cols"]].to_numpy(np.float64)
+    return (values - transform["feature_mean"]) / transform["feature_scale"]
@@ -0,0 +1,117 @@
+# backend/app/fundamentals.py
+import json
+import time
+import pandas as pd
+import yfinance as yf
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# اطلاعات بنیادی حداکثر فصلی تغییر می‌کنند؛ یک هفته اعتبار کافی است
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+# نگاشت فیلدهای yfinance به نام ستون‌های دیتاست
+FUNDAMENTAL_FIELDS = {
+    "Market Cap": "marketCap",
+    "P/E Ratio": "trailingPE",
+    "EPS": "trailingEps",
+    "Sector": "sector",
+    "Industry": "industry",
+}
+
+
+def yfinance_info(ticker: str) -> Dict[str, Any]:
+    """Provider پیش‌فرض: دیکشنری info از yfinance"""
+    return yf.Ticker(ticker).info
+
+
+def parse_info(ticker: str, info: Dict[str, Any]) -> Dict[str, Any]:
+    """استخراج ستون‌های مورد نیاز از دیکشنری info"""
+    row = {"Ticker": ticker, "Company": info.get("longName", info.get("shortName", "N/A"))}
+    for col, key in FUNDAMENTAL_FIELDS.items():
+        row[col] = info.get(key)
+    return row
+
+
+class FundamentalsCache:
+    """کش محلی JSON با TTL برای اطلاعات بنیادی هر نماد"""
+
+    def __init__(self, path: Path, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            with open(self.path, "r") as f:
+                self.entries = json.load(f)
+
+    def get(self, ticker: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """مقدار کش‌شده در صورت معتبر بودن، در غیر این صورت None"""
+        entry = self.entries.get(ticker)
+        now = time.time() if now is None else now
+        if entry is None or now - entry["fetched_at"] > self.ttl_seconds:
+            return None
+        return entry["row"]
+
+    def stale(self, tickers: List[str], now: Optional[float] = None) -> List[str]:
+        return [t for t in tickers if self.get(t, now) is None]
+
+    def put(self, ticker: str, row: Dict[str, Any], now: Optional[float] = None) -> None:
+        self.entries[ticker] = {"fetched_at": time.time() if now is None else now, "row": row}
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f)
+        tmp_path.replace(self.path)
+
+
+def _fetch_one(ticker: str, provider: Callable[[str], Dict[str, Any]],
+               retries: int, backoff: float) -> Optional[Dict[str, Any]]:
+    """واکشی یک نماد با تلاش مجدد و backoff نمایی؛ در صورت شکست None"""
+    for attempt in range(retries):
+        try:
+            return parse_info(ticker, provider(ticker))
+        except Exception as e:
+            if attempt == retries - 1:
+                print(f"Error for {ticker}: {e}")
+                return None
+            time.sleep(backoff * (2 ** attempt))
+    return None
+
+
+def fetch_fundamentals(tickers: List[str], cache: Optional[FundamentalsCache] = None,
+                       provider: Callable[[str], Dict[str, Any]] = yfinance_info,
+                       max_workers: int = 8, retries: int = 3, backoff: float = 1.0) -> pd.DataFrame:
+    """
+    واکشی موازی اطلاعات بنیادی با ThreadPool محدود.
+    فقط نمادهایی که در کش منقضی شده‌اند یا وجود ندارند درخواست می‌شوند.
+    """
+    to_fetch = cache.stale(tickers) if cache is not None else list(tickers)
+    print(f"Fetching fundamentals for {len(to_fetch)}/{len(tickers)} tickers (rest from cache)...")
+
+    fetched: Dict[str, Optional[Dict[str, Any]]] = {}
+    if to_fetch:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            rows = pool.map(lambda t: _fetch_one(t, provider, retries, backoff), to_fetch)
+            fetched = dict(zip(to_fetch, rows))
+
+    company_info = []
+    for ticker in tickers:
+        row = fetched.get(ticker)
+        if row is not None:
+            if cache is not None:
+                cache.put(ticker, row)
+        elif cache is not None and ticker in cache.entries:
+            # نماد معتبر در کش، یا واکشی ناموفق: آخرین مقدار موجود (حتی منقضی) استفاده می‌شود
+            row = cache.entries[ticker]["row"]
+        else:
+            # افزودن ردیف خالی در صورت خطا (در کش ذخیره نمی‌شود تا دفعه‌ی بعد دوباره تلاش شود)
+            row = {"Ticker": ticker, "Company": "N/A", "Sector": "N/A", "Industry": "N/A"}
+        company_info.append(row)
+
+    if cache is not None:
+        cache.save()
+
+    columns = ["Ticker", "Company"] + list(FUNDAMENTAL_FIELDS)
+    return pd.DataFrame(company_info, columns=columns)
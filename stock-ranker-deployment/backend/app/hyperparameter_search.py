@@ -0,0 +1,274 @@
+# backend/app/hyperparameter_search.py
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+from .dataset_cache import catboost_pools, lightgbm_datasets
+from .feature_matrix import FeatureMatrix
+from .labels import relevance_labels
+
+# معیار جست‌وجو: NDCG@5 روی پنجره‌ی اعتبارسنجی (همان eval_metric سلول‌های آموزش)
+TOPK = 5
+# تقسیم زمانی پیش‌فرض (train, val, test) مانند سلول‌های مدل؛ test در جست‌وجو دیده نمی‌شود
+SPLIT_FRACTIONS = (0.75, 0.10, 0.15)
+# هرس: هر PRUNE_EVERY iteration مقدار میانی با میانه‌ی trial های قبلی در همان گام مقایسه می‌شود
+PRUNE_EVERY = 50
+PRUNE_WARMUP = 100
+PRUNE_MIN_TRIALS = 5
+THREADS_PER_WORKER = 2
+
+# پارامترهای ثابت هر رتبه‌بند (سقف iteration و early stopping مانند نوت‌بوک)
+BASE_PARAMS = {
+    "lightgbm": {"objective": "lambdarank", "metric": "ndcg", "eval_at": [TOPK], "seed": 42, "verbose": -1,
+                 "num_boost_round": 2000, "early_stopping_rounds": 100},
+    "catboost": {"loss_function": "YetiRank", "eval_metric": f"NDCG:top={TOPK}", "random_seed": 42,
+                 "iterations": 3000, "early_stopping_rounds": 150, "use_best_model": True},
+}
+
+# فضای جست‌وجو: نام -> (نوع، پایین، بالا)؛ log برای نرخ‌ها و منظم‌سازی
+SEARCH_SPACES = {
+    "lightgbm": {
+        "learning_rate": ("log", 0.01, 0.2),
+        "num_leaves": ("int", 15, 255),
+        "min_data_in_leaf": ("int", 10, 200),
+        "feature_fraction": ("float", 0.5, 1.0),
+        "bagging_fraction": ("float", 0.5, 1.0),
+        "lambda_l2": ("log", 1e-3, 10.0),
+    },
+    "catboost": {
+        "learning_rate": ("log", 0.01, 0.2),
+        "depth": ("int", 4, 10),
+        "l2_leaf_reg": ("log", 1.0, 30.0),
+        "random_strength": ("float", 0.0, 2.0),
+        "bagging_temperature": ("float", 0.0, 1.0),
+    },
+}
+
+
+def sample_params(model: str, trial: int, seed: int = 42) -> Dict:
+    """پیکربندی trial به صورت قطعی از (seed, trial)؛ ادامه‌ی جست‌وجو همان پیکربندی‌ها را بازتولید می‌کند"""
+    rng = np.random.default_rng([seed, trial])
+    params = {}
+    for name, (kind, low, high) in SEARCH_SPACES[model].items():
+        if kind == "log":
+            params[name] = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+        elif kind == "int":
+            params[name] = int(rng.integers(low, high + 1))
+        else:
+            params[name] = float(rng.uniform(low, high))
+    return params
+
+
+def trial_id(model: str, params: Dict, data_key: str) -> str:
+    return hashlib.sha256(json.dumps({"model": model, "params": params, "data": data_key},
+                                     sort_keys=True).encode()).hexdigest()[:12]
+
+
+class TrialStore:
+    """ذخیره‌ی محلی trial ها (یک رکورد JSON در هر خط)؛ فقط فرایند اصلی می‌نویسد"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def load(self, model: Optional[str] = None) -> List[Dict]:
+        if not self.path.exists():
+            return []
+        records = []
+        with open(self.path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # خط ناقص از اجرای قطع‌شده
+        return [r for r in records if model is None or r["model"] == model]
+
+    def append(self, record: Dict) -> None:
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def frame(self, model: Optional[str] = None) -> pd.DataFrame:
+        records = self.load(model)
+        return pd.DataFrame([{**{k: v for k, v in r.items() if k not in ("params", "curve")}, **r["params"]}
+                             for r in records])
+
+    def best(self, model: str, data_key: Optional[str] = None) -> Optional[Dict]:
+        complete = [r for r in self.load(model) if r["status"] == "complete"
+                    and (data_key is None or r["data_key"] == data_key)]
+        return max(complete, key=lambda r: r["score"]) if complete else None
+
+
+def prune_thresholds(records: List[Dict], min_trials: int = PRUNE_MIN_TRIALS) -> Dict[int, float]:
+    """میانه‌ی مقدار میانی NDCG@5 در هر گام بین trial های پایان‌یافته (هرس میانه)"""
+    by_step: Dict[int, List[float]] = {}
+    for r in records:
+        for step, value in r.get("curve", {}).items():
+            by_step.setdefault(int(step), []).append(value)
+    return {step: float(np.median(values)) for step, values in by_step.items() if len(values) >= min_trials}
+
+
+class _Pruner:
+    """مقادیر میانی را ثبت و در صورت پایین‌تر بودن بهترین مقدار تا این گام از میانه، توقف را اعلام می‌کند"""
+
+    def __init__(self, thresholds: Dict[int, float], every: int, warmup: int):
+        self.thresholds = thresholds
+        self.every = every
+        self.warmup = warmup
+        self.curve: Dict[int, float] = {}
+        self.best = -np.inf
+        self.pruned = False
+
+    def report(self, step: int, value: float) -> bool:
+        self.best = max(self.best, value)
+        if step % self.every:
+            return False
+        self.curve[step] = self.best
+        threshold = self.thresholds.get(step)
+        self.pruned = step >= self.warmup and threshold is not None and self.best < threshold
+        return self.pruned
+
+
+def limit_threads(threads: int) -> None:
+    # محدود کردن کتابخانه‌های عددی هر worker تا workerها هسته‌ها را بیش از حد اشغال نکنند
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+
+
+def _train_lightgbm(params: Dict, datasets: Dict, threads: int, pruner: _Pruner) -> Tuple[float, int]:
+    import lightgbm as lgb
+
+    base = dict(BASE_PARAMS["lightgbm"])
+    rounds, stopping = base.pop("num_boost_round"), base.pop("early_stopping_rounds")
+    params = {**base, **params, "bagging_freq": 1, "num_threads": threads}
+
+    def prune_callback(env):
+        for data_name, metric, value, _ in env.evaluation_result_list:
+            if data_name == "val" and metric == f"ndcg@{TOPK}" and pruner.report(env.iteration + 1, value):
+                raise lgb.callback.EarlyStopException(env.iteration, env.evaluation_result_list)
+
+    booster = lgb.train(params, datasets["train"], num_boost_round=rounds, valid_sets=[datasets["val"]],
+                        valid_names=["val"], callbacks=[lgb.early_stopping(stopping, verbose=False), prune_callback])
+    return float(booster.best_score["val"][f"ndcg@{TOPK}"]), int(booster.best_iteration)
+
+
+class _CatBoostPruneCallback:
+    def __init__(self, pruner: _Pruner):
+        self.pruner = pruner
+
+    def after_iteration(self, info) -> bool:
+        # iteration از ۱ شروع می‌شود؛ YetiRank علاوه بر eval_metric معیار NDCG کامل را هم گزارش می‌کند
+        scores = info.metrics["validation"]
+        name = next(k for k in scores if k.startswith(f"NDCG:top={TOPK}"))
+        return not self.pruner.report(info.iteration, scores[name][-1])
+
+
+def _train_catboost(params: Dict, pools: Dict, threads: int, pruner: _Pruner) -> Tuple[float, int]:
+    from catboost import CatBoostRanker
+
+    model = CatBoostRanker(**BASE_PARAMS["catboost"], **params, thread_count=threads)
+    model.fit(pools["train"], eval_set=pools["val"], callbacks=[_CatBoostPruneCallback(pruner)], verbose=False)
+    # بهترین مقدار اعتبارسنجی همان بیشینه‌ی ثبت‌شده در callback است (get_best_score بدون لاگ خالی است)
+    return float(pruner.best), int(model.get_best_iteration())
+
+
+def _run_trial(model: str, trial: int, params: Dict, matrix_dir: str, spans: Dict, label_mode: str,
+               cache_dir: str, threads: int, thresholds: Dict[int, float], every: int, warmup: int) -> Dict:
+    """اجرای یک trial در worker: دیتاست‌ها از کش (ساخته‌شده در فرایند اصلی) بارگذاری می‌شوند"""
+    limit_threads(threads)
+    started = time.time()
+    fm = FeatureMatrix(matrix_dir)
+    labels = relevance_labels(fm.frame(), mode=label_mode).astype(int)
+    pruner = _Pruner(thresholds, every, warmup)
+    record = {"model": model, "trial": trial, "params": params}
+    try:
+        if model == "lightgbm":
+            score, best_iteration = _train_lightgbm(params, lightgbm_datasets(fm, spans, labels, cache_dir), threads, pruner)
+        else:
+            score, best_iteration = _train_catboost(params, catboost_pools(fm, spans, labels, cache_dir), threads, pruner)
+        record.update(status="pruned" if pruner.pruned else "complete", score=score, best_iteration=best_iteration)
+    except Exception as e:
+        record.update(status="failed", error=str(e), score=None, best_iteration=None)
+    record.update(curve=pruner.curve, seconds=round(time.time() - started, 1))
+    return record
+
+
+def search_data_key(fm: FeatureMatrix, label_mode: str, train_span: Tuple[int, int], val_span: Tuple[int, int]) -> str:
+    """کلید داده‌ی trial ها (نسخه‌ی ماتریس، حالت برچسب و بازه‌ها)؛ best_params با همین کلید فقط trial های همین داده را می‌خواند"""
+    return f"{fm.data_version}-{label_mode}-{tuple(train_span)}-{tuple(val_span)}"
+
+
+def run_search(model: str, matrix_dir: str, n_trials: int, store_path: Union[str, Path], cache_dir: Union[str, Path],
+               label_mode: str = "global", fractions: Tuple[float, ...] = SPLIT_FRACTIONS,
+               n_workers: Optional[int] = None, threads_per_worker: int = THREADS_PER_WORKER, seed: int = 42,
+               prune_every: int = PRUNE_EVERY, prune_warmup: int = PRUNE_WARMUP) -> pd.DataFrame:
+    """
+    جست‌وجوی تصادفی موازی ابرپارامترهای رتبه‌بند ('lightgbm' یا 'catboost') روی CPU همین ماشین.
+    هر trial در یک فرایند worker با threads_per_worker نخ اجرا می‌شود (n_workers × threads ≈ تعداد هسته‌ها)؛
+    workerها ماتریس ویژگی memory-mapped و دیتاست‌های کش‌شده را مشترکاً می‌خوانند.
+    trial های ضعیف با هرس میانه روی NDCG@5 میانی متوقف می‌شوند. هر trial پایان‌یافته بلافاصله در
+    store_path ثبت می‌شود؛ اجرای دوباره trial های ثبت‌شده را رد کرده و فقط باقی‌مانده را اجرا می‌کند.
+    """
+    if model not in SEARCH_SPACES:
+        raise ValueError(f"Unknown ranker for search: {model}")
+    fm = FeatureMatrix(matrix_dir)
+    train_span, val_span = fm.split(fractions)[:2]
+    spans = {"train": train_span, "val": val_span}
+    labels = relevance_labels(fm.frame(), mode=label_mode).astype(int)
+    # ساخت یک‌باره‌ی کش دیتاست در فرایند اصلی؛ workerها فقط بارگذاری می‌کنند
+    if model == "lightgbm":
+        lightgbm_datasets(fm, spans, labels, cache_dir)
+    else:
+        catboost_pools(fm, spans, labels, cache_dir)
+    data_key = search_data_key(fm, label_mode, train_span, val_span)
+
+    store = TrialStore(store_path)
+    records = [r for r in store.load(model) if r.get("data_key") == data_key and r["status"] != "failed"]
+    done = {r["id"] for r in records}
+    pending = []
+    for trial in range(n_trials):
+        params = sample_params(model, trial, seed)
+        if trial_id(model, params, data_key) not in done:
+            pending.append((trial, params))
+    print(f"Search {model}: {len(done)} trials in store, {len(pending)} to run.")
+
+    n_workers = n_workers or max(1, (os.cpu_count() or 1) // threads_per_worker)
+    # spawn: fork پس از استفاده‌ی OpenMP در فرایند اصلی (LightGBM/CatBoost) ممکن است قفل شود
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=limit_threads, initargs=(threads_per_worker,)) as pool:
+        running = {}
+        while pending or running:
+            # trial جدید با آستانه‌های هرس محاسبه‌شده از همه‌ی trial های پایان‌یافته تا این لحظه
+            while pending and len(running) < n_workers:
+                trial, params = pending.pop(0)
+                future = pool.submit(_run_trial, model, trial, params, matrix_dir, spans, label_mode, str(cache_dir),
+                                     threads_per_worker, prune_thresholds(records), prune_every, prune_warmup)
+                running[future] = (trial, params)
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                trial, params = running.pop(future)
+                record = future.result()
+                record.update(id=trial_id(model, params, data_key), data_key=data_key)
+                store.append(record)
+                if record["status"] != "failed":
+                    records.append(record)
+                score = f"{record['score']:.4f}" if record["score"] is not None else "-"
+                print(f"  trial {trial}: {record['status']} NDCG@{TOPK}={score} ({record['seconds']}s)")
+
+    return store.frame(model)
+
+
+def best_params(model: str, store_path: Union[str, Path], data_key: Optional[str] = None) -> Optional[Dict]:
+    """پارامترهای بهترین trial کامل (برای جایگزینی ثابت‌های سلول آموزش)؛ در نبود نتیجه None"""
+    best = TrialStore(store_path).best(model, data_key)
+    return dict(best["params"]) if best else None
@@ -0,0 +1,200 @@
+# backend/app/incremental_training.py
+import json
+import os
+import shutil
+import time
+import numpy as np
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+from .feature_matrix import FeatureMatrix
+from .labels import relevance_labels
+
+# پنجره‌های بازآموزی افزایشی (بر حسب تعداد تاریخ‌های ماتریس ویژگی)
+INCREMENTAL_TRAIN_DAYS = int(os.getenv("INCREMENTAL_TRAIN_DAYS", "250"))
+INCREMENTAL_VAL_DAYS = int(os.getenv("INCREMENTAL_VAL_DAYS", "20"))
+# سقف درخت‌های جدید و نرخ یادگیری آن‌ها (درخت‌های مدل مستقر دست نمی‌خورند)
+INCREMENTAL_ITERATIONS = int(os.getenv("INCREMENTAL_ITERATIONS", "300"))
+INCREMENTAL_LEARNING_RATE = float(os.getenv("INCREMENTAL_LEARNING_RATE", "0.02"))
+EARLY_STOPPING_ROUNDS = 50
+# حداقل تعداد تاریخ برچسب‌دار که مدل پایه روی آن‌ها آموزش ندیده است؛ کمتر از آن بازآموزی رد می‌شود
+INCREMENTAL_MIN_VAL_DAYS = int(os.getenv("INCREMENTAL_MIN_VAL_DAYS", "5"))
+# فهرست نسخه‌های ساخته‌شده (کنار فایل‌های .cbm)
+VERSIONS_FILE = "versions.json"
+# پارامترهای ساختاری که از مدل پایه به درخت‌های جدید منتقل می‌شوند
+INHERITED_PARAMS = ("loss_function", "eval_metric", "depth", "l2_leaf_reg", "random_seed")
+
+
+def incremental_spans(n_dates: int, train_days: int, val_days: int,
+                      first_unseen: int = 0) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+    """
+    پنجره‌ی اعتبارسنجی = حداکثر val_days تاریخ آخر، ولی نه پیش از first_unseen (اولین تاریخی که مدل پایه
+    روی آن آموزش ندیده است)؛ پنجره‌ی آموزش = train_days تاریخ پیش از آن
+    """
+    val_start = max(n_dates - val_days, first_unseen)
+    if val_start <= 0 or val_start >= n_dates:
+        raise ValueError(f"Feature matrix has {n_dates} dates, no validation window after date index {first_unseen}.")
+    return (max(0, val_start - train_days), val_start), (val_start, n_dates)
+
+
+def _base_trained_through(versions: list, base_model_path: Union[str, Path]) -> Optional[str]:
+    """آخرین تاریخ آموزش مدل پایه: رکورد آخرین نسخه‌ی promote‌شده روی همین مسیر (None برای مدل اولیه‌ی نوت‌بوک)"""
+    promoted = [v for v in versions if v.get("promoted_to") == str(base_model_path)]
+    return promoted[-1]["train_dates"][1] if promoted else None
+
+
+def _pool(fm: FeatureMatrix, span: Tuple[int, int], labels: np.ndarray):
+    from catboost import Pool
+    rows = fm.rows(*span)
+    # پنجره‌ها کوچک‌اند؛ Pool خام از view روی memmap (مرزهای کوانتیزه‌سازی مدل پایه استفاده می‌شوند)
+    return Pool(data=fm.X[rows], label=labels[rows], group_id=fm.group_ids(*span))
+
+
+def _metric_value(scores: Dict) -> float:
+    # مقدار تنها معیار ارزیابی (نام کلید شامل پارامترهای معیار است، مثلاً 'NDCG:top=5;type=Base')
+    value = next(iter(scores.values()))
+    return float(value[-1] if isinstance(value, list) else value)
+
+
+def _load_versions(out_dir: Path) -> list:
+    path = out_dir / VERSIONS_FILE
+    if not path.exists():
+        return []
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _write_versions(out_dir: Path, versions: list) -> None:
+    tmp = out_dir / (VERSIONS_FILE + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(versions, f, indent=2)
+    os.replace(tmp, out_dir / VERSIONS_FILE)
+
+
+def incremental_retrain(fm: FeatureMatrix, base_model_path: Union[str, Path], out_dir: Union[str, Path],
+                        label_mode: str = "global", train_days: int = INCREMENTAL_TRAIN_DAYS,
+                        val_days: int = INCREMENTAL_VAL_DAYS, iterations: int = INCREMENTAL_ITERATIONS,
+                        learning_rate: float = INCREMENTAL_LEARNING_RATE,
+                        early_stopping_rounds: int = EARLY_STOPPING_ROUNDS,
+                        min_val_days: int = INCREMENTAL_MIN_VAL_DAYS,
+                        refit: bool = True, thread_count: int = -1) -> Optional[Dict]:
+    """
+    ادامه‌ی آموزش رتبه‌بند CatBoost مستقر (init_model) به جای آموزش ۳۰۰۰ iteration از صفر:
+    1) درخت‌های جدید روی پنجره‌ی اخیر با early stopping روی پنجره‌ی اعتبارسنجی انتهایی؛
+    2) refit: همان تعداد درخت جدید دوباره از مدل پایه روی پنجره‌ی اخیر شامل تاریخ‌های اعتبارسنجی
+       (تازه‌ترین برچسب‌های بالغ‌شده) آموزش داده می‌شوند.
+    خروجی یک فایل .cbm نسخه‌دار در out_dir به همراه رکورد آن در versions.json؛
+    اگر هیچ درخت جدیدی معیار اعتبارسنجی را بهتر نکند None برمی‌گردد و نسخه‌ای ساخته نمی‌شود.
+    پنجره‌ی اعتبارسنجی فقط از تاریخ‌های پس از پایان آموزش مدل پایه (train_dates نسخه‌ی promote‌شده در
+    versions.json) ساخته می‌شود تا base_score درون‌نمونه‌ای نباشد؛ با کمتر از min_val_days تاریخ جدید None برمی‌گردد.
+    """
+    from catboost import CatBoostRanker
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    base = CatBoostRanker()
+    base.load_model(str(base_model_path))
+    if len(base.feature_names_) != fm.X.shape[1]:
+        raise ValueError(f"Base model expects {len(base.feature_names_)} features, matrix has {fm.X.shape[1]}.")
+
+    base_params = base.get_all_params()
+    params = {k: base_params[k] for k in INHERITED_PARAMS if k in base_params}
+    metric = params.get("eval_metric", "NDCG:top=5")
+    labels = relevance_labels(fm.frame(), mode=label_mode).astype(int)
+    trained_through = _base_trained_through(_load_versions(out_dir), base_model_path)
+    first_unseen = 0
+    if trained_through is not None:
+        first_unseen = int(np.searchsorted(fm.group_dates, np.datetime64(trained_through, "D"), side="right"))
+        unseen = fm.n_dates - first_unseen
+        if unseen < min_val_days:
+            print(f"Only {unseen} labeled dates after the base model's training end ({trained_through}); "
+                  f"need {min_val_days}. Skipping incremental retrain.")
+            return None
+    train_span, val_span = incremental_spans(fm.n_dates, train_days, val_days, first_unseen)
+    train_pool, val_pool = _pool(fm, train_span, labels), _pool(fm, val_span, labels)
+
+    started = time.time()
+    # eval_period = تعداد درخت‌ها: فقط مقدار معیار کل مدل پایه محاسبه می‌شود
+    base_score = _metric_value(base.eval_metrics(val_pool, [metric], eval_period=base.tree_count_))
+    model = CatBoostRanker(**params, iterations=iterations, learning_rate=learning_rate,
+                           use_best_model=True, early_stopping_rounds=early_stopping_rounds,
+                           thread_count=thread_count)
+    model.fit(train_pool, eval_set=val_pool, init_model=base, verbose=50)
+    new_trees = model.tree_count_ - base.tree_count_
+    val_score = _metric_value(model.eval_metrics(val_pool, [metric], eval_period=model.tree_count_))
+    print(f"Incremental retrain: {new_trees} new trees, validation {metric} {base_score:.4f} -> {val_score:.4f}")
+    if new_trees <= 0 or val_score <= base_score:
+        print("New trees did not improve the validation window; keeping the deployed model.")
+        return None
+
+    if refit:
+        fit_span = (max(0, fm.n_dates - train_days), fm.n_dates)
+        model = CatBoostRanker(**params, iterations=new_trees, learning_rate=learning_rate, thread_count=thread_count)
+        model.fit(_pool(fm, fit_span, labels), init_model=base, verbose=False)
+    else:
+        fit_span = train_span
+
+    trained_through = str(fm.group_dates[fit_span[1] - 1])
+    version = f"{trained_through.replace('-', '')}-{fm.data_version[:8]}"
+    path = out_dir / f"catboost_ranker_{version}.cbm"
+    tmp = path.with_suffix(".tmp")
+    model.save_model(str(tmp))
+    os.replace(tmp, path)
+
+    record = {
+        "version": version,
+        "path": path.name,
+        "base_model": str(base_model_path),
+        "base_trees": int(base.tree_count_),
+        "new_trees": int(new_trees),
+        "data_version": fm.data_version,
+        "train_dates": [str(fm.group_dates[fit_span[0]]), trained_through],
+        "val_dates": [str(fm.group_dates[val_span[0]]), str(fm.group_dates[val_span[1] - 1])],
+        "metric": metric,
+        "base_val_score": base_score,
+        "val_score": val_score,
+        "refit": refit,
+        "seconds": round(time.time() - started, 1),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    versions = [v for v in _load_versions(out_dir) if v["version"] != version] + [record]
+    _write_versions(out_dir, versions)
+    print(f"Saved model version {version} ({record['seconds']}s): {path}")
+    return record
+
+
+def promote_version(record: Dict, out_dir: Union[str, Path], model_path: Union[str, Path]) -> None:
+    """
+    کپی اتمیک نسخه‌ی انتخاب‌شده روی مسیر مدل سرویس (MODEL_PATH)؛ promoted_to در versions.json ثبت می‌شود
+    تا بازآموزی بعدی پایان آموزش مدل پایه را بداند.
+    """
+    out_dir, model_path = Path(out_dir), Path(model_path)
+    tmp = model_path.with_suffix(".tmp")
+    shutil.copyfile(out_dir / record["path"], tmp)
+    os.replace(tmp, model_path)
+    versions = _load_versions(out_dir)
+    for v in versions:
+        if v["version"] == record["version"]:
+            v.update(promoted_to=str(model_path), promoted=time.strftime("%Y-%m-%dT%H:%M:%S"))
+    _write_versions(out_dir, versions)
+    print(f"Promoted model version {record['version']} to {model_path}")
+
+
+def main():
+    """بازآموزی افزایشی روزانه/هفتگی مدل مستقر روی ماتریس ویژگی به‌روزشده و جایگزینی آن در صورت بهبود"""
+    from app.utils import MODEL_DIR, MODEL_PATH
+
+    print("--- Starting Incremental Retrain Job ---")
+    matrix_dir = Path(os.getenv("FEATURE_MATRIX_DIR", str(MODEL_DIR / "feature_matrix")))
+    out_dir = MODEL_DIR / "model_versions"
+    try:
+        fm = FeatureMatrix(str(matrix_dir))
+        record = incremental_retrain(fm, MODEL_PATH, out_dir, label_mode=os.getenv("LABEL_MODE", "global"))
+    except Exception as e:
+        print(f"FATAL: Incremental retrain failed. {e}")
+        return
+    if record is not None:
+        promote_version(record, out_dir, MODEL_PATH)
+
+
+if __name__ == "__main__":
+    main()
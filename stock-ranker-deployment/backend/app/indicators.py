@@ -0,0 +1,281 @@
+# backend/app/indicators.py
+import copy
+import math
+import joblib
+import numpy as np
+import pandas as pd
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional
+from ta.momentum import RSIIndicator
+from ta.trend import MACD, EMAIndicator, SMAIndicator
+from ta.volatility import AverageTrueRange, BollingerBands
+from ta.volume import OnBalanceVolumeIndicator
+from ta.others import DailyReturnIndicator, DailyLogReturnIndicator
+
+# پارامترها مطابق add_all_ta_features (کتابخانه‌ی ta با fillna=True) و ویژگی‌های utils
+SMA_WINDOWS = [5, 10, 20]
+LAGS = [1, 3, 5]
+VOLATILITY_WINDOW = 10
+MACD_FAST, MACD_SLOW, MACD_SIGN = 12, 26, 9
+RSI_WINDOW = 14
+ATR_WINDOW = 10
+BB_WINDOW, BB_DEV = 20, 2
+
+# ویژگی‌های خود پروژه (روی Adj Close)
+OWN_COLUMNS = (
+    [f"Adj_Close_Lag_{lag}" for lag in LAGS]
+    + [f"SMA_{w}" for w in SMA_WINDOWS]
+    + [f"EMA_{w}" for w in SMA_WINDOWS]
+    + ["Volatility_Rolling_Std"]
+)
+# ستون‌های هم‌نام با خروجی ta (روی Close)
+TA_COLUMNS = [
+    "volume_obv",
+    "volatility_bbm", "volatility_bbh", "volatility_bbl", "volatility_bbw",
+    "volatility_bbp", "volatility_bbhi", "volatility_bbli",
+    "volatility_atr",
+    "trend_macd", "trend_macd_signal", "trend_macd_diff",
+    "trend_sma_fast", "trend_sma_slow", "trend_ema_fast", "trend_ema_slow",
+    "momentum_rsi",
+    "others_dr", "others_dlr",
+]
+INDICATOR_COLUMNS = OWN_COLUMNS + TA_COLUMNS
+
+# طول بافر قیمت‌ها (بزرگ‌ترین پنجره‌ی غلتان)
+BUFFER_SIZE = max(MACD_SLOW, BB_WINDOW, max(SMA_WINDOWS), VOLATILITY_WINDOW, max(LAGS) + 1)
+
+# اختلاف نسبی مجاز بین دو مسیر در حالت verify
+VERIFY_RTOL = 1e-6
+VERIFY_ATOL = 1e-8
+
+
+def _ema(prev: Optional[float], x: float, alpha: float) -> float:
+    """EMA با adjust=False؛ اولین مقدار برابر خود داده است"""
+    return x if prev is None else (1 - alpha) * prev + alpha * x
+
+
+def _new_state() -> Dict:
+    return {
+        "n": 0, "last_date": None, "last_adj_close": None,
+        "close": deque(maxlen=BUFFER_SIZE), "adj": deque(maxlen=BUFFER_SIZE),
+        "ema": {}, "rsi_up": None, "rsi_dn": None,
+        "obv": 0.0, "atr": 0.0, "tr_sum": 0.0,
+        "bbw": None, "bbp": None,
+    }
+
+
+def _step(state: Dict, date: pd.Timestamp, bar: Dict[str, float]) -> Dict[str, float]:
+    """به‌روزرسانی O(1) وضعیت یک نماد با یک کندل جدید و بازگرداندن مقادیر اندیکاتورها"""
+    close, adj = bar["Close"], bar["Adj Close"]
+    prev_close = state["close"][-1] if state["close"] else None
+    state["close"].append(close)
+    state["adj"].append(adj)
+    state["n"] += 1
+    out: Dict[str, float] = {}
+
+    # --- ویژگی‌های خود پروژه روی Adj Close ---
+    adj_buf = list(state["adj"])
+    for lag in LAGS:
+        out[f"Adj_Close_Lag_{lag}"] = adj_buf[-1 - lag] if len(adj_buf) > lag else np.nan
+    for w in SMA_WINDOWS:
+        out[f"SMA_{w}"] = float(np.mean(adj_buf[-w:]))
+        key = f"adj_{w}"
+        state["ema"][key] = _ema(state["ema"].get(key), adj, 2 / (w + 1))
+        out[f"EMA_{w}"] = state["ema"][key]
+    window = adj_buf[-VOLATILITY_WINDOW:]
+    out["Volatility_Rolling_Std"] = float(np.std(window, ddof=1)) if len(window) > 1 else np.nan
+
+    # --- اندیکاتورهای ta روی Close ---
+    close_buf = list(state["close"])
+    if prev_close is not None and close < prev_close:
+        state["obv"] -= bar["Volume"]
+    else:
+        state["obv"] += bar["Volume"]
+    out["volume_obv"] = state["obv"]
+
+    bb = close_buf[-BB_WINDOW:]
+    mavg, mstd = float(np.mean(bb)), float(np.std(bb, ddof=0))
+    hband, lband = mavg + BB_DEV * mstd, mavg - BB_DEV * mstd
+    out["volatility_bbm"], out["volatility_bbh"], out["volatility_bbl"] = mavg, hband, lband
+    # مقادیر نامعتبر مانند ta با آخرین مقدار معتبر (ffill) و در نبود آن با 0 پر می‌شوند
+    if mavg != 0:
+        state["bbw"] = (hband - lband) / mavg * 100
+    out["volatility_bbw"] = state["bbw"] if state["bbw"] is not None else 0.0
+    if hband != lband:
+        state["bbp"] = (close - lband) / (hband - lband)
+    out["volatility_bbp"] = state["bbp"] if state["bbp"] is not None else 0.0
+    out["volatility_bbhi"] = 1.0 if close > hband else 0.0
+    out["volatility_bbli"] = 1.0 if close < lband else 0.0
+
+    tr = bar["High"] - bar["Low"]
+    if prev_close is not None:
+        tr = max(tr, abs(bar["High"] - prev_close), abs(bar["Low"] - prev_close))
+    if state["n"] < ATR_WINDOW:
+        state["tr_sum"] += tr
+    elif state["n"] == ATR_WINDOW:
+        state["atr"] = (state["tr_sum"] + tr) / ATR_WINDOW
+    else:
+        state["atr"] = (state["atr"] * (ATR_WINDOW - 1) + tr) / ATR_WINDOW
+    out["volatility_atr"] = state["atr"]
+
+    ema = state["ema"]
+    ema["fast"] = _ema(ema.get("fast"), close, 2 / (MACD_FAST + 1))
+    ema["slow"] = _ema(ema.get("slow"), close, 2 / (MACD_SLOW + 1))
+    macd = ema["fast"] - ema["slow"]
+    ema["sign"] = _ema(ema.get("sign"), macd, 2 / (MACD_SIGN + 1))
+    out["trend_macd"], out["trend_macd_signal"] = macd, ema["sign"]
+    out["trend_macd_diff"] = macd - ema["sign"]
+    out["trend_sma_fast"] = float(np.mean(close_buf[-MACD_FAST:]))
+    out["trend_sma_slow"] = float(np.mean(close_buf[-MACD_SLOW:]))
+    out["trend_ema_fast"], out["trend_ema_slow"] = ema["fast"], ema["slow"]
+
+    diff = close - prev_close if prev_close is not None else 0.0
+    state["rsi_up"] = _ema(state["rsi_up"], max(diff, 0.0), 1 / RSI_WINDOW)
+    state["rsi_dn"] = _ema(state["rsi_dn"], max(-diff, 0.0), 1 / RSI_WINDOW)
+    out["momentum_rsi"] = 100.0 if state["rsi_dn"] == 0 else 100 - 100 / (1 + state["rsi_up"] / state["rsi_dn"])
+
+    out["others_dr"] = (close / prev_close - 1) * 100 if prev_close else 0.0
+    out["others_dlr"] = math.log(close / prev_close) * 100 if prev_close else 0.0
+
+    state["last_date"] = date
+    state["last_adj_close"] = adj
+    return out
+
+
+class IndicatorEngine:
+    """
+    موتور جریانی اندیکاتورها: وضعیت هر نماد (EMAها، بافر پنجره‌ها، OBV، ATR و ...) پس از هر اجرا
+    ذخیره می‌شود و در اجرای بعد فقط کندل‌های جدید با هزینه‌ی ثابت اعمال می‌شوند.
+    برای هر نماد دو وضعیت نگهداری می‌شود: پیش از آخرین کندل (base) و پس از آن؛ آخرین کندل
+    همیشه دوباره اعمال می‌شود چون ممکن است کندل ناقص روز جاری بوده باشد.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, ticker: str) -> Path:
+        return self.root / f"{ticker}.pkl"
+
+    def _load(self, ticker: str) -> Optional[Dict]:
+        path = self._path(ticker)
+        return joblib.load(path) if path.exists() else None
+
+    def origin(self, ticker: str) -> Optional[pd.Timestamp]:
+        """تاریخ اولین کندلی که وضعیت این نماد از آن ساخته شده است"""
+        saved = self._load(ticker)
+        return saved["first_date"] if saved else None
+
+    def _update_ticker(self, ticker: str, rows: pd.DataFrame) -> Optional[Dict[str, float]]:
+        saved = self._load(ticker)
+        base = saved["base"] if saved else None
+        if base is not None and base["last_date"] is not None:
+            anchor = rows[rows["Date"] == base["last_date"]]
+            # سود نقدی/اسپلیت کل Adj Close را تغییر می‌دهد؛ وضعیت از نو ساخته می‌شود
+            if anchor.empty or not np.isclose(anchor["Adj Close"].iloc[0], base["last_adj_close"], rtol=1e-9):
+                print(f"History changed for {ticker}, rebuilding indicator state...")
+                base = None
+        if base is None or base["last_date"] is None:
+            state, first_date = _new_state(), rows["Date"].iloc[0]
+            new_rows = rows
+        else:
+            state, first_date = copy.deepcopy(base), saved["first_date"]
+            new_rows = rows[rows["Date"] > base["last_date"]]
+        if new_rows.empty:
+            return saved["latest"] if saved else None
+
+        values = new_rows[["Close", "Adj Close", "High", "Low", "Volume"]].to_numpy(dtype=np.float64)
+        dates = new_rows["Date"].to_list()
+        out = None
+        for i, (date, row) in enumerate(zip(dates, values)):
+            if i == len(values) - 1:
+                base = copy.deepcopy(state)
+            bar = {"Close": row[0], "Adj Close": row[1], "High": row[2], "Low": row[3],
+                   "Volume": 0.0 if np.isnan(row[4]) else row[4]}
+            out = _step(state, date, bar)
+
+        latest = {"Date": dates[-1], **out}
+        joblib.dump({"base": base, "first_date": first_date, "latest": latest}, self._path(ticker))
+        return latest
+
+    def update(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        اعمال کندل‌های جدید df (فرمت بلند) به وضعیت نمادها.
+        خروجی: یک ردیف برای هر نماد (Ticker, Date, ستون‌های INDICATOR_COLUMNS) برای آخرین کندل.
+        """
+        records = []
+        for ticker, rows in df.groupby("Ticker", observed=True, sort=False):
+            rows = rows.sort_values("Date")
+            latest = self._update_ticker(str(ticker), rows)
+            if latest is not None:
+                records.append({"Ticker": ticker, **latest})
+        return pd.DataFrame(records, columns=["Ticker", "Date"] + INDICATOR_COLUMNS)
+
+
+def full_recompute(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    محاسبه‌ی کامل همان اندیکاتورها روی کل تاریخچه‌ی هر نماد (ta و pandas)؛
+    مسیر مرجع برای حالت verify. خروجی هم‌شکل IndicatorEngine.update (آخرین کندل هر نماد).
+    """
+    records = []
+    for ticker, rows in df.groupby("Ticker", observed=True, sort=False):
+        rows = rows.sort_values("Date").reset_index(drop=True)
+        close, adj = rows["Close"].astype(np.float64), rows["Adj Close"].astype(np.float64)
+        high, low = rows["High"].astype(np.float64), rows["Low"].astype(np.float64)
+        volume = rows["Volume"].astype(np.float64).fillna(0)
+        out = pd.DataFrame(index=rows.index)
+
+        for lag in LAGS:
+            out[f"Adj_Close_Lag_{lag}"] = adj.shift(lag)
+        for w in SMA_WINDOWS:
+            out[f"SMA_{w}"] = adj.rolling(window=w, min_periods=1).mean()
+            out[f"EMA_{w}"] = adj.ewm(span=w, adjust=False, min_periods=1).mean()
+        out["Volatility_Rolling_Std"] = adj.rolling(window=VOLATILITY_WINDOW, min_periods=1).std()
+
+        out["volume_obv"] = OnBalanceVolumeIndicator(close=close, volume=volume, fillna=True).on_balance_volume()
+        bb = BollingerBands(close=close, window=BB_WINDOW, window_dev=BB_DEV, fillna=True)
+        out["volatility_bbm"], out["volatility_bbh"] = bb.bollinger_mavg(), bb.bollinger_hband()
+        out["volatility_bbl"], out["volatility_bbw"] = bb.bollinger_lband(), bb.bollinger_wband()
+        out["volatility_bbp"] = bb.bollinger_pband()
+        out["volatility_bbhi"], out["volatility_bbli"] = bb.bollinger_hband_indicator(), bb.bollinger_lband_indicator()
+        if len(rows) >= ATR_WINDOW:
+            out["volatility_atr"] = AverageTrueRange(close=close, high=high, low=low, window=ATR_WINDOW,
+                                                     fillna=True).average_true_range()
+        else:
+            out["volatility_atr"] = 0.0
+        macd = MACD(close=close, window_slow=MACD_SLOW, window_fast=MACD_FAST, window_sign=MACD_SIGN, fillna=True)
+        out["trend_macd"], out["trend_macd_signal"], out["trend_macd_diff"] = macd.macd(), macd.macd_signal(), macd.macd_diff()
+        out["trend_sma_fast"] = SMAIndicator(close=close, window=MACD_FAST, fillna=True).sma_indicator()
+        out["trend_sma_slow"] = SMAIndicator(close=close, window=MACD_SLOW, fillna=True).sma_indicator()
+        out["trend_ema_fast"] = EMAIndicator(close=close, window=MACD_FAST, fillna=True).ema_indicator()
+        out["trend_ema_slow"] = EMAIndicator(close=close, window=MACD_SLOW, fillna=True).ema_indicator()
+        out["momentum_rsi"] = RSIIndicator(close=close, window=RSI_WINDOW, fillna=True).rsi()
+        out["others_dr"] = DailyReturnIndicator(close=close, fillna=True).daily_return()
+        out["others_dlr"] = DailyLogReturnIndicator(close=close, fillna=True).daily_log_return()
+
+        last = out.iloc[-1]
+        records.append({"Ticker": ticker, "Date": rows["Date"].iloc[-1], **last[INDICATOR_COLUMNS].to_dict()})
+    return pd.DataFrame(records, columns=["Ticker", "Date"] + INDICATOR_COLUMNS)
+
+
+def verify_indicators(incremental: pd.DataFrame, history: pd.DataFrame,
+                      rtol: float = VERIFY_RTOL, atol: float = VERIFY_ATOL) -> pd.DataFrame:
+    """
+    مقایسه‌ی خروجی موتور جریانی با محاسبه‌ی کامل روی history (باید از اولین کندل وضعیت شروع شود).
+    خروجی: ردیف‌های ناسازگار (Ticker, Column, Incremental, Full)؛ دیتافریم خالی یعنی تطابق کامل.
+    """
+    full = full_recompute(history)
+    merged = incremental.merge(full, on=["Ticker", "Date"], suffixes=("_inc", "_full"))
+    mismatches = []
+    for col in INDICATOR_COLUMNS:
+        a, b = merged[f"{col}_inc"].to_numpy(np.float64), merged[f"{col}_full"].to_numpy(np.float64)
+        bad = ~np.isclose(a, b, rtol=rtol, atol=atol, equal_nan=True)
+        for i in np.flatnonzero(bad):
+            mismatches.append({"Ticker": merged["Ticker"].iloc[i], "Column": col,
+                               "Incremental": a[i], "Full": b[i]})
+    report = pd.DataFrame(mismatches, columns=["Ticker", "Column", "Incremental", "Full"])
+    if len(merged) < len(incremental):
+        print(f"⚠️ {len(incremental) - len(merged)} tickers could not be verified (dates differ)")
+    print(f"Indicator verification: {len(merged)} tickers, {len(report)} mismatches")
+    return report
@@ -0,0 +1,48 @@
+# backend/app/labels.py
+import numpy as np
+import pandas as pd
+from typing import Sequence
+
+# مرزهای چارکی درجه‌های ارتباط 0..3 (مانند rel_discrete نوت‌بوک)
+RELEVANCE_QUANTILES = (0.25, 0.5, 0.75)
+
+
+def relevance_global(returns, quantiles: Sequence[float] = RELEVANCE_QUANTILES, fit_rows=None) -> np.ndarray:
+    """
+    درجه‌ی ارتباط با چارک‌های کل داده در یک گذر np.digitize.
+    x <= q25 -> 0، ...، x > q75 -> 3 (NaN مانند rel_discrete درجه‌ی آخر می‌گیرد)
+    fit_rows: ردیف‌هایی (slice یا اندیس) که چارک‌ها فقط از آن‌ها محاسبه می‌شوند، مثلاً بازه‌ی آموزش یک fold
+    تا مرزها از بازده‌های آینده ساخته نشوند؛ برچسب همه‌ی ردیف‌ها با همین مرزها تعیین می‌شود.
+    """
+    values = np.asarray(returns, dtype=np.float64)
+    edges = np.nanquantile(values if fit_rows is None else values[fit_rows], quantiles)
+    return np.digitize(values, edges, right=True).astype(np.int8)
+
+
+def relevance_by_date(returns, dates, n_grades: int = len(RELEVANCE_QUANTILES) + 1) -> np.ndarray:
+    """
+    درجه‌ی ارتباط با سطل‌های چندکی هر تاریخ (هر query گروه LambdaRank/YetiRank) از روی رتبه‌ی گروهی:
+    رتبه‌ی بازده داخل هر روز با یک lexsort و درجه = floor(رتبه × n_grades / اندازه‌ی روز).
+    NaN ها در انتهای رتبه‌بندی قرار می‌گیرند (مانند rel_discrete درجه‌ی آخر).
+    """
+    values = np.asarray(returns, dtype=np.float64)
+    codes, _ = pd.factorize(np.asarray(dates))
+    sort_values = np.where(np.isnan(values), np.inf, values)
+    order = np.lexsort((sort_values, codes))
+    sizes = np.bincount(codes)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    rank = np.empty(len(values), dtype=np.int64)
+    rank[order] = np.arange(len(values)) - starts[codes[order]]
+    return np.minimum(rank * n_grades // sizes[codes], n_grades - 1).astype(np.int8)
+
+
+def relevance_labels(df: pd.DataFrame, mode: str = "global", target: str = "Return_7d", fit_rows=None) -> np.ndarray:
+    """
+    global: چارک‌های کل داده (یا فقط ردیف‌های fit_rows) | date: چندک‌های هر تاریخ
+    (رژیم‌های بازار روزهای مختلف مخلوط نمی‌شوند و به ردیف‌های تاریخ‌های دیگر وابسته نیست، پس fit_rows لازم ندارد)
+    """
+    if mode == "global":
+        return relevance_global(df[target], fit_rows=fit_rows)
+    if mode == "date":
+        return relevance_by_date(df[target], df["Date"])
+    raise ValueError(f"Unknown relevance label mode: {mode}")
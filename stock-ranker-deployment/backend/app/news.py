@@ -0,0 +1,174 @@
+# backend/app/news.py
+import asyncio
+import hashlib
+import sqlite3
+import aiohttp
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+NEWSAPI_URL = "https://newsapi.org/v2/everything"
+
+# محدود به ۲۰ خبر برای هر تیکر (برای جلوگیری از محدودیت API)
+ARTICLES_PER_TICKER = 20
+
+
+def article_key(article: Dict[str, Any]) -> str:
+    """کلید یکتای خبر: هش URL، یا در نبود URL هش محتوا"""
+    raw = article.get("url") or "|".join(
+        (article.get(k) or "") for k in ("title", "description", "publishedAt")
+    )
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def article_text(article: Dict[str, Any]) -> str:
+    return (article.get("title", "") or "") + " " + (article.get("description", "") or "")
+
+
+class ArticleStore:
+    """
+    کش پایدار (SQLite) اخبار امتیازدهی‌شده و تجمیع روزانه‌ی sentiment.
+    هر خبر فقط یک بار امتیازدهی می‌شود و میانگین روزانه به صورت افزایشی (sum/count) به‌روز می‌شود.
+    """
+
+    def __init__(self, path: Path):
+        self.conn = sqlite3.connect(str(path))
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS articles (key TEXT PRIMARY KEY, sentiment REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS ticker_articles (
+                ticker TEXT NOT NULL, key TEXT NOT NULL, date TEXT NOT NULL,
+                PRIMARY KEY (ticker, key));
+            CREATE TABLE IF NOT EXISTS daily_sentiment (
+                date TEXT NOT NULL, ticker TEXT NOT NULL, total REAL NOT NULL, n INTEGER NOT NULL,
+                PRIMARY KEY (date, ticker));
+        """)
+
+    def last_date(self, ticker: str) -> Optional[str]:
+        """تاریخ جدیدترین خبر ذخیره‌شده برای یک نماد"""
+        row = self.conn.execute("SELECT MAX(date) FROM ticker_articles WHERE ticker = ?", (ticker,)).fetchone()
+        return row[0]
+
+    def add(self, ticker: str, articles: List[Dict[str, Any]], score_fn: Callable[[str], float]) -> int:
+        """افزودن اخبار جدید یک نماد؛ اخبار تکراری نادیده گرفته می‌شوند. خروجی: تعداد اخبار جدید"""
+        added = 0
+        with self.conn:
+            for article in articles:
+                # خبر بدون تاریخ انتشار قابل تجمیع روزانه نیست؛ فقط همین خبر کنار گذاشته می‌شود
+                published = article.get("publishedAt") if isinstance(article, dict) else None
+                if not isinstance(published, str) or not published:
+                    continue
+                key = article_key(article)
+                date = published.split("T")[0]
+                cur = self.conn.execute("INSERT OR IGNORE INTO ticker_articles VALUES (?, ?, ?)", (ticker, key, date))
+                if cur.rowcount == 0:
+                    continue
+
+                # ممکن است همین خبر قبلاً برای نماد دیگری امتیازدهی شده باشد
+                row = self.conn.execute("SELECT sentiment FROM articles WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    sentiment = score_fn(article_text(article))
+                    self.conn.execute("INSERT INTO articles VALUES (?, ?)", (key, sentiment))
+                else:
+                    sentiment = row[0]
+
+                self.conn.execute("""
+                    INSERT INTO daily_sentiment VALUES (?, ?, ?, 1)
+                    ON CONFLICT (date, ticker) DO UPDATE SET total = total + excluded.total, n = n + 1
+                """, (date, ticker, sentiment))
+                added += 1
+        return added
+
+    def daily_sentiment(self, start: Optional[str] = None) -> pd.DataFrame:
+        """میانگین روزانه‌ی sentiment برای هر (Date, Ticker)"""
+        df = pd.read_sql_query(
+            "SELECT date AS Date, ticker AS Ticker, total / n AS Sentiment FROM daily_sentiment WHERE date >= ?",
+            self.conn, params=(start or "",),
+        )
+        df["Date"] = pd.to_datetime(df["Date"])
+        return df
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+async def _fetch_ticker(session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, url: str,
+                        params: Dict[str, Any], retries: int, backoff: float) -> List[Dict[str, Any]]:
+    """درخواست اخبار یک نماد با تلاش مجدد برای 429 و خطاهای سرور"""
+    async with semaphore:
+        for attempt in range(retries):
+            try:
+                async with session.get(url, params=params) as response:
+                    if response.status == 429 or response.status >= 500:
+                        raise aiohttp.ClientResponseError(response.request_info, (), status=response.status)
+                    data_json = await response.json(content_type=None)
+                    articles = data_json.get("articles") if isinstance(data_json, dict) else None
+                    return articles if isinstance(articles, list) else []
+            except ValueError as e:
+                # پاسخ JSON نامعتبر: تلاش مجدد کمکی نمی‌کند و فقط همین نماد از دست می‌رود
+                print(f"⚠️ Invalid response for {params['q']}: {e}")
+                return []
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == retries - 1:
+                    print(f"⚠️ Error for {params['q']}: {e}")
+                    return []
+                await asyncio.sleep(backoff * (2 ** attempt))
+    return []
+
+
+async def fetch_articles(tickers: List[str], api_key: str, start_str: str, end_str: str,
+                         since: Optional[Dict[str, str]] = None, url: str = NEWSAPI_URL,
+                         max_concurrency: int = 8, retries: int = 3, backoff: float = 1.0) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    دریافت همزمان اخبار همه‌ی نمادها با یک Session مشترک (connection pool) و همزمانی محدود.
+    since: تاریخ آخرین خبر ذخیره‌شده‌ی هر نماد؛ بازه‌ی آن نماد از همین تاریخ شروع می‌شود.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    connector = aiohttp.TCPConnector(limit=max_concurrency)
+    timeout = aiohttp.ClientTimeout(total=30)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        tasks = []
+        for ticker in tickers:
+            last = (since or {}).get(ticker)
+            params = {
+                "q": f"{ticker} stock",
+                "from": max(start_str, last) if last else start_str,
+                "to": end_str,
+                "sortBy": "relevancy",
+                "language": "en",
+                "pageSize": ARTICLES_PER_TICKER,
+                "apiKey": api_key,
+            }
+            tasks.append(_fetch_ticker(session, semaphore, url, params, retries, backoff))
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    # خطای پیش‌بینی‌نشده‌ی یک نماد بقیه‌ی نمادها را از بین نمی‌برد
+    out = {}
+    for ticker, articles in zip(tickers, results):
+        if isinstance(articles, BaseException):
+            print(f"⚠️ Error for {ticker}: {articles}")
+            articles = []
+        out[ticker] = articles[:ARTICLES_PER_TICKER]
+    return out
+
+
+def _run(coro):
+    """اجرای coroutine حتی داخل event loop فعال (مثلاً نوت‌بوک Jupyter/Colab)"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
+def ingest_news(tickers: List[str], api_key: str, start_str: str, end_str: str,
+                store: ArticleStore, score_fn: Callable[[str], float], **kwargs) -> pd.DataFrame:
+    """دریافت اخبار جدید، امتیازدهی فقط اخبار دیده‌نشده و بازگرداندن sentiment روزانه‌ی بازه"""
+    # تاریخ‌ها پیش از اجرای async خوانده می‌شوند (اتصال SQLite به thread سازنده وابسته است)
+    since = {ticker: store.last_date(ticker) for ticker in tickers}
+    articles = _run(fetch_articles(tickers, api_key, start_str, end_str, since=since, **kwargs))
+    added = sum(store.add(ticker, items, score_fn) for ticker, items in articles.items())
+    print(f"Scored {added} new articles.")
+    return store.daily_sentiment(start_str)
@@ -0,0 +1,155 @@
+# backend/app/normalization.py
+import re
+import joblib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+# ویژگی‌هایی که تابعی خطی از یک ستون پایه‌اند؛ نرمال‌سازی ستون پایه دقیقاً روی آن‌ها هم قابل اعمال است.
+# الگو -> (ستون پایه، آیا میانگین کم شود)؛ انحراف معیار فقط بر مقیاس تقسیم می‌شود
+DERIVED_COLUMNS = {
+    r"Adj_Close_Lag_\d+": ("Adj Close", True),
+    r"SMA_\d+": ("Adj Close", True),
+    r"EMA_\d+": ("Adj Close", True),
+    r"Volatility_Rolling_Std": ("Adj Close", False),
+}
+
+
+def group_moments(values: np.ndarray, codes: np.ndarray, n_groups: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    میانگین و انحراف معیار (ddof=0) هر گروه برای همه‌ی ستون‌ها در یک گذر:
+    Σx و Σx² روی ردیف‌های مرتب‌شده با np.add.reduceat (پس از کم کردن اولین مقدار هر گروه برای پایداری عددی).
+    خروجی: (mean, std, count) با شکل (n_groups, n_cols)
+    """
+    order = np.argsort(codes, kind="stable")
+    sizes = np.bincount(codes, minlength=n_groups)
+    present = sizes > 0
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])[present]
+    x = values[order]
+    shift = x[starts]
+    xc = x - np.repeat(shift, sizes[present], axis=0)
+    sums = np.add.reduceat(np.hstack([xc, xc * xc]), starts, axis=0)
+    n_cols = values.shape[1]
+    count = sizes[present][:, None].astype(np.float64)
+    mean_c = sums[:, :n_cols] / count
+    var = np.maximum(sums[:, n_cols:] / count - mean_c * mean_c, 0.0)
+
+    mean = np.full((n_groups, n_cols), np.nan)
+    std = np.full((n_groups, n_cols), np.nan)
+    mean[present] = mean_c + shift
+    std[present] = np.sqrt(var)
+    return mean, std, sizes
+
+
+def _safe_scale(std: np.ndarray) -> np.ndarray:
+    # مانند StandardScaler: مقیاس صفر (ستون ثابت) -> ۱
+    return np.where(std > np.finfo(np.float64).eps * 10, std, 1.0)
+
+
+def fit_ticker_stats(df: pd.DataFrame, columns: Sequence[str], fill_value: float = 0.0) -> Dict:
+    """
+    آمار z-score هر نماد (معادل StandardScaler جداگانه برای هر نماد روی داده‌ی fillna(fill_value)).
+    خروجی یک dict از آرایه‌هاست که با joblib ذخیره و در سرویس اعمال می‌شود؛ آمار کل داده برای نمادهای جدید.
+    """
+    columns = list(columns)
+    codes, tickers = pd.factorize(df["Ticker"].to_numpy())
+    values = df[columns].to_numpy(np.float64)
+    values = np.where(np.isnan(values), fill_value, values)
+    mean, std, _ = group_moments(values, codes, len(tickers))
+    return {
+        "mode": "ticker",
+        "columns": columns,
+        "tickers": np.asarray(tickers).astype(str),
+        "mean": mean,
+        "scale": _safe_scale(std),
+        "global_mean": values.mean(axis=0),
+        "global_scale": _safe_scale(values.std(axis=0)),
+        "fill_value": fill_value,
+    }
+
+
+def _derived_base(column: str) -> Optional[Tuple[str, bool]]:
+    for pattern, base in DERIVED_COLUMNS.items():
+        if re.fullmatch(pattern, column):
+            return base
+    return None
+
+
+def apply_ticker_stats(stats: Dict, df: pd.DataFrame, derived: bool = False) -> pd.DataFrame:
+    """
+    اعمال آمار fit‌شده در O(ردیف‌ها): یک جست‌وجوی ایندکس نماد و یک عمل برداری برای همه‌ی ستون‌ها.
+    derived=True: ستون‌های مشتق خطی از Adj Close (lag، SMA، EMA، نوسان) با آمار ستون پایه نرمال می‌شوند،
+    برای سرویسی که این ویژگی‌ها را روی قیمت خام ساخته است.
+    """
+    df = df.copy()
+    rows = pd.Index(stats["tickers"]).get_indexer(df["Ticker"].astype(str))
+    known = rows >= 0
+    position = {col: i for i, col in enumerate(stats["columns"])}
+
+    targets = [(col, position[col], True) for col in stats["columns"] if col in df]
+    if derived:
+        for col in df.columns:
+            base = _derived_base(col)
+            if col not in position and base is not None and base[0] in position:
+                targets.append((col, position[base[0]], base[1]))
+    if not targets:
+        return df
+
+    cols = np.array([i for _, i, _ in targets])
+    center = np.array([c for _, _, c in targets])
+    mean = np.where(known[:, None], stats["mean"][np.maximum(rows, 0)][:, cols], stats["global_mean"][cols])
+    scale = np.where(known[:, None], stats["scale"][np.maximum(rows, 0)][:, cols], stats["global_scale"][cols])
+    names = [col for col, _, _ in targets]
+    values = df[names].to_numpy(np.float64)
+    values = np.where(np.isnan(values), stats["fill_value"], values)
+    normalized = (values - np.where(center, mean, 0.0)) / scale
+    for j, col in enumerate(names):
+        df[col] = normalized[:, j]
+    return df
+
+
+def zscore_by_date(df: pd.DataFrame, columns: Sequence[str], fill_value: float = 0.0) -> pd.DataFrame:
+    """
+    z-score مقطعی هر تاریخ (همه‌ی نمادهای یک روز)؛ فقط ترتیب نسبی نمادها در هر روز باقی می‌ماند
+    که برای رتبه‌بندهای LambdaRank/YetiRank کافی است. بدون حالت: در سرویس روی همان روز محاسبه می‌شود.
+    """
+    df = df.copy()
+    columns = list(columns)
+    codes, dates = pd.factorize(df["Date"].to_numpy())
+    values = df[columns].to_numpy(np.float64)
+    values = np.where(np.isnan(values), fill_value, values)
+    mean, std, _ = group_moments(values, codes, len(dates))
+    normalized = (values - mean[codes]) / _safe_scale(std)[codes]
+    for j, col in enumerate(columns):
+        df[col] = normalized[:, j]
+    return df
+
+
+def save_normalizer(stats: Dict, path: Union[str, Path]) -> None:
+    joblib.dump(stats, path)
+
+
+def load_normalizer(path: Union[str, Path]) -> Dict:
+    return joblib.load(path)
+
+
+def normalize(stats: Dict, df: pd.DataFrame, derived: bool = False) -> pd.DataFrame:
+    """اعمال نرمال‌سازی ذخیره‌شده بر اساس حالت آن (ticker: آمار fit‌شده، date: z-score مقطعی همان روز)"""
+    if stats["mode"] == "date":
+        return zscore_by_date(df, [col for col in stats["columns"] if col in df], stats["fill_value"])
+    return apply_ticker_stats(stats, df, derived=derived)
+
+
+def check_servable(stats: Dict) -> None:
+    """
+    حالت date در سرویس پشتیبانی نمی‌شود: در آموزش lag/SMA/EMA/نوسان روی Adj Close نرمال‌شده‌ی هر روز
+    ساخته می‌شوند و نگاشت خطی ثابتی از مقادیر خام به آن‌ها وجود ندارد (برخلاف حالت ticker).
+    """
+    if stats["mode"] == "date":
+        raise ValueError("Per-date normalized models cannot be served; retrain with per-ticker normalization.")
+
+
+def date_stats(columns: Sequence[str], fill_value: float = 0.0) -> Dict:
+    """توصیف حالت per-date برای ذخیره در کنار مدل (آماری برای fit ندارد)"""
+    return {"mode": "date", "columns": list(columns), "fill_value": fill_value}
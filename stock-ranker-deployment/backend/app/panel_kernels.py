@@ -0,0 +1,198 @@
+# backend/app/panel_kernels.py
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Sequence
+
+
+class TickerPanel:
+    """
+    نگاشت ستون‌های دیتافریم بلند به ماتریس متراکم (زمان × نماد) و برعکس، بدون ساخت MultiIndex.
+    ردیف k ماتریس، k-امین کندل هر نماد است (به ترتیب ظهور در df، یعنی زمانی)؛ پنجره‌ها مانند
+    groupby('Ticker').rolling تعداد کندل‌های همان نماد را می‌شمارند و نمادهای کوتاه‌تر در انتها NaN دارند.
+    """
+
+    def __init__(self, tickers: Sequence):
+        codes, self.tickers = pd.factorize(np.asarray(tickers))
+        order = np.argsort(codes, kind="stable")
+        sizes = np.bincount(codes, minlength=len(self.tickers))
+        starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        rows = np.empty(len(codes), dtype=np.int64)
+        rows[order] = np.arange(len(codes)) - starts[codes[order]]
+        self.rows, self.cols = rows, codes
+        self.shape = (int(sizes.max()) if len(sizes) else 0, len(self.tickers))
+
+    def pivot(self, values) -> np.ndarray:
+        """ستون بلند -> ماتریس (زمان × نماد) از نوع float64"""
+        panel = np.full(self.shape, np.nan)
+        panel[self.rows, self.cols] = np.asarray(values, dtype=np.float64)
+        return panel
+
+    def unpivot(self, panel: np.ndarray) -> np.ndarray:
+        """ماتریس -> مقدار هر ردیف df به همان ترتیب اصلی (بدون هم‌ترازی ایندکس)"""
+        return panel[self.rows, self.cols]
+
+
+def _window_sum(cum: np.ndarray, window: int) -> np.ndarray:
+    """جمع پنجره‌ای از روی جمع تجمعی در امتداد محور زمان"""
+    out = cum.copy()
+    out[window:] -= cum[:-window]
+    return out
+
+
+def rolling_mean(panel: np.ndarray, window: int, min_periods: int = 1) -> np.ndarray:
+    """میانگین متحرک با جمع تجمعی (معادل rolling(window, min_periods).mean())"""
+    valid = ~np.isnan(panel)
+    # کم کردن اولین مقدار هر نماد، خطای گرد کردن جمع تجمعی در تاریخچه‌های بلند را کم می‌کند
+    shift = np.nan_to_num(panel[0])
+    centered = np.where(valid, panel - shift, 0.0)
+    count = _window_sum(np.cumsum(valid, axis=0), window)
+    total = _window_sum(np.cumsum(centered, axis=0), window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count + shift
+    return np.where(count >= max(min_periods, 1), mean, np.nan)
+
+
+def rolling_std(panel: np.ndarray, window: int, min_periods: int = 1, ddof: int = 1) -> np.ndarray:
+    """انحراف معیار متحرک با جمع تجمعی x و x² (معادل rolling(window, min_periods).std(ddof))"""
+    valid = ~np.isnan(panel)
+    shift = np.nan_to_num(panel[0])
+    centered = np.where(valid, panel - shift, 0.0)
+    count = _window_sum(np.cumsum(valid, axis=0), window)
+    s1 = _window_sum(np.cumsum(centered, axis=0), window)
+    s2 = _window_sum(np.cumsum(centered * centered, axis=0), window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var = (s2 - s1 * s1 / count) / (count - ddof)
+    var = np.maximum(var, 0.0)
+    return np.where((count >= max(min_periods, 1)) & (count > ddof), np.sqrt(var), np.nan)
+
+
+def ewm_mean(panel: np.ndarray, span: int) -> np.ndarray:
+    """EMA بازگشتی با adjust=False در امتداد زمان، برداری روی همه‌ی نمادها (NaN مقدار قبلی را نگه می‌دارد)"""
+    alpha = 2.0 / (span + 1)
+    out = np.empty_like(panel)
+    prev = panel[0].copy()
+    out[0] = prev
+    for t in range(1, len(panel)):
+        x = panel[t]
+        prev = np.where(np.isnan(prev), x, np.where(np.isnan(x), prev, (1 - alpha) * prev + alpha * x))
+        out[t] = prev
+    return out
+
+
+def lag(panel: np.ndarray, periods: int) -> np.ndarray:
+    """شیفت زمانی هر نماد (معادل groupby('Ticker').shift(periods))"""
+    out = np.full_like(panel, np.nan)
+    if periods < len(panel):
+        out[periods:] = panel[:len(panel) - periods]
+    return out
+
+
+def bar_returns(panel: np.ndarray) -> np.ndarray:
+    """بازده ساده‌ی هر کندل نسبت به کندل قبلی همان نماد"""
+    prev = lag(panel, 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = panel / prev - 1
+    return np.where(np.isfinite(out), out, np.nan)
+
+
+def date_mean(dates: Sequence, values) -> np.ndarray:
+    """میانگین مقطعی هر تاریخ (بدون NaN) برای هر ردیف؛ معادل groupby('Date').transform('mean') با bincount"""
+    codes, _ = pd.factorize(np.asarray(dates))
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    total = np.bincount(codes, weights=np.where(valid, values, 0.0))
+    count = np.bincount(codes, weights=valid.astype(np.float64))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (total / count)[codes]
+
+
+def rolling_market_moments(x: np.ndarray, market: np.ndarray, window: int,
+                           min_periods: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """
+    گشتاورهای متحرک هر نماد نسبت به سری بازار با جمع‌های پنجره‌ای Σx، Σm، Σx²، Σm²، Σxm در یک گذر.
+    market هم‌شکل x است (بازده بازار در تاریخ هر کندل). فقط کندل‌هایی که هر دو مقدار را دارند شمرده می‌شوند.
+    خروجی: cov، var (نماد)، market_var، beta و corr (ddof=1؛ واریانس صفر -> NaN)
+    """
+    min_periods = window if min_periods is None else min_periods
+    valid = ~(np.isnan(x) | np.isnan(market))
+    # مرکز کردن با اولین مقدار هر نماد برای پایداری عددی جمع‌های تجمعی
+    x0 = np.nan_to_num(x[0]) if len(x) else 0.0
+    m0 = np.nan_to_num(market[0]) if len(market) else 0.0
+    xc = np.where(valid, x - x0, 0.0)
+    mc = np.where(valid, market - m0, 0.0)
+
+    def wsum(a):
+        return _window_sum(np.cumsum(a, axis=0), window)
+
+    n = wsum(valid.astype(np.float64))
+    sx, sm = wsum(xc), wsum(mc)
+    sxx, smm, sxm = wsum(xc * xc), wsum(mc * mc), wsum(xc * mc)
+    enough = (n >= max(min_periods, 2))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = (sxm - sx * sm / n) / (n - 1)
+        var = np.maximum((sxx - sx * sx / n) / (n - 1), 0.0)
+        market_var = np.maximum((smm - sm * sm / n) / (n - 1), 0.0)
+        beta = np.where(market_var > 0, cov / market_var, np.nan)
+        corr = np.where((var > 0) & (market_var > 0), cov / np.sqrt(var * market_var), np.nan)
+    moments = {"cov": cov, "var": var, "market_var": market_var, "beta": beta, "corr": np.clip(corr, -1.0, 1.0)}
+    return {name: np.where(enough, values, np.nan) for name, values in moments.items()}
+
+
+def _last_valid_index(valid: np.ndarray) -> np.ndarray:
+    """اندیس آخرین مقدار معتبر تا هر ردیف (۱- اگر هنوز مقداری نبوده)"""
+    idx = np.where(valid, np.arange(len(valid))[:, None], -1)
+    return np.maximum.accumulate(idx, axis=0)
+
+
+def fill_forward(panel: np.ndarray) -> np.ndarray:
+    """ffill در امتداد زمان برای هر نماد (معادل groupby('Ticker').ffill())"""
+    prev = _last_valid_index(~np.isnan(panel))
+    out = panel[np.maximum(prev, 0), np.arange(panel.shape[1])]
+    return np.where(prev >= 0, out, np.nan)
+
+
+def interpolate_linear(panel: np.ndarray) -> np.ndarray:
+    """
+    درون‌یابی خطی بین مقادیر معتبر هر نماد و پر کردن ابتدا/انتها با نزدیک‌ترین مقدار معتبر
+    (معادل interpolate(method='linear', limit_direction='both') روی هر نماد)
+    """
+    n = len(panel)
+    valid = ~np.isnan(panel)
+    cols = np.arange(panel.shape[1])
+    prev = _last_valid_index(valid)
+    # اندیس اولین مقدار معتبر از این ردیف به بعد (n اگر وجود نداشته باشد)
+    next_ = n - 1 - _last_valid_index(valid[::-1])[::-1]
+    prev_c = np.where(prev >= 0, prev, next_)
+    next_c = np.where(next_ < n, next_, prev)
+    has_any = (prev_c >= 0) & (prev_c < n)
+    prev_c, next_c = np.clip(prev_c, 0, n - 1), np.clip(next_c, 0, n - 1)
+    lo, hi = panel[prev_c, cols], panel[next_c, cols]
+    span = next_c - prev_c
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weight = np.where(span > 0, (np.arange(n)[:, None] - prev_c) / span, 0.0)
+    out = lo + (hi - lo) * weight
+    return np.where(valid, panel, np.where(has_any, out, np.nan))
+
+
+def fill_by_ticker(df: pd.DataFrame, columns: Sequence[str], method: str = "ffill",
+                   fill_value: Optional[float] = 0.0, ticker_col: str = "Ticker") -> pd.DataFrame:
+    """
+    پر کردن NaN ستون‌ها در داخل هر نماد (ffill یا interpolate) و سپس با fill_value.
+    ردیف‌های هر نماد باید به ترتیب زمانی باشند؛ ستون‌های بدون NaN دست نمی‌خورند و ترتیب ردیف‌ها حفظ می‌شود.
+    """
+    kernels = {"ffill": fill_forward, "interpolate": interpolate_linear}
+    if method not in kernels:
+        raise ValueError(f"Unknown fill method: {method}")
+    df = df.copy()
+    panel = None
+    for col in columns:
+        values = df[col].to_numpy()
+        if not np.issubdtype(values.dtype, np.floating) or not np.isnan(values).any():
+            continue
+        if panel is None:
+            panel = TickerPanel(df[ticker_col])
+        filled = panel.unpivot(kernels[method](panel.pivot(values)))
+        if fill_value is not None:
+            filled = np.where(np.isnan(filled), fill_value, filled)
+        df[col] = filled.astype(values.dtype, copy=False)
+    return df
@@ -0,0 +1,113 @@
+# backend/app/pipeline.py
+import os
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.decomposition import PCA
+from typing import Dict, List, Optional, Tuple
+from .utils import (
+    INDICATOR_MODE,
+    INDICATOR_STATE_DIR,
+    PRICE_STORE_DIR,
+    fetch_prices,
+    fetch_company_info,
+    merge_company_info,
+    resolve_feature_plan,
+    add_ticker_features,
+    add_cross_sectional_features,
+)
+from .dataset_io import compact_frame, memory_report
+from .feature_transform import has_pca
+from .indicators import IndicatorEngine, verify_indicators
+from .normalization import check_servable
+from .price_store import PriceStore
+
+# تعداد نماد در هر shard؛ هر shard در یک پردازه‌ی جدا دانلود و مهندسی ویژگی می‌شود
+SHARD_SIZE = 250
+
+
+def shard_tickers(tickers: List[str], shard_size: int = SHARD_SIZE) -> List[List[str]]:
+    """تقسیم یونیورس به shardهای پیوسته (ترتیب نمادها حفظ می‌شود)"""
+    return [tickers[i:i + shard_size] for i in range(0, len(tickers), shard_size)]
+
+
+def latest_indicators(tickers: List[str], prices: pd.DataFrame, mode: str = INDICATOR_MODE) -> Optional[pd.DataFrame]:
+    """
+    اعمال کندل‌های جدید به موتور جریانی اندیکاتورها (پیش از float32 شدن قیمت‌ها).
+    در حالت verify خروجی با محاسبه‌ی کامل از اولین کندل وضعیت هر نماد مقایسه می‌شود.
+    """
+    if mode == "full":
+        return None
+    engine = IndicatorEngine(INDICATOR_STATE_DIR)
+    latest = engine.update(prices)
+    if mode == "verify":
+        store = PriceStore(PRICE_STORE_DIR)
+        frames = [store.read(t, start=engine.origin(t)).assign(Ticker=t)
+                  for t in tickers if engine.origin(t) is not None]
+        if not frames:
+            print("No indicator state to verify in this shard.")
+            return latest
+        report = verify_indicators(latest, pd.concat(frames, ignore_index=True))
+        if not report.empty:
+            print(report.to_string(index=False))
+    return latest
+
+
+def process_shard(tickers: List[str], company_df: pd.DataFrame,
+                  ta_columns: Optional[List[str]] = None, pca_inputs: Optional[List[str]] = None,
+                  ta_workers: Optional[int] = None, pca_fitted: bool = False) -> pd.DataFrame:
+    """
+    مراحل مستقل یک shard: به‌روزرسانی قیمت‌ها و ویژگی‌های وابسته به هر نماد.
+    فایل‌های کش قیمت و وضعیت اندیکاتورها برای هر نماد جداست، پس shardها بدون تداخل به‌طور موازی می‌نویسند.
+    pca_fitted: PCA فقط با وزن‌های آموزش transform می‌شود (به add_ticker_features منتقل می‌شود).
+    """
+    df = fetch_prices(tickers)
+    latest = latest_indicators(tickers, df)
+    df = merge_company_info(df, company_df[company_df["Ticker"].isin(tickers)])
+    # بدون کش گراف: پنجره‌ی قیمت هر روز جابه‌جا می‌شود و کلیدها هرگز تکرار نمی‌شوند
+    df = add_ticker_features(compact_frame(df), latest_indicators=latest,
+                             ta_columns=ta_columns, pca_inputs=pca_inputs, ta_workers=ta_workers,
+                             pca_fitted=pca_fitted)
+    # float32 پیش از بازگرداندن؛ حجم انتقال بین پردازه‌ها نصف می‌شود
+    return compact_frame(df)
+
+
+def run_sharded_pipeline(tickers: List[str], feature_cols: Optional[List[str]] = None,
+                         shard_size: int = SHARD_SIZE, max_workers: Optional[int] = None,
+                         transform: Optional[Dict] = None,
+                         normalizer: Optional[Dict] = None) -> Tuple[pd.DataFrame, Optional[PCA]]:
+    """
+    اجرای خط لوله‌ی روزانه به صورت shard شده روی یک process pool.
+    shardها فقط برای مراحل cross-sectional (نرمال‌سازی، Market_Return، Beta، PCA) ادغام می‌شوند.
+    با feature_cols فقط اندیکاتورهای مورد نیاز مدل محاسبه می‌شوند و با transform، PCA فقط transform می‌شود.
+    normalizer: آمار نرمال‌سازی آموزش که پیش از ویژگی‌های مقطعی و PCA اعمال می‌شود.
+    خروجی: (آخرین ردیف هر نماد، PCA)
+    """
+    if normalizer is not None:
+        # پیش از دانلود قیمت‌ها
+        check_servable(normalizer)
+    shards = shard_tickers(tickers, shard_size)
+    ta_columns, pca_inputs = resolve_feature_plan(feature_cols, transform)
+    pca_fitted = has_pca(transform)
+    max_workers = max_workers or min(len(shards), os.cpu_count() or 1)
+
+    # اطلاعات پایه یک بار در پردازه‌ی اصلی واکشی می‌شود (کش JSON مشترک بین shardها)
+    print("Fetching fundamental info (EPS, Market Cap)...")
+    company_df = fetch_company_info(tickers)
+
+    print(f"Processing {len(tickers)} tickers in {len(shards)} shards ({max_workers} workers)...")
+    if len(shards) == 1 or max_workers == 1:
+        # بدون pool برای shardها، اندیکاتورهای هر نماد روی همه‌ی هسته‌ها موازی می‌شوند
+        frames = [process_shard(shard, company_df, ta_columns, pca_inputs, pca_fitted=pca_fitted) for shard in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            n = len(shards)
+            # موازی‌سازی در سطح shard است؛ داخل هر shard اندیکاتورها ترتیبی اجرا می‌شوند
+            frames = list(executor.map(process_shard, shards, [company_df] * n, [ta_columns] * n,
+                                       [pca_inputs] * n, [1] * n, [pca_fitted] * n))
+
+    # union دسته‌بندی‌های Ticker در concat حفظ نمی‌شود، پس دوباره فشرده می‌شود
+    df = compact_frame(pd.concat(frames, ignore_index=True))
+    del frames
+    memory_report(df, "merged shards")
+
+    return add_cross_sectional_features(df, pca_inputs, transform, normalizer)
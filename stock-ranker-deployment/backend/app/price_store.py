@@ -0,0 +1,170 @@
+# backend/app/price_store.py
+import json
+import os
+import pandas as pd
+import yfinance as yf
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from .download import DownloadScheduler
+
+# ستون‌های OHLCV که برای هر نماد روی دیسک نگهداری می‌شوند
+PRICE_COLUMNS = ["Open", "High", "Low", "Close", "Adj Close", "Volume", "Dividends", "Stock Splits"]
+
+# پارامترهای مشترک همه‌ی درخواست‌های yf.download
+DOWNLOAD_KWARGS = {"group_by": "ticker", "auto_adjust": False, "actions": True}
+
+# طول تاریخچه‌ای که برای نمادی که هنوز در کش نیست دانلود می‌شود
+DEFAULT_LOOKBACK_DAYS = 365
+
+
+def to_long_format(data: pd.DataFrame) -> pd.DataFrame:
+    """تبدیل خروجی پهن yf.download (group_by="ticker") به فرمت بلند (Date, Ticker, ...)"""
+    if data is None or data.empty:
+        return pd.DataFrame(columns=["Date", "Ticker"] + PRICE_COLUMNS)
+
+    df = data.stack(level=0, future_stack=True).reset_index().rename(columns={"level_1": "Ticker"})
+    df["Date"] = pd.to_datetime(df["Date"])
+    df = df.dropna(subset=["Open", "High", "Low", "Close"])
+    df = df.drop_duplicates(subset=["Date", "Ticker"])
+    return df.sort_values(by=["Ticker", "Date"]).reset_index(drop=True)
+
+
+class PriceStore:
+    """
+    کش محلی و ستونی (Parquet) قیمت‌ها: برای هر نماد یک فایل.
+    در هر اجرا فقط بازه‌ی از دست رفته (از آخرین کندل ذخیره‌شده تا امروز) دانلود می‌شود.
+    """
+
+    def __init__(self, root: Path, download_fn: Callable[..., pd.DataFrame] = yf.download,
+                 scheduler: Optional[DownloadScheduler] = None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        # همه‌ی دانلودها از زمان‌بند تطبیقی (محدودیت نرخ + تلاش مجدد نمادهای ناموفق) عبور می‌کنند
+        self.scheduler = scheduler or DownloadScheduler(download_fn)
+
+    def _path(self, ticker: str) -> Path:
+        return self.root / f"{ticker}.parquet"
+
+    def read(self, ticker: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> pd.DataFrame:
+        """خواندن کندل‌های ذخیره‌شده‌ی یک نماد در بازه‌ی [start, end) (هر دو اختیاری)"""
+        path = self._path(ticker)
+        if not path.exists():
+            return pd.DataFrame(columns=["Date"] + PRICE_COLUMNS)
+        filters = []
+        if start is not None:
+            filters.append(("Date", ">=", pd.Timestamp(start)))
+        if end is not None:
+            filters.append(("Date", "<", pd.Timestamp(end)))
+        return pd.read_parquet(path, filters=filters or None)
+
+    def last_date(self, ticker: str) -> Optional[pd.Timestamp]:
+        """تاریخ آخرین کندل ذخیره‌شده (فقط ستون Date خوانده می‌شود)"""
+        path = self._path(ticker)
+        if not path.exists():
+            return None
+        dates = pd.read_parquet(path, columns=["Date"])["Date"]
+        return dates.max() if len(dates) else None
+
+    def write(self, ticker: str, new_rows: pd.DataFrame, replace: bool = False) -> None:
+        """ادغام کندل‌های جدید با کش؛ در صورت تکرار تاریخ، مقدار جدید جایگزین می‌شود"""
+        if new_rows.empty:
+            return
+        merged = new_rows if replace else pd.concat([self.read(ticker), new_rows], ignore_index=True)
+        merged = merged.drop_duplicates(subset=["Date"], keep="last").sort_values("Date")
+        merged.reset_index(drop=True).to_parquet(self._path(ticker), index=False)
+
+    def _missing_ranges(self, tickers: List[str], lookback_days: int) -> Dict[pd.Timestamp, List[str]]:
+        """گروه‌بندی نمادها بر اساس تاریخ شروع بازه‌ی از دست رفته (یک درخواست برای هر گروه)"""
+        default_start = pd.Timestamp(datetime.today().date() - timedelta(days=lookback_days))
+        ranges: Dict[pd.Timestamp, List[str]] = {}
+        for ticker in tickers:
+            last = self.last_date(ticker)
+            # آخرین کندل دوباره دانلود می‌شود چون ممکن است کندل ناقص روز جاری بوده باشد
+            start = last.normalize() if last is not None else default_start
+            ranges.setdefault(start, []).append(ticker)
+        return ranges
+
+    def _apply_update(self, ticker: str, rows: pd.DataFrame, lookback_days: int, end: str) -> None:
+        """افزودن کندل‌های جدید یک نماد؛ با سود نقدی یا اسپلیت جدید کل تاریخچه بازسازی می‌شود"""
+        last = self.last_date(ticker)
+        # سود نقدی یا اسپلیت جدید، Adj Close کل تاریخچه را تغییر می‌دهد؛ بازسازی کامل
+        fresh = rows[rows["Date"] > last] if last is not None else rows.iloc[0:0]
+        corporate_action = (fresh[["Dividends", "Stock Splits"]].fillna(0) != 0).any().any()
+        if not corporate_action:
+            self.write(ticker, rows)
+            return
+
+        print(f"Corporate action detected for {ticker}, re-downloading full history...")
+        full_start = datetime.today().date() - timedelta(days=lookback_days)
+        self.scheduler.run(
+            [ticker],
+            on_batch=lambda data, ok: self.write(ticker, to_long_format(data[ok]).drop(columns=["Ticker"]), replace=True),
+            start=full_start.strftime("%Y-%m-%d"), end=end, **DOWNLOAD_KWARGS,
+        )
+
+    def update(self, tickers: List[str], lookback_days: int = DEFAULT_LOOKBACK_DAYS) -> List[str]:
+        """دانلود فقط کندل‌های جدید هر نماد و افزودن آن‌ها به کش. خروجی: نمادهای ناموفق"""
+        end = (datetime.today() + timedelta(days=1)).strftime("%Y-%m-%d")
+        failed = []
+
+        def on_batch(data: pd.DataFrame, ok: List[str]) -> None:
+            for ticker, rows in to_long_format(data[ok]).groupby("Ticker"):
+                self._apply_update(ticker, rows.drop(columns=["Ticker"]), lookback_days, end)
+
+        for start, group in sorted(self._missing_ranges(tickers, lookback_days).items()):
+            print(f"Updating {len(group)} tickers from {start.date()}...")
+            failed += self.scheduler.run(group, on_batch=on_batch, start=start.strftime("%Y-%m-%d"),
+                                         end=end, **DOWNLOAD_KWARGS)
+        return failed
+
+    def backfill(self, tickers: List[str], start: str, end: str, batch_size: Optional[int] = None,
+                 checkpoint_name: str = "_backfill.json") -> List[str]:
+        """
+        دانلود تاریخچه‌ی کامل به صورت دسته‌ای و جریانی: هر دسته بلافاصله به فرمت بلند تبدیل و
+        روی دیسک نوشته می‌شود (حافظه محدود به یک دسته). نمادهای تکمیل‌شده در checkpoint ثبت
+        می‌شوند تا اجرای قطع‌شده از آخرین دسته‌ی کامل ادامه یابد. خروجی: نمادهای ناموفق
+        """
+        checkpoint = self.root / checkpoint_name
+        state = {"start": start, "end": end, "done": []}
+        if checkpoint.exists():
+            with open(checkpoint, "r") as f:
+                saved = json.load(f)
+            if saved.get("start") == start and saved.get("end") == end:
+                state = saved
+        done = set(state["done"])
+
+        remaining = [t for t in tickers if t not in done]
+        if len(remaining) < len(tickers):
+            print(f"{len(tickers) - len(remaining)} tickers already downloaded, skipping")
+        if batch_size is not None:
+            self.scheduler.batch_size = batch_size
+
+        def on_batch(data: pd.DataFrame, ok: List[str]) -> None:
+            for ticker, rows in to_long_format(data[ok]).groupby("Ticker"):
+                self.write(ticker, rows.drop(columns=["Ticker"]))
+            done.update(ok)
+            state["done"] = sorted(done)
+            tmp_path = checkpoint.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, checkpoint)
+
+        return self.scheduler.run(remaining, on_batch=on_batch, start=start, end=end, **DOWNLOAD_KWARGS)
+
+    def load(self, tickers: List[str], lookback_days: int = DEFAULT_LOOKBACK_DAYS,
+             start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+        """
+        خواندن همه‌ی نمادها به فرمت بلند؛ بازه‌ی پیش‌فرض lookback_days روز اخیر است
+        مگر اینکه start (و end) صریحاً داده شوند.
+        """
+        if start is None:
+            start = datetime.today() - timedelta(days=lookback_days)
+        frames = []
+        for ticker in tickers:
+            rows = self.read(ticker, start=start, end=end)
+            if not rows.empty:
+                frames.append(rows.assign(Ticker=ticker))
+        if not frames:
+            return pd.DataFrame(columns=["Date", "Ticker"] + PRICE_COLUMNS)
+        return pd.concat(frames, ignore_index=True).sort_values(by=["Ticker", "Date"]).reset_index(drop=True)
@@ -4,11 +4,14 @@ import numpy as np
 import json
 from pathlib import Path
 from app.utils import (
-    fetch_raw_data, 
-    run_feature_engineering, 
+    NORMALIZER_PATH,
     load_prediction_tools, 
-    TICKERS
+    load_universe
 )
+from app.pipeline import run_sharded_pipeline
+from app.feature_transform import apply_feature_scaler
+from app.panel_kernels import fill_by_ticker
+from app.normalization import load_normalizer
 
 # مسیر فایل خروجی JSON که API آن را می‌خواند
 OUTPUT_DIR = Path("/app/model_artifacts") # یا هر مسیر دیگری که در داکر volume شده
@@ -19,26 +22,23 @@ def main():
     
     # 1. بارگذاری ابزارهای آموزش‌دیده
     try:
-        model, scaler, feature_cols, pca_model = load_prediction_tools()
-        print(f"Loaded {len(feature_cols)} features, model, and scaler.")
+        model, scaler, feature_cols, transform = load_prediction_tools()
+        normalizer = load_normalizer(NORMALIZER_PATH) if NORMALIZER_PATH.exists() else None
+        print(f"Loaded {len(feature_cols)} features, model, and {'feature transform' if transform else 'scaler'}.")
     except Exception as e:
         print(f"FATAL: Could not load model artifacts. {e}")
         return
 
-    # 2. واکشی داده‌های خام جدید
+    # 2 و 3. واکشی داده‌های خام و مهندسی ویژگی به صورت shard شده (موازی)
+    # (توجه: با مصنوع تبدیل آموزش، PCA در اینجا 'fit' نمی‌شود و فقط 'transform' می‌شود)
     try:
-        df_raw = fetch_raw_data(TICKERS)
-    except Exception as e:
-        print(f"FATAL: Data fetching failed. {e}")
-        return
-
-    # 3. اجرای خط لوله مهندسی ویژگی
-    # (توجه: PCA در اینجا 'fit' نمی‌شود، فقط 'transform' می‌شود اگر از قبل وجود داشت)
-    try:
-        df_features, _ = run_feature_engineering(df_raw)
+        # فقط اندیکاتورهایی که ورودی مدل (یا ورودی PCA_Tech_*) هستند محاسبه می‌شوند
+        # نرمال‌سازی آموزش داخل خط لوله و پیش از Market_Return، نسبت‌ها و PCA اعمال می‌شود
+        df_features, _ = run_sharded_pipeline(load_universe(), feature_cols=feature_cols, transform=transform,
+                                              normalizer=normalizer)
         print(f"Feature engineering complete. Shape: {df_features.shape}")
     except Exception as e:
-        print(f"FATAL: Feature engineering failed. {e}")
+        print(f"FATAL: Data fetching or feature engineering failed. {e}")
         return
 
     # 4. پیش‌پردازش نهایی (دقیقاً مانند نوت‌بوک CatBoost)
@@ -50,12 +50,14 @@ def main():
             df_features[col] = 0.0
 
     # فیلتر کردن فقط ستون‌های مورد نیاز
-    X_today = df_features[feature_cols].copy()
-    X_today = X_today.fillna(method="ffill").fillna(0) # پر کردن NaN ها
+    # پر کردن NaN ها داخل هر نماد (ffill سپس 0)؛ هر نماد یک ردیف دارد، پس مقدار نماد دیگری کپی نمی‌شود
+    # مقادیر بی‌نهایت (مثلاً نسبت‌ها با مخرج صفر) مانند نوت‌بوک به NaN و سپس 0
+    df_features[feature_cols] = df_features[feature_cols].replace([np.inf, -np.inf], np.nan)
+    X_today = fill_by_ticker(df_features, feature_cols)[feature_cols]
 
-    # 5. اعمال Scaler
+    # 5. اعمال Scaler (میانگین و مقیاس آموزش از مصنوع تبدیل، یا scaler.pkl قدیمی)
     try:
-        X_scaled = scaler.transform(X_today)
+        X_scaled = apply_feature_scaler(transform, X_today) if transform else scaler.transform(X_today)
     except Exception as e:
         print(f"FATAL: Scaler failed. {e}")
         print(f"Data columns: {X_today.columns.tolist()}")
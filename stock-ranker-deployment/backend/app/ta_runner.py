@@ -0,0 +1,74 @@
+# backend/app/ta_runner.py
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+from .feature_registry import TA_COLUMNS, add_ta_columns
+
+# ستون‌های ورودی اندیکاتورها؛ فقط همین‌ها به workerها ارسال می‌شوند
+OHLCV_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+# تعداد بلوک به ازای هر worker (توازن بار بین نمادهای با طول تاریخچه‌ی متفاوت)
+BLOCKS_PER_WORKER = 4
+
+
+def _ticker_blocks(sizes: np.ndarray, n_blocks: int) -> List[Tuple[int, int]]:
+    """تقسیم نمادهای پشت‌سرهم به n_blocks بلوک پیوسته با تعداد ردیف تقریباً برابر (اندیس نماد)"""
+    bounds = np.searchsorted(np.cumsum(sizes), np.linspace(0, sizes.sum(), n_blocks + 1)[1:-1], side="right")
+    edges = np.unique(np.concatenate([[0], bounds, [len(sizes)]]))
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def _run_block(block: pd.DataFrame, sizes: np.ndarray, columns: List[str], fillna: bool) -> np.ndarray:
+    """محاسبه‌ی اندیکاتورها جداگانه برای هر نماد یک بلوک؛ پنجره‌ها از مرز نمادها عبور نمی‌کنند"""
+    out = np.empty((len(block), len(columns)), dtype=np.float64)
+    start = 0
+    for size in sizes:
+        rows = block.iloc[start:start + size].reset_index(drop=True)
+        try:
+            out[start:start + size] = add_ta_columns(rows, columns, fillna=fillna)[columns].to_numpy(np.float64)
+        except (IndexError, ValueError):
+            # تاریخچه‌ی کوتاه‌تر از پنجره‌ی برخی اندیکاتورها (مثلاً ATR)؛ فقط همان ستون‌ها NaN می‌شوند
+            for i, col in enumerate(columns):
+                try:
+                    out[start:start + size, i] = add_ta_columns(rows, [col], fillna=fillna)[col].to_numpy(np.float64)
+                except (IndexError, ValueError):
+                    out[start:start + size, i] = np.nan
+        start += size
+    return out
+
+
+def add_ta_columns_by_ticker(df: pd.DataFrame, columns: Optional[List[str]] = None, fillna: bool = True,
+                             max_workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    اجرای اندیکاتورهای ta برای هر نماد به طور مستقل و موازی روی بلوک‌های پیوسته‌ی نمادها.
+    ردیف‌های هر نماد باید به ترتیب Date باشند؛ ترتیب اصلی ردیف‌های df حفظ می‌شود.
+    max_workers=1 یعنی اجرای ترتیبی در همین پردازه (مثلاً داخل یک shard موازی).
+    """
+    columns = TA_COLUMNS if columns is None else list(columns)
+    if not columns or df.empty:
+        return df.assign(**{col: np.nan for col in columns})
+
+    # ترتیب پایدار بر اساس نماد: ردیف‌های هر نماد پشت‌سرهم و به ترتیب اصلی (زمانی)
+    codes, _ = pd.factorize(df["Ticker"])
+    order = np.argsort(codes, kind="stable")
+    sizes = np.bincount(codes)
+    ohlcv = df[OHLCV_COLUMNS].iloc[order].reset_index(drop=True)
+
+    max_workers = max_workers or os.cpu_count() or 1
+    blocks = _ticker_blocks(sizes, max_workers * BLOCKS_PER_WORKER if max_workers > 1 else 1)
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    tasks = [(ohlcv.iloc[offsets[t0]:offsets[t1]], sizes[t0:t1]) for t0, t1 in blocks]
+
+    if max_workers == 1:
+        results = [_run_block(block, block_sizes, columns, fillna) for block, block_sizes in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_run_block, block, block_sizes, columns, fillna) for block, block_sizes in tasks]
+            results = [future.result() for future in futures]
+
+    # بازگرداندن نتایج به ترتیب اصلی ردیف‌ها
+    values = np.empty((len(df), len(columns)), dtype=np.float64)
+    values[order] = np.concatenate(results)
+    return df.assign(**{col: values[:, i] for i, col in enumerate(columns)})
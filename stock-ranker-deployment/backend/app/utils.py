@@ -1,15 +1,23 @@
 # backend/app/utils.py
 import pandas as pd
 import numpy as np
-import yfinance as yf
-from ta import add_all_ta_features
 from sklearn.preprocessing import StandardScaler
 from sklearn.decomposition import PCA
 import joblib
 import json
+import os
 from pathlib import Path
 from catboost import CatBoostRanker
-from typing import List, Tuple, Any
+from typing import Dict, List, Optional, Tuple, Any
+from .price_store import PriceStore
+from .fundamentals import FundamentalsCache, fetch_fundamentals
+from .dataset_io import compact_frame, memory_report
+from .indicators import OWN_COLUMNS, TA_COLUMNS as ENGINE_TA_COLUMNS
+from .feature_registry import DEFAULT_PCA_INPUTS, is_pca_input, required_ta_columns
+from .feature_transform import apply_outlier_transform, apply_pca, has_pca, load_feature_transform
+from .panel_kernels import TickerPanel, bar_returns, date_mean, rolling_market_moments
+from .normalization import normalize
+from .feature_graph import build_feature_graph, ratio_node
 
 # مسیرهای مصنوعات (Artifacts)
 MODEL_DIR = Path("/app/model_artifacts")
@@ -17,6 +25,23 @@ MODEL_PATH = MODEL_DIR / "catboost_ranker_optimized.cbm"
 SCALER_PATH = MODEL_DIR / "scaler.pkl"
 FEATURES_PATH = MODEL_DIR / "feature_cols.json"
 PCA_PATH = MODEL_DIR / "pca.pkl" # ما این را نیز ذخیره خواهیم کرد
+PCA_FEATURES_PATH = MODEL_DIR / "pca_features.json" # ستون‌های ورودی PCA در آموزش (خروجی نوت‌بوک)
+# مصنوع تبدیل fit‌شده در آموزش (PCA و StandardScaler نهایی)؛ سرویس فقط transform می‌کند
+TRANSFORM_PATH = MODEL_DIR / "feature_transform.pkl"
+# آمار نرمال‌سازی per-ticker (یا حالت per-date) مرحله‌ی پیش‌پردازش نوت‌بوک
+NORMALIZER_PATH = MODEL_DIR / "normalizer.pkl"
+# کش محلی قیمت‌ها (داخل volume مصنوعات تا بین اجراها باقی بماند)
+PRICE_STORE_DIR = MODEL_DIR / "price_store"
+FUNDAMENTALS_CACHE_PATH = MODEL_DIR / "fundamentals_cache.json"
+# یونیورس اختیاری (لیست JSON نمادها)؛ در نبود آن از TICKERS استفاده می‌شود
+TICKERS_PATH = MODEL_DIR / "tickers.json"
+# وضعیت موتور جریانی اندیکاتورها (یک فایل برای هر نماد)
+INDICATOR_STATE_DIR = MODEL_DIR / "indicator_state"
+# incremental: فقط کندل‌های جدید به وضعیت اعمال می‌شوند | full: محاسبه‌ی کامل تاریخچه
+# verify: مسیر جریانی با محاسبه‌ی کامل مقایسه و ناسازگاری‌ها گزارش می‌شوند
+INDICATOR_MODE = os.getenv("INDICATOR_MODE", "incremental")
+# طول پنجره‌ی Beta (تعداد کندل‌های هر نماد)
+BETA_WINDOW = int(os.getenv("BETA_WINDOW", "30"))
 
 # لیست نمادها از نوت‌بوک شما
 TICKERS = [
@@ -50,120 +75,207 @@ TICKERS = [
 ]
 
 def load_prediction_tools():
-    """بارگذاری مدل، scaler، لیست ویژگی‌ها و مدل PCA"""
-    if not all([MODEL_PATH.exists(), SCALER_PATH.exists(), FEATURES_PATH.exists()]):
+    """
+    بارگذاری مدل، scaler، لیست ویژگی‌ها و مصنوع تبدیل fit‌شده.
+    با وجود feature_transform.pkl، لیست ویژگی‌ها و scaler از همان خوانده می‌شوند (scaler برابر None).
+    """
+    transform = load_feature_transform(TRANSFORM_PATH, BETA_WINDOW) if TRANSFORM_PATH.exists() else None
+    if not MODEL_PATH.exists() or (transform is None and not (SCALER_PATH.exists() and FEATURES_PATH.exists())):
         raise FileNotFoundError("One or more critical artifacts (model, scaler, features) are missing.")
     
     model = CatBoostRanker()
     model.load_model(str(MODEL_PATH))
     
+    if transform is not None:
+        return model, None, transform["feature_cols"], transform
+
     scaler = joblib.load(str(SCALER_PATH))
     
     with open(FEATURES_PATH, "r") as f:
         feature_cols = json.load(f)
         
-    # بارگذاری PCA اگر وجود داشته باشد، در غیر این صورت None
-    pca = joblib.load(PCA_PATH) if PCA_PATH.exists() else None
-        
-    return model, scaler, feature_cols, pca
+    return model, scaler, feature_cols, None
 
-def fetch_raw_data(tickers: List[str]) -> pd.DataFrame:
-    """بخش ۱ نوت‌بوک: دانلود داده‌های yfinance و اطلاعات پایه"""
-    print("Step 1: Downloading yfinance historical data...")
+def load_universe() -> List[str]:
+    """لیست نمادها؛ اگر فایل tickers.json در مصنوعات باشد (مثلاً یونیورس Russell 3000) از آن خوانده می‌شود"""
+    if TICKERS_PATH.exists():
+        with open(TICKERS_PATH, "r") as f:
+            return json.load(f)
+    return TICKERS
+
+def fetch_prices(tickers: List[str]) -> pd.DataFrame:
+    """به‌روزرسانی کش محلی قیمت‌ها و خواندن پنجره‌ی اخیر به فرمت بلند"""
     # به داده‌های کافی برای محاسبه اندیکاتورها نیاز داریم (مثلاً ۱ سال)
-    data = yf.download(tickers, period="1y", group_by="ticker", auto_adjust=False, actions=True)
-    
-    df = data.stack(level=0, future_stack=True).reset_index().rename(columns={"level_1": "Ticker"})
-    df["Date"] = pd.to_datetime(df["Date"])
-    df = df.dropna(subset=["Open", "High", "Low", "Close"])
-    df = df.drop_duplicates(subset=["Date", "Ticker"])
-    df = df.sort_values(by=["Ticker", "Date"])
+    # فقط کندل‌های جدید دانلود می‌شوند و بقیه از کش محلی خوانده می‌شوند
+    store = PriceStore(PRICE_STORE_DIR)
+    store.update(tickers)
+    return store.load(tickers)
 
-    print("Step 2: Fetching fundamental info (EPS, Market Cap)...")
-    # این بخش کند است، اما برای ویژگی‌های شما ضروری است
-    company_info = []
-    for ticker in tickers:
-        try:
-            info = yf.Ticker(ticker).info
-            company_info.append({
-                "Ticker": ticker,
-                "Market Cap": info.get("marketCap"),
-                "P/E Ratio": info.get("trailingPE"),
-                "EPS": info.get("trailingEps"),
-            })
-        except Exception:
-            company_info.append({"Ticker": ticker}) # افزودن ردیف خالی در صورت خطا
-            
-    company_df = pd.DataFrame(company_info)
+def fetch_company_info(tickers: List[str]) -> pd.DataFrame:
+    """اطلاعات پایه‌ی مورد نیاز مدل (Market Cap, P/E Ratio, EPS) برای هر نماد"""
+    # واکشی موازی؛ فقط نمادهایی که در کش TTL منقضی شده‌اند درخواست می‌شوند
+    company_df = fetch_fundamentals(tickers, cache=FundamentalsCache(FUNDAMENTALS_CACHE_PATH))
+    return company_df[["Ticker", "Market Cap", "P/E Ratio", "EPS"]]
+
+def merge_company_info(df: pd.DataFrame, company_df: pd.DataFrame) -> pd.DataFrame:
     df = df.merge(company_df, on="Ticker", how="left")
-    
     # پر کردن ffill برای اطلاعات پایه (چون هر روز تغییر نمی‌کنند)
     df[['Market Cap', 'P/E Ratio', 'EPS']] = df.groupby('Ticker')[['Market Cap', 'P/E Ratio', 'EPS']].ffill()
+    return df
+
+def fetch_raw_data(tickers: List[str]) -> pd.DataFrame:
+    """بخش ۱ نوت‌بوک: دانلود داده‌های yfinance و اطلاعات پایه"""
+    print("Step 1: Updating local price store with missing bars...")
+    df = fetch_prices(tickers)
+
+    print("Step 2: Fetching fundamental info (EPS, Market Cap)...")
+    df = merge_company_info(df, fetch_company_info(tickers))
+
+    # Ticker به category و ستون‌های عددی به float32/int کوچک‌تر
+    df = compact_frame(df)
+    memory_report(df, "raw data")
 
     return df
 
-def run_feature_engineering(df: pd.DataFrame) -> Tuple[pd.DataFrame, PCA]:
-    """بخش‌های ۳ و ۴ نوت‌بوک: اجرای کامل مهندسی ویژگی"""
-    print("Step 3: Adding Technical Indicators (TA)...")
-    # نوت‌بوک شما از ta استفاده کرده است، نه pandas-ta
-    df = add_all_ta_features(df, open="Open", high="High", low="Low", close="Close", volume="Volume", fillna=True)
+def load_pca_inputs() -> List[str]:
+    """ستون‌هایی که PCA_Tech_* در آموزش روی آن‌ها fit شده است"""
+    if PCA_FEATURES_PATH.exists():
+        with open(PCA_FEATURES_PATH, "r") as f:
+            return json.load(f)
+    return DEFAULT_PCA_INPUTS
 
-    print("Step 4: Engineering Advanced Features...")
-    
-    # 4.1. Lag ها
-    for lag in [1, 3, 5]:
-        # 'Return_7d' هنوز وجود ندارد، پس از 'Adj Close' لگ می‌گیریم
-        df[f'Adj_Close_Lag_{lag}'] = df.groupby('Ticker')['Adj Close'].shift(lag)
-    
-    # 4.2. میانگین‌های متحرک
-    windows = [5, 10, 20]
-    for window in windows:
-        df[f'SMA_{window}'] = df.groupby('Ticker')['Adj Close'].rolling(window=window, min_periods=1).mean().reset_index(0, drop=True)
-        df[f'EMA_{window}'] = df.groupby('Ticker')['Adj Close'].ewm(span=window, adjust=False, min_periods=1).mean().reset_index(0, drop=True)
-
-    # 4.3. نسبت‌های مالی (پر کردن مقادیر 0 و NaN)
-    df['EPS'] = df['EPS'].replace(0, np.nan).fillna(df.groupby('Ticker')['EPS'].transform('mean')).fillna(0)
-    df['Market Cap'] = df['Market Cap'].replace(0, np.nan).fillna(df.groupby('Ticker')['Market Cap'].transform('mean')).fillna(1e-6)
-    df['PE_to_EPS'] = df['P/E Ratio'] / (df['EPS'] + 1e-6) # جلوگیری از تقسیم بر صفر
-
-    # 4.4. نوسانات (Sharpe_Ratio به Return_7d نیاز دارد که هنوز نداریم)
-    df['Volatility_Rolling_Std'] = df.groupby('Ticker')['Adj Close'].rolling(window=10, min_periods=1).std().reset_index(0, drop=True)
-
-    # 4.5. ویژگی‌های بازار (Beta, Market_Return)
-    df['Market_Return'] = df.groupby('Date')['Adj Close'].transform('mean')
-    # محاسبه Beta (ساده شده)
-    cov_matrix = df.groupby('Ticker')[['Adj Close', 'Market_Return']].rolling(window=30).cov().unstack()
-    if not cov_matrix.empty:
-        beta = cov_matrix[('Adj Close', 'Market_Return')] / (cov_matrix[('Market_Return', 'Market_Return')] + 1e-6)
-        df['Beta'] = beta.reset_index(level=0, drop=True)
+def resolve_feature_plan(feature_cols: Optional[List[str]],
+                         transform: Optional[Dict] = None) -> Tuple[Optional[List[str]], Optional[List[str]]]:
+    """
+    از روی ورودی‌های مدل: (ستون‌های ta مورد نیاز، ورودی‌های PCA).
+    None یعنی کل کاتالوگ ta و قاعده‌ی پیش‌فرض PCA (رفتار قبلی بدون feature_cols).
+    ورودی‌های PCA در صورت وجود از مصنوع تبدیل خوانده می‌شوند.
+    """
+    if feature_cols is None:
+        return None, None
+    if not any(c.startswith("PCA_Tech_") for c in feature_cols):
+        pca_inputs = []
+    elif has_pca(transform):
+        pca_inputs = transform["pca_inputs"]
     else:
-        df['Beta'] = 0.0
+        pca_inputs = load_pca_inputs()
+    return required_ta_columns(feature_cols, pca_inputs), pca_inputs
+
+def _assign_columns(df: pd.DataFrame, columns: pd.DataFrame) -> pd.DataFrame:
+    """قرار دادن خروجی یک گره (هم‌ترتیب با df) بر اساس موقعیت، بدون هم‌ترازی ایندکس"""
+    for col in columns.columns:
+        df[col] = columns[col].to_numpy()
+    return df
+
+def add_ticker_features(df: pd.DataFrame, latest_indicators: Optional[pd.DataFrame] = None,
+                        ta_columns: Optional[List[str]] = None, pca_inputs: Optional[List[str]] = None,
+                        ta_workers: Optional[int] = None, pca_fitted: bool = False,
+                        cache_dir: Optional[Path] = None) -> pd.DataFrame:
+    """
+    ویژگی‌هایی که فقط به تاریخچه‌ی همان نماد وابسته‌اند (اندیکاتورها، lag، میانگین متحرک،
+    نوسان و ویژگی‌های زمانی)؛ برای هر shard از نمادها به طور مستقل قابل اجراست.
+    latest_indicators: خروجی IndicatorEngine.update؛ در این صورت lag، میانگین‌های متحرک، نوسان و
+    ستون‌های ta که موتور جریانی دارد (ENGINE_TA_COLUMNS) فقط برای آخرین کندل هر نماد از وضعیت ذخیره‌شده
+    می‌آیند. بقیه‌ی ستون‌های ta (مثلاً stoch، adx، kc) همچنان روی کل تاریخچه‌ی هر نماد محاسبه می‌شوند.
+    ta_columns: بستار وابستگی ورودی‌های مدل روی ta (None یعنی کل کاتالوگ، مانند add_all_ta_features).
+    pca_inputs: ورودی‌های PCA (None یعنی قاعده‌ی پیش‌فرض).
+    ta_workers: تعداد پردازه‌ها برای اندیکاتورهای هر نماد (None یعنی تعداد هسته‌ها).
+    pca_fitted: PCA فقط با وزن‌های آموزش transform می‌شود؛ چون خروجی فقط آخرین ردیف هر نماد است،
+    ورودی‌های PCA هم از موتور جریانی گرفته می‌شوند. در غیر این صورت PCA روی همه‌ی ردیف‌ها fit می‌شود
+    و ورودی‌های آن باید برای کل تاریخچه محاسبه شوند.
+    cache_dir: کش خروجی گره‌های گراف ویژگی (None یعنی بدون کش، مسیر سرویس روزانه)؛
+    برای بازسازی‌های تکراری روی همان داده. پس از هر اجرا فقط ورودی‌های همین داده می‌مانند.
+    """
+    print("Step 3: Adding Technical Indicators (TA)...")
+    # نوت‌بوک شما از ta استفاده کرده است، نه pandas-ta؛ فقط اندیکاتورهای مورد نیاز مدل ساخته می‌شوند
+    from_engine = []
+    if latest_indicators is not None and ta_columns is not None:
+        # ستون‌هایی که موتور جریانی دارد؛ ورودی‌های PCA فقط وقتی که PCA روی همه‌ی ردیف‌ها fit می‌شود کنار می‌روند
+        if pca_fitted:
+            history = set()
+        else:
+            history = set(pca_inputs) if pca_inputs is not None else {c for c in ta_columns if is_pca_input(c)}
+        from_engine = [c for c in ta_columns if c in ENGINE_TA_COLUMNS and c not in history]
+        ta_columns = [c for c in ta_columns if c not in from_engine]
+
+    # 3، 4.1، 4.2، 4.4 و 4.7 با گراف ویژگی (هسته‌های NumPy روی کل تاریخچه؛ اندیکاتورهای ta برای هر نماد
+    # جداگانه و موازی). با cache_dir فقط گره‌هایی که داده، پارامتر یا کدشان تغییر کرده دوباره محاسبه می‌شوند.
+    # نسبت‌های مالی پس از نرمال‌سازی در add_cross_sectional_features ساخته می‌شوند.
+    graph = build_feature_graph(ta_columns, cache_dir, own_columns=latest_indicators is None, ta_workers=ta_workers)
+    sources = {"prices": df.reset_index(drop=True)}
+    df = graph.assemble(sources, base="prices")
+    if cache_dir is not None:
+        graph.prune(sources)
+    print(f"Computed {len(ta_columns) if ta_columns is not None else 'all'} ta columns "
+          f"({len(from_engine)} more from the indicator state).")
+
+    if latest_indicators is not None:
+        print("Step 4: Merging streaming indicator state...")
+        # 4.1، 4.2 و 4.4 از وضعیت ذخیره‌شده (فقط آخرین کندل؛ groupby().last() همین ردیف را برمی‌دارد)
+        df = df.merge(latest_indicators[["Ticker", "Date"] + OWN_COLUMNS + from_engine], on=["Ticker", "Date"], how="left")
+
+    return df
+
+def add_cross_sectional_features(df: pd.DataFrame, pca_inputs: Optional[List[str]] = None,
+                                 transform: Optional[Dict] = None,
+                                 normalizer: Optional[Dict] = None) -> Tuple[pd.DataFrame, Optional[PCA]]:
+    """
+    مراحلی که به کل یونیورس نیاز دارند (Market_Return، Beta و PCA) به همراه نرمال‌سازی و نسبت‌های مالی؛
+    در حالت shard شده فقط همین بخش روی داده‌ی ادغام‌شده اجرا می‌شود.
+    pca_inputs: ورودی‌های PCA؛ None یعنی قاعده‌ی پیش‌فرض و لیست خالی یعنی مدل به PCA_Tech_* نیازی ندارد.
+    transform: مصنوع تبدیل آموزش؛ در این صورت PCA فقط transform می‌شود و هیچ fit‌ای انجام نمی‌شود.
+    normalizer: آمار per-ticker پیش‌پردازش آموزش؛ ترتیب مراحل مانند نوت‌بوک است: Beta روی Adj Close خام،
+    سپس نرمال‌سازی، clip و PowerTransformer (از transform) و بعد نسبت‌ها، Market_Return و PCA.
+    """
+    # 4.5. Beta متحرک روی بازده‌های روزانه‌ی قیمت خام نسبت به میانگین مقطعی بازده‌ها
+    # (جمع‌های پنجره‌ای، بدون ماتریس کوواریانس هر ردیف)
+    panel = TickerPanel(df['Ticker'])
+    returns = panel.unpivot(bar_returns(panel.pivot(df['Adj Close'])))
+    market = date_mean(df['Date'], returns)
+    moments = rolling_market_moments(panel.pivot(returns), panel.pivot(market), BETA_WINDOW)
+    df['Beta'] = panel.unpivot(moments['beta'])
+
+    # نرمال‌سازی مانند پیش‌پردازش آموزش با آمار ذخیره‌شده (یک جست‌وجو و یک عمل برداری برای همه‌ی ردیف‌ها)؛
+    # lag/SMA/EMA/نوسان روی قیمت خام ساخته شده‌اند و با آمار Adj Close نرمال می‌شوند
+    if normalizer is not None:
+        df = normalize(normalizer, df, derived=True)
+    # clip با حدود IQR و Yeo-Johnson آموزش (momentum_rsi، trend_macd، volatility_atr) پیش از نسبت‌ها و PCA
+    df = apply_outlier_transform(transform, df)
+
+    # 4.3. نسبت‌های مالی (در آموزش نسبت مقادیر نرمال‌شده است) و 4.5. Market_Return
+    df = _assign_columns(df, ratio_node(df))
+    df['Market_Return'] = date_mean(df['Date'], df['Adj Close'])
 
     # 4.6. PCA (و ذخیره آن)
-    tech_features = [col for col in df.columns if 'momentum_' in col or 'trend_' in col or 'volatility_' in col]
-    # اطمینان از حذف ستون‌هایی که PCA نمی‌تواند بپذیرد
-    tech_features = [col for col in tech_features if col in df and pd.api.types.is_numeric_dtype(df[col])]
-    
-    # پر کردن NaN ها قبل از PCA
-    df_tech_filled = df[tech_features].fillna(0)
-    
-    scaler_pca = StandardScaler()
-    pca = PCA(n_components=5)
-    
-    df_tech_scaled = scaler_pca.fit_transform(df_tech_filled)
-    pca_features = pca.fit_transform(df_tech_scaled)
-    
-    for i in range(pca_features.shape[1]):
-        df[f'PCA_Tech_{i+1}'] = pca_features[:, i]
-        
-    # ذخیره PCA برای استفاده‌های بعدی (اگر اولین بار است)
-    if not PCA_PATH.exists():
-        joblib.dump(pca, PCA_PATH)
+    pca = None
+    if pca_inputs is not None and not pca_inputs:
+        print("Model does not use PCA_Tech_* features, skipping PCA.")
+    elif has_pca(transform):
+        # فقط یک ضرب ماتریسی با وزن‌های آموزش (scaler ورودی‌ها در وزن‌ها ادغام شده است)
+        pca_features = apply_pca(transform, df)
+        for i in range(pca_features.shape[1]):
+            df[f'PCA_Tech_{i+1}'] = pca_features[:, i]
+    else:
+        print("Warning: no fitted feature transform, fitting PCA on serving data.")
+        tech_features = pca_inputs if pca_inputs is not None else [col for col in df.columns if is_pca_input(col)]
+        # اطمینان از حذف ستون‌هایی که PCA نمی‌تواند بپذیرد
+        tech_features = [col for col in tech_features if col in df and pd.api.types.is_numeric_dtype(df[col])]
+
+        # پر کردن NaN ها قبل از PCA
+        df_tech_filled = df[tech_features].fillna(0)
+
+        scaler_pca = StandardScaler()
+        pca = PCA(n_components=5)
+
+        df_tech_scaled = scaler_pca.fit_transform(df_tech_filled)
+        pca_features = pca.fit_transform(df_tech_scaled)
 
-    # 4.7. ویژگی‌های زمانی
-    df['Day_of_Week'] = df['Date'].dt.dayofweek
-    df['Month'] = df['Date'].dt.month
-    df['Quarter'] = df['Date'].dt.quarter
+        for i in range(pca_features.shape[1]):
+            df[f'PCA_Tech_{i+1}'] = pca_features[:, i]
+
+        # ذخیره PCA برای استفاده‌های بعدی (اگر اولین بار است)
+        if not PCA_PATH.exists():
+            joblib.dump(pca, PCA_PATH)
 
     print("Step 5: Final data cleanup...")
     # ویژگی‌هایی که در نوت‌بوک برای مدل CatBoost حذف شدند
@@ -174,11 +286,6 @@ def run_feature_engineering(df: pd.DataFrame) -> Tuple[pd.DataFrame, PCA]:
     final_data_today = df.groupby('Ticker').last().reset_index()
     
     return final_data_today, pca
-# app/utils.py (Sample)
-import json
-import os
-from typing import List, Dict
-
 
 def read_recommendations_json(file_path: str) -> List[Dict]:
     """فایل JSON توصیه‌های روزانه را می‌خواند."""
@@ -201,4 +308,4 @@ def read_recommendations_json(file_path: str) -> List[Dict]:
         return []
     except Exception as e:
         print(f"An unexpected error occurred while reading JSON: {e}")
-        return []
\ No newline at end of file
+        return []
@@ -0,0 +1,162 @@
+# backend/app/walk_forward.py
+import multiprocessing
+import os
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from sklearn.metrics import ndcg_score
+from typing import Dict, List, Optional, Tuple, Union
+from .feature_matrix import FeatureMatrix
+from .hyperparameter_search import limit_threads
+from .labels import relevance_labels
+
+TOPK = 5
+RELEVANCE_THRESHOLD = 2  # rel >= 2 برای Precision@K مرتبط حساب می‌شود
+# فاصله (تعداد تاریخ) بین پایان داده‌ی آموزش و شروع پنجره‌ی بعدی؛ برچسب Return_7d بازده ۷ روز آینده است
+# و بدون این فاصله برچسب آخرین روزهای آموزش از قیمت‌های پنجره‌ی ارزیابی ساخته می‌شود
+EMBARGO_DAYS = 7
+# انتهای هر پنجره‌ی آموزش برای early stopping کنار گذاشته می‌شود (پنجره‌ی ارزیابی fold دیده نمی‌شود)
+EARLY_STOPPING_DAYS = 60
+
+Span = Tuple[int, int]
+
+
+def expanding_folds(n_dates: int, n_folds: int, embargo: int = EMBARGO_DAYS,
+                    early_stopping_days: int = EARLY_STOPPING_DAYS) -> List[Dict[str, Span]]:
+    """
+    fold های walk-forward با پنجره‌ی آموزش گسترش‌یابنده (همان مرزهای سلول Walk-Forward):
+    eval_i = [(i+1)·f, (i+2)·f)، آموزش از ابتدا تا پیش از eval_i با دو فاصله‌ی embargo:
+    train | embargo | early_stopping | embargo | eval
+    """
+    fold_size = n_dates // (n_folds + 1)
+    folds = []
+    for i in range(n_folds):
+        eval_start = (i + 1) * fold_size
+        stop_end = eval_start - embargo
+        stop_start = max(1, stop_end - early_stopping_days)
+        train_end = stop_start - embargo
+        if train_end <= 0 or stop_start >= stop_end:
+            raise ValueError(f"Fold {i} has no training dates; use fewer folds or smaller embargo/early-stopping windows.")
+        folds.append({"train": (0, train_end), "early_stopping": (stop_start, stop_end),
+                      "eval": (eval_start, eval_start + fold_size)})
+    return folds
+
+
+def query_metrics(labels: np.ndarray, preds: np.ndarray, sizes: np.ndarray, k: int = TOPK,
+                  threshold: int = RELEVANCE_THRESHOLD) -> Tuple[np.ndarray, np.ndarray]:
+    """NDCG@K و Precision@K هر query (تاریخ)، مانند per_query_metrics سلول‌های ارزیابی"""
+    ndcg = np.full(len(sizes), np.nan)
+    precision = np.full(len(sizes), np.nan)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    for q, (start, size) in enumerate(zip(starts, sizes)):
+        if size == 0:
+            continue
+        y, p = labels[start:start + size], preds[start:start + size]
+        if size > 1:  # ndcg_score برای یک سند تعریف نشده است
+            ndcg[q] = ndcg_score([y], [p], k=k)
+        precision[q] = np.mean(y[np.argsort(p)[-k:]] >= threshold)
+    return ndcg, precision
+
+
+def _arrays(fm: FeatureMatrix, span: Span, labels: np.ndarray):
+    rows = fm.rows(*span)
+    return fm.X[rows], labels[rows], fm.group_sizes(*span)
+
+
+def _fit_lightgbm(fm: FeatureMatrix, fold: Dict[str, Span], labels: np.ndarray, params: Dict,
+                  rounds: int, stopping: int, threads: int):
+    import lightgbm as lgb
+
+    X, y, sizes = _arrays(fm, fold["train"], labels)
+    X_es, y_es, sizes_es = _arrays(fm, fold["early_stopping"], labels)
+    train_set = lgb.Dataset(X, label=y, group=sizes)
+    stop_set = lgb.Dataset(X_es, label=y_es, group=sizes_es, reference=train_set)
+    booster = lgb.train({**params, "num_threads": threads, "verbose": -1}, train_set, num_boost_round=rounds,
+                        valid_sets=[stop_set], valid_names=["val"],
+                        callbacks=[lgb.early_stopping(stopping, verbose=False)])
+    return booster.predict, int(booster.best_iteration)
+
+
+def _fit_catboost(fm: FeatureMatrix, fold: Dict[str, Span], labels: np.ndarray, params: Dict, threads: int):
+    from catboost import CatBoostRanker, Pool
+
+    X, y, _ = _arrays(fm, fold["train"], labels)
+    X_es, y_es, _ = _arrays(fm, fold["early_stopping"], labels)
+    model = CatBoostRanker(**{k: v for k, v in params.items() if k != "verbose"}, thread_count=threads)
+    model.fit(Pool(data=X, label=y, group_id=fm.group_ids(*fold["train"])),
+              eval_set=Pool(data=X_es, label=y_es, group_id=fm.group_ids(*fold["early_stopping"])), verbose=False)
+    return model.predict, int(model.get_best_iteration())
+
+
+def _run_fold(index: int, fold: Dict[str, Span], matrix_dir: str, label_mode: str, lgb_params: Dict,
+              lgb_rounds: int, lgb_stopping: int, cb_params: Dict, threads: int, k: int) -> List[Dict]:
+    """آموزش هر دو رتبه‌بند روی پنجره‌ی fold و ارزیابی روی پنجره‌ی بعدی (در worker با threads نخ)"""
+    limit_threads(threads)
+    fm = FeatureMatrix(matrix_dir)
+    # مرزهای برچسب global فقط از بازه‌ی آموزش همین fold (بدون بازده‌های پنجره‌ی ارزیابی و بعد از آن)
+    labels = relevance_labels(fm.frame(), mode=label_mode, fit_rows=fm.rows(*fold["train"])).astype(int)
+    X_eval, y_eval, sizes_eval = _arrays(fm, fold["eval"], labels)
+
+    rankers = {
+        "LightGBM": lambda: _fit_lightgbm(fm, fold, labels, lgb_params, lgb_rounds, lgb_stopping, threads),
+        "CatBoost": lambda: _fit_catboost(fm, fold, labels, cb_params, threads),
+    }
+    rows = []
+    for name, fit in rankers.items():
+        started = time.time()
+        predict, best_iteration = fit()
+        ndcg, precision = query_metrics(y_eval, predict(X_eval), sizes_eval, k)
+        rows.append({
+            "fold": index + 1,
+            "model": name,
+            "train_start": str(fm.group_dates[fold["train"][0]]),
+            "train_end": str(fm.group_dates[fold["train"][1] - 1]),
+            "eval_start": str(fm.group_dates[fold["eval"][0]]),
+            "eval_end": str(fm.group_dates[fold["eval"][1] - 1]),
+            "train_dates": fold["train"][1] - fold["train"][0],
+            "eval_dates": fold["eval"][1] - fold["eval"][0],
+            f"ndcg@{k}": float(np.nanmean(ndcg)),
+            f"precision@{k}": float(np.nanmean(precision)),
+            "best_iteration": best_iteration,
+            "seconds": round(time.time() - started, 1),
+        })
+    return rows
+
+
+def run_walk_forward(matrix_dir: str, n_folds: int, lgb_params: Dict, cb_params: Dict,
+                     results_path: Optional[Union[str, Path]] = None, label_mode: str = "global",
+                     lgb_rounds: int = 2000, lgb_stopping: int = 100, k: int = TOPK,
+                     embargo: int = EMBARGO_DAYS, early_stopping_days: int = EARLY_STOPPING_DAYS,
+                     n_workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    walk-forward واقعی: هر دو رتبه‌بند برای هر پنجره‌ی گسترش‌یابنده از نو آموزش داده و روی پنجره‌ی بعدی ارزیابی می‌شوند.
+    fold ها هم‌زمان در فرایندهای جدا اجرا می‌شوند که ماتریس ویژگی memory-mapped را مشترکاً می‌خوانند؛
+    هسته‌ها بین workerها تقسیم می‌شوند (threads = cpu // n_workers) تا بیش از حد اشغال نشوند.
+    خروجی: جدول NDCG@K و Precision@K هر (fold، مدل)، در صورت داده شدن results_path به صورت CSV.
+    """
+    fm = FeatureMatrix(matrix_dir)
+    folds = expanding_folds(fm.n_dates, n_folds, embargo, early_stopping_days)
+    cpus = os.cpu_count() or 1
+    n_workers = min(n_folds, n_workers or cpus)
+    threads = max(1, cpus // n_workers)
+    print(f"Walk-forward: {n_folds} folds on {n_workers} workers x {threads} threads.")
+
+    rows = []
+    # spawn: fork پس از استفاده‌ی OpenMP در فرایند اصلی ممکن است قفل شود
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=limit_threads, initargs=(threads,)) as pool:
+        futures = [pool.submit(_run_fold, i, fold, matrix_dir, label_mode, lgb_params, lgb_rounds, lgb_stopping,
+                               cb_params, threads, k) for i, fold in enumerate(folds)]
+        for future in as_completed(futures):
+            for row in future.result():
+                print(f"  fold {row['fold']} {row['model']}: NDCG@{k}={row[f'ndcg@{k}']:.4f} "
+                      f"Precision@{k}={row[f'precision@{k}']:.4f} ({row['seconds']}s)")
+                rows.append(row)
+
+    results = pd.DataFrame(rows).sort_values(["fold", "model"]).reset_index(drop=True)
+    if results_path is not None:
+        results.to_csv(results_path, index=False)
+        print(f"Walk-forward results saved: {results_path}")
+    return results
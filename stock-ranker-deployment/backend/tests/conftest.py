@@ -0,0 +1,6 @@
+# backend/tests/conftest.py
+import sys
+from pathlib import Path
+
+# ماژول‌های سرویس مانند run_daily_ranking با "from app.xxx" وارد می‌شوند
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
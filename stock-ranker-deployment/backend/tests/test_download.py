@@ -0,0 +1,90 @@
+# backend/tests/test_download.py
+from app.download import DownloadScheduler, SyntheticProvider, TokenBucket
+
+START, END = "2024-01-01", "2024-01-10"
+
+
+class FakeClock:
+    """ساعت مجازی: sleep فقط زمان را جلو می‌برد تا تست‌ها بدون انتظار واقعی اجرا شوند"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += max(seconds, 0.0)
+
+
+class RecordingProvider(SyntheticProvider):
+    """SyntheticProvider که زمان هر درخواست را هم ثبت می‌کند"""
+
+    def __init__(self, clock, fail_times=None):
+        super().__init__(fail_times)
+        self.clock = clock
+        self.times = []
+
+    def __call__(self, tickers, start, end, **kwargs):
+        self.times.append(self.clock())
+        return super().__call__(tickers, start, end, **kwargs)
+
+
+def scheduler(provider, clock, **kwargs):
+    return DownloadScheduler(download_fn=provider, clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def run(sched, tickers):
+    received = []
+    failed = sched.run(tickers, lambda data, ok: received.extend(ok), start=START, end=END)
+    return received, failed
+
+
+def test_batch_shrinks_on_throttling_and_recovers():
+    clock = FakeClock()
+    tickers = [f"T{i:02d}" for i in range(40)]
+    # دسته‌ی اول کاملاً رد می‌شود (شبیه محدودیت نرخ)
+    provider = SyntheticProvider(fail_times={t: 1 for t in tickers[:8]})
+    sched = scheduler(provider, clock, batch_size=8, min_batch_size=2, max_batch_size=16,
+                      rate=100.0, burst=100, backoff=0.5)
+    received, failed = run(sched, tickers)
+
+    sizes = [len(call) for call in provider.calls]
+    assert sizes[:3] == [8, 4, 7]
+    assert max(sizes[1:]) > sizes[0]
+    assert sched.batch_size == 16
+    assert failed == [] and sorted(received) == tickers
+
+
+def test_token_bucket_paces_requests():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2.0, burst=2, clock=clock, sleep=clock.sleep)
+    times = []
+    for _ in range(6):
+        bucket.acquire()
+        times.append(clock.now)
+    # دو درخواست اول از burst، بقیه هر 1/rate ثانیه
+    assert times == [0.0, 0.0, 0.5, 1.0, 1.5, 2.0]
+
+    clock = FakeClock()
+    provider = RecordingProvider(clock)
+    sched = scheduler(provider, clock, batch_size=2, max_batch_size=2, rate=1.0, burst=1)
+    run(sched, [f"T{i}" for i in range(8)])
+    gaps = [b - a for a, b in zip(provider.times, provider.times[1:])]
+    assert len(provider.times) == 4 and all(gap >= 1.0 - 1e-9 for gap in gaps)
+
+
+def test_only_failed_tickers_are_retried():
+    clock = FakeClock()
+    provider = SyntheticProvider(fail_times={"MSFT": 1, "NVDA": 10})
+    sched = scheduler(provider, clock, batch_size=4, rate=100.0, burst=100, retries=2, backoff=1.0)
+    received, failed = run(sched, ["AAPL", "MSFT", "NVDA", "AMZN"])
+
+    assert provider.calls[0] == ["AAPL", "MSFT", "NVDA", "AMZN"]
+    # تلاش‌های بعدی فقط شامل نمادهای ناموفق‌اند، نه کل دسته
+    assert all(set(call) <= {"MSFT", "NVDA"} for call in provider.calls[1:])
+    assert sum(call.count("NVDA") for call in provider.calls) == 3
+    assert sorted(received) == ["AAPL", "AMZN", "MSFT"]
+    assert failed == ["NVDA"]
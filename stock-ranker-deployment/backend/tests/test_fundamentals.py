@@ -0,0 +1,69 @@
+# backend/tests/test_fundamentals.py
+import threading
+import time
+from app.fundamentals import FundamentalsCache, fetch_fundamentals
+
+
+class MockProvider:
+    """Provider محلی به جای yfinance: info هر نماد از infos، نمادهای failing خطا می‌دهند و همه‌ی فراخوانی‌ها ثبت می‌شوند"""
+
+    def __init__(self, infos, failing=()):
+        self.infos = infos
+        self.failing = set(failing)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, ticker):
+        with self.lock:
+            self.calls.append(ticker)
+        if ticker in self.failing:
+            raise RuntimeError("rate limited")
+        return self.infos[ticker]
+
+
+def info(name, cap=1e9):
+    return {"longName": name, "marketCap": cap, "trailingPE": 20.0, "trailingEps": 5.0,
+            "sector": "Tech", "industry": "Software"}
+
+
+def test_stale_entries_are_refetched(tmp_path):
+    ttl = 3600
+    cache = FundamentalsCache(tmp_path / "fundamentals.json", ttl_seconds=ttl)
+    cache.put("AAPL", {"Ticker": "AAPL", "Company": "Old Apple"}, now=time.time() - ttl - 1)
+    cache.put("MSFT", {"Ticker": "MSFT", "Company": "Microsoft"})
+    assert cache.stale(["AAPL", "MSFT"]) == ["AAPL"]
+
+    provider = MockProvider({"AAPL": info("Apple")})
+    df = fetch_fundamentals(["AAPL", "MSFT"], cache=cache, provider=provider, backoff=0.01)
+
+    assert provider.calls == ["AAPL"]
+    assert df.set_index("Ticker")["Company"].to_dict() == {"AAPL": "Apple", "MSFT": "Microsoft"}
+    # مقدار تازه با زمان جدید روی دیسک ذخیره می‌شود
+    reloaded = FundamentalsCache(tmp_path / "fundamentals.json", ttl_seconds=ttl)
+    assert reloaded.get("AAPL")["Company"] == "Apple"
+
+
+def test_one_failing_ticker_does_not_break_the_batch(tmp_path):
+    provider = MockProvider({"AAPL": info("Apple"), "NVDA": info("Nvidia", 2e9)}, failing={"MSFT"})
+    cache = FundamentalsCache(tmp_path / "fundamentals.json")
+    df = fetch_fundamentals(["AAPL", "MSFT", "NVDA"], cache=cache, provider=provider,
+                            max_workers=3, retries=2, backoff=0.01)
+
+    rows = df.set_index("Ticker")
+    assert list(df["Ticker"]) == ["AAPL", "MSFT", "NVDA"]
+    assert rows.loc["NVDA", "Market Cap"] == 2e9
+    assert rows.loc["MSFT", "Company"] == "N/A"
+    assert provider.calls.count("MSFT") == 2
+    # ردیف خالی در کش نمی‌ماند تا اجرای بعدی دوباره تلاش کند
+    assert cache.stale(["AAPL", "MSFT", "NVDA"]) == ["MSFT"]
+
+
+def test_cache_hit_skips_provider(tmp_path):
+    path = tmp_path / "fundamentals.json"
+    first = fetch_fundamentals(["AAPL"], cache=FundamentalsCache(path), provider=MockProvider({"AAPL": info("Apple")}))
+
+    provider = MockProvider({})
+    second = fetch_fundamentals(["AAPL"], cache=FundamentalsCache(path), provider=provider)
+
+    assert provider.calls == []
+    assert second.equals(first)
@@ -0,0 +1,103 @@
+# backend/tests/test_news.py
+import asyncio
+import threading
+import pytest
+from aiohttp import web
+from app.news import ArticleStore, fetch_articles, ingest_news
+
+
+class MockNewsAPI:
+    """سرور HTTP محلی به جای NewsAPI: پاسخ هر نماد از responses و ثبت همه‌ی درخواست‌ها"""
+
+    def __init__(self, responses):
+        self.responses = responses  # q -> لیست پاسخ‌ها به ترتیب درخواست (status, body)
+        self.requests = []
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    async def handle(self, request):
+        q = request.query["q"]
+        self.requests.append(dict(request.query))
+        queue = self.responses[q]
+        status, body = queue.pop(0) if len(queue) > 1 else queue[0]
+        if isinstance(body, str):
+            return web.Response(status=status, text=body)
+        return web.json_response(body, status=status)
+
+    async def _start(self):
+        app = web.Application()
+        app.router.add_get("/v2/everything", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}/v2/everything"
+
+    def start(self) -> str:
+        self.thread.start()
+        return asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+def article(url, published="2024-01-02T10:00:00Z", title="title"):
+    return {"url": url, "publishedAt": published, "title": title, "description": "text"}
+
+
+@pytest.fixture
+def server():
+    servers = []
+
+    def make(responses):
+        mock = MockNewsAPI(responses)
+        servers.append(mock)
+        return mock, mock.start()
+
+    yield make
+    for mock in servers:
+        mock.stop()
+
+
+def test_retries_on_429(server):
+    mock, url = server({"AAPL stock": [(429, {}), (429, {}), (200, {"articles": [article("u1")]})]})
+    result = asyncio.run(fetch_articles(["AAPL"], "key", "2024-01-01", "2024-01-05", url=url, backoff=0.01))
+    assert [a["url"] for a in result["AAPL"]] == ["u1"]
+    assert len(mock.requests) == 3
+
+
+def test_errors_stay_per_ticker(server):
+    mock, url = server({
+        "AAPL stock": [(200, "not json")],
+        "MSFT stock": [(500, {})],
+        "NVDA stock": [(200, {"articles": [article("u2")]})],
+    })
+    result = asyncio.run(fetch_articles(["AAPL", "MSFT", "NVDA"], "key", "2024-01-01", "2024-01-05",
+                                        url=url, retries=2, backoff=0.01))
+    assert result["AAPL"] == [] and result["MSFT"] == []
+    assert [a["url"] for a in result["NVDA"]] == ["u2"]
+
+
+def test_cache_hits_skip_scoring_and_narrow_request(server, tmp_path):
+    articles = [article("u1"), article("u2", published="2024-01-03T09:00:00Z"), {"url": "no-date"}]
+    mock, url = server({"AAPL stock": [(200, {"articles": articles})]})
+    store = ArticleStore(tmp_path / "news.sqlite")
+    scored = []
+
+    def score(text):
+        scored.append(text)
+        return 0.5
+
+    first = ingest_news(["AAPL"], "key", "2024-01-01", "2024-01-05", store, score, url=url, backoff=0.01)
+    second = ingest_news(["AAPL"], "key", "2024-01-01", "2024-01-05", store, score, url=url, backoff=0.01)
+    store.close()
+
+    # خبر بدون تاریخ کنار گذاشته می‌شود و اخبار تکراری دوباره امتیازدهی نمی‌شوند
+    assert len(scored) == 2
+    assert len(first) == len(second) == 2
+    # درخواست دوم از تاریخ آخرین خبر ذخیره‌شده شروع می‌شود
+    assert mock.requests[0]["from"] == "2024-01-01"
+    assert mock.requests[1]["from"] == "2024-01-03"